@@ -2,47 +2,50 @@ print("Script is running...")
 
 import pandas as pd
 import os
+from functools import partial
+from event_segmenter import find_segments
+from file_executor import map_files
+from instrumentation import Instrumentation, profile_option, report, timed_call, timed_load
+from figure_renderer import pause
 
 # Define the directory path
 directory = os.path.join(os.path.dirname(os.getcwd()), "raw_data", "Experiment_1_Raw_Data")
 print(f"Processing files in: {directory}")
 print("Files in directory:", os.listdir(directory))
 
-# Function to count events exceeding threshold
-def count_events(file_path, threshold=2.2):
-    df = pd.read_csv(file_path, skiprows=17)  # Load CSV and skip initial rows
-    df.columns = ['A','B','C','D','E','F','G','H','I','J','K','L','M','N','O','P','Q','R']
-    df = df[['D','E','K']]  # Select relevant columns
-    df.columns = ["Time (s)", "CH1 (V)", "CH2 (V)"]
-    df.dropna(inplace=True)  # Remove any NaN values
-    df = df.apply(pd.to_numeric)  # Convert to numeric
+# Parallel execution settings (results are merged in sorted filename order, identical to a serial run)
+workers = 1  # Worker processes used to analyse files (set to os.cpu_count() to use every core)
+chunksize = 1  # Files handed to a worker at a time
+
+# Function to count events exceeding threshold (load and segment are timed separately)
+def count_events(file_path, threshold=2.2, instrumentation=None):
+    instrumentation = Instrumentation() if instrumentation is None else instrumentation
+    columns, header = timed_load(instrumentation, file_path)  # Parse header and samples into arrays
     
     events = {'CH1 (V)': 0, 'CH2 (V)': 0}
     
     for channel in ["CH1 (V)", "CH2 (V)"]:
-        above_threshold = False  # Tracks if we are inside an event
-        for voltage in df[channel]:
-            if voltage >= threshold:
-                if not above_threshold:  # New event detected
-                    events[channel] += 1
-                    above_threshold = True
-            else:
-                above_threshold = False  # Reset when signal drops below threshold
+        # Every rising edge is a new event, including one still above threshold at the end
+        with instrumentation.stage("segment", samples=len(columns[channel])) as counters:
+            starts, stops = find_segments(columns[channel], threshold, polarity=">=", include_open=True)
+            counters["events"] += len(starts)
+        events[channel] = len(starts)
     
     return events
 
 # Process all CSV files in a directory
-def process_all_files(directory):
+def process_all_files(directory, workers=1, chunksize=1, instrumentation=None):
+    instrumentation = Instrumentation("Count Scintillator Events") if instrumentation is None else instrumentation
     total_events = {'CH1 (V)': 0, 'CH2 (V)': 0}
     results = []
     
-    for file in os.listdir(directory):
-        if file.endswith(".csv"):  # Only process CSV files
-            file_path = os.path.join(directory, file)
-            events = count_events(file_path)
-            total_events['CH1 (V)'] += events['CH1 (V)']
-            total_events['CH2 (V)'] += events['CH2 (V)']
-            results.append([file, events['CH1 (V)'], events['CH2 (V)']])
+    # Count events in every CSV file (non-capture files are skipped); worker timings are merged here
+    analyze = partial(timed_call, count_events, profile_directory=instrumentation.profile_directory)
+    for file, (events, stages) in map_files(analyze, directory, workers=workers, chunksize=chunksize):
+        instrumentation.merge(stages)
+        total_events['CH1 (V)'] += events['CH1 (V)']
+        total_events['CH2 (V)'] += events['CH2 (V)']
+        results.append([file, events['CH1 (V)'], events['CH2 (V)']])
     
     # Create DataFrame for readable table output
     df_results = pd.DataFrame(results, columns=["Filename", "CH1 Events", "CH2 Events"])
@@ -51,7 +54,13 @@ def process_all_files(directory):
     print("\nEvent Count Summary:")
     print(df_results.to_string(index=False))
     
-# Run the function
-process_all_files(directory)
+    # Timing of this run: one line here, one row per stage in the timing log
+    report(instrumentation)
+    
+# Run the function (guarded so worker processes can import this script)
+if __name__ == "__main__":
+    # --profile FOLDER runs every stage under cProfile
+    instrumentation = Instrumentation("Count Scintillator Events", profile_directory=profile_option())
+    process_all_files(directory, workers=workers, chunksize=chunksize, instrumentation=instrumentation)
 
-input("Press Enter to exit...")
+    pause()
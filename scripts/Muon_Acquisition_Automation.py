@@ -1,58 +1,182 @@
 import os
+import csv
 import pandas as pd
 import time
+from capture_loader import load_capture
+from run_container import RunWriter
 
-def monitor_muon_events(data_directory, experiment_duration, save_directory):
+# Ledger of processed captures kept in the save directory, so restarts never re-detect a capture
+LEDGER_NAME = "processed_captures.csv"
+LEDGER_COLUMNS = ["Filename", "Size (bytes)", "Modified (ns)", "Event"]
+
+# Run file in the save directory that detected events are appended to (export CSVs with run_container.py)
+RUN_NAME = "Muon_Events.run"
+
+# Directory modification times closer than this to the listing are not trusted (FAT keeps 2 s steps),
+# so a file created in the same tick as a listing is still picked up by the next one
+MTIME_RESOLUTION_NS = 2 * 10**9
+
+def load_ledger(ledger_path):
+    """
+    Reads the ledger of processed captures.
+
+    Returns a dictionary mapping each processed file name to its row (size, mtime, event number).
     """
-    Monitors oscilloscope data in real-time, detects muon events, and saves each event as a .csv file.
-    
+    ledger = {}
+    if os.path.exists(ledger_path):
+        with open(ledger_path, "r", newline="") as f:
+            for row in csv.DictReader(f):
+                ledger[row["Filename"]] = row
+    return ledger
+
+def record_in_ledger(ledger_path, ledger, file, size, mtime_ns, event_number):
+    """Appends one processed capture to the ledger file (and the in-memory copy)."""
+    row = {"Filename": file, "Size (bytes)": size, "Modified (ns)": mtime_ns, "Event": event_number}
+    new_file = not os.path.exists(ledger_path)
+    with open(ledger_path, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=LEDGER_COLUMNS)
+        if new_file:
+            writer.writeheader()
+        writer.writerow(row)
+    ledger[file] = row
+
+def is_processed(ledger, file, signature):
+    """True if the ledger holds this capture with the same (size, mtime_ns), i.e. it was not rewritten since."""
+    row = ledger.get(file)
+    return row is not None and (int(row["Size (bytes)"]), int(row["Modified (ns)"])) == signature
+
+def find_completed_captures(data_directory, ledger, pending, failed, listing):
+    """
+    Lists captures that are new and have stopped growing.
+
+    Parameters:
+    - data_directory: Path where oscilloscope .csv files are stored.
+    - ledger: Processed captures; a capture counts as processed while its size and mtime match the ledger.
+    - pending: Dictionary of file name -> (size, mtime) of captures not processed yet (None until
+      first seen), updated in place.
+    - failed: Dictionary of file name -> (size, mtime) of captures that could not be read; they are
+      retried only after they change.
+    - listing: {"mtime_ns", "recheck", "names"} of the last directory listing, updated in place (start with {}).
+
+    The directory is only listed again when its modification time changes (a file was added,
+    removed or replaced); otherwise a poll costs one stat of the folder plus one per pending
+    capture, however many captures the folder holds. A listing only reads names: a capture is
+    stat'ed when its name is new to the listing (not pending, and not in the ledger or not in the
+    previous listing, so one that was deleted and later written again is checked against its
+    ledger signature). The first listing therefore checks every ledger entry once; later ones cost
+    one name per file and no stat for the captures already known. A processed capture replaced
+    under the same name between two listings is not noticed. A listing taken within MTIME_RESOLUTION_NS of the
+    folder's mtime is repeated once after that, in case a file arrived in the same tick.
+    A capture is returned once its size and modification time are unchanged between two polls.
+    Returns a sorted list of (file, size, mtime_ns).
+    """
+    directory_mtime = os.stat(data_directory).st_mtime_ns
+    now = time.time_ns()
+    settled = listing.get("recheck") and now - directory_mtime >= MTIME_RESOLUTION_NS
+    if directory_mtime != listing.get("mtime_ns") or settled:
+        names = {file for file in os.listdir(data_directory) if file.endswith(".csv")}
+        # Known names are skipped with set operations: pending captures are stat'ed below, processed ones left alone
+        known = listing.get("names", set()) & ledger.keys()
+        for file in names - known - pending.keys():
+            try:
+                stat = os.stat(os.path.join(data_directory, file))
+            except OSError:
+                names.discard(file)
+                continue  # Deleted or still being created
+            if not is_processed(ledger, file, (stat.st_size, stat.st_mtime_ns)):
+                pending[file] = None  # New, or written again since it was processed
+        for file in list(pending):
+            if file not in names:
+                del pending[file]  # Disappeared before completing
+        listing["mtime_ns"] = directory_mtime
+        listing["recheck"] = now - directory_mtime < MTIME_RESOLUTION_NS
+        listing["names"] = names
+
+    ready = []
+    for file in list(pending):
+        try:
+            stat = os.stat(os.path.join(data_directory, file))
+        except OSError:
+            del pending[file]  # Deleted (the next listing sees it again if it comes back)
+            continue
+        signature = (stat.st_size, stat.st_mtime_ns)
+        if is_processed(ledger, file, signature):
+            del pending[file]
+            continue
+        if failed.get(file) == signature:
+            continue  # Unreadable and unchanged since
+        if stat.st_size > 0 and pending[file] == signature:
+            ready.append((file, stat.st_size, stat.st_mtime_ns))
+        pending[file] = signature
+
+    return sorted(ready)
+
+def monitor_muon_events(data_directory, experiment_duration, save_directory, poll_interval=1.0):
+    """
+    Monitors oscilloscope data in real-time, detects muon events, and appends each event to a run file.
+
     Parameters:
     - data_directory: Path where oscilloscope .csv files are stored.
     - experiment_duration: Total time (in seconds) to monitor the oscilloscope.
-    - save_directory: Path to save detected event files.
+    - save_directory: Path of the run file holding detected events (and of the ledger of processed captures).
+    - poll_interval: Seconds between directory checks.
+
+    Each capture is read once, after it has stopped growing; processed captures are remembered in
+    a ledger in save_directory, so neither repeated polls nor restarts process a file twice. A
+    capture written again under the same name (new size or mtime) is processed again.
     """
     start_time = time.time()
+    ledger_path = os.path.join(save_directory, LEDGER_NAME)
+    ledger = load_ledger(ledger_path)
+    pending = {}
+    failed = {}
+    listing = {}
+    run = RunWriter(os.path.join(save_directory, RUN_NAME))
     event_count = 0
-    
+
     while time.time() - start_time < experiment_duration:
-        for file in os.listdir(data_directory):
-            if file.endswith(".csv"):
-                file_path = os.path.join(data_directory, file)
-                
-                try:
-                    # Load the data, skipping metadata rows
-                    df = pd.read_csv(file_path, skiprows=100)  # Adjust based on actual row of raw data
-                    
-                    # Rename columns for clarity
-                    df = df[["D", "E", "K", "Q"]]
-                    df.columns = ["Time (s)", "CH1 (V)", "CH2 (V)", "sMDT (V)"]
-                    df = df.apply(pd.to_numeric, errors='coerce').dropna()
-                    
-                    # Check if a muon event occurred
-                    ch1_trigger = df["CH1 (V)"] > 2.2
-                    ch2_trigger = df["CH2 (V)"] > 2.2
-                    smdt_trigger = df["sMDT (V)"] < -1.3e-3
-                    
-                    # Detect event where both CH1 & CH2 exceed 2.2V and sMDT drops below -1.3e-3V
-                    event_indices = df.index[ch1_trigger & ch2_trigger & smdt_trigger].tolist()
-                    
-                    if event_indices:
-                        event_count += 1
-                        event_data = df.loc[event_indices]
-                        event_filename = os.path.join(save_directory, f"Muon_Event_{event_count:04d}.csv")
-                        event_data.to_csv(event_filename, index=False)
-                        print(f"Muon event detected! Saved as {event_filename}")
-                
-                except Exception as e:
-                    print(f"Error processing {file}: {e}")
-        
-        time.sleep(1)  # Adjust frequency of checking as needed
-    
-    print(f"Experiment complete! Total events detected: {event_count}")
+        for file, size, mtime_ns in find_completed_captures(data_directory, ledger, pending, failed, listing):
+            file_path = os.path.join(data_directory, file)
+            event_number = ""
+
+            try:
+                # Load the data (Time, CH1, CH2, sMDT) with the header parsed separately
+                columns, header = load_capture(file_path)
+                df = pd.DataFrame(columns)
+
+                # Check if a muon event occurred
+                ch1_trigger = df["CH1 (V)"] > 2.2
+                ch2_trigger = df["CH2 (V)"] > 2.2
+                smdt_trigger = df["sMDT (V)"] < -1.3e-3
+
+                # Detect event where both CH1 & CH2 exceed 2.2V and sMDT drops below -1.3e-3V
+                event_rows = ch1_trigger & ch2_trigger & smdt_trigger
+
+                if event_rows.any():
+                    event_count += 1
+                    rows = df[event_rows]
+                    event_number = run.append([rows[column].to_numpy() for column in rows.columns],
+                                              timestamp=mtime_ns / 1e9, trigger_index=rows.index[0]) + 1
+                    print(f"Muon event {event_number} detected in {file}, saved to {run.path}")
+
+            except Exception as e:
+                # Not a capture, or one still being written: left out of the ledger and retried if it changes
+                print(f"Skipping {file}: {e}")
+                failed[file] = (size, mtime_ns)
+                continue
+
+            record_in_ledger(ledger_path, ledger, file, size, mtime_ns, event_number)
+            del pending[file]
+
+        time.sleep(poll_interval)  # Adjust frequency of checking as needed
+
+    run.close()
+    print(f"Experiment complete! Total events detected: {event_count} ({len(run)} in {run.path})")
 
 # Example usage
-experiment_folder = r"C:\Users\colin\OneDrive\Desktop\Experiment_Data"
-output_folder = r"C:\Users\colin\OneDrive\Desktop\Detected_Events"
-os.makedirs(output_folder, exist_ok=True)
+if __name__ == "__main__":
+    experiment_folder = r"C:\Users\colin\OneDrive\Desktop\Experiment_Data"
+    output_folder = r"C:\Users\colin\OneDrive\Desktop\Detected_Events"
+    os.makedirs(output_folder, exist_ok=True)
 
-monitor_muon_events(experiment_folder, experiment_duration=600, save_directory=output_folder)
+    monitor_muon_events(experiment_folder, experiment_duration=600, save_directory=output_folder)
@@ -2,8 +2,10 @@ print("Script is running...")
 
 import pandas as pd
 import os
-import numpy as np
 import matplotlib.pyplot as plt
+from running_stats import RunningStats
+from histogram_accumulator import Histogram
+from figure_renderer import show, pause
 
 # Define paths
 data_directory = os.path.join(os.getcwd(), "raw_data", "Experiment_1_Raw_Data")
@@ -18,18 +20,18 @@ peak_voltage_file = os.path.join(data_directory, "sMDT_Peak_Voltage_Summary.csv"
 signal_area_file = os.path.join(data_directory, "sMDT_Signal_Area_Summary.csv")
 latency_file = os.path.join(data_directory, "sMDT_Event_Latency_Summary.csv")
 
-# Function to compute mean and SEM
+# Function to compute mean and SEM (sample standard deviation, running_stats.SEM_DDOF)
 def compute_stats(data):
-    mean_val = np.mean(data)
-    sem_val = np.std(data) / np.sqrt(len(data))
-    return mean_val, sem_val
+    stats = RunningStats().update_many(data)
+    return stats.mean, stats.sem()
 
-# Function to plot histograms
-def plot_histogram(data, title, xlabel, filename):
+# Function to plot histograms (drawn from accumulated bin counts, which are saved next to the figure)
+def plot_histogram(data, title, xlabel, filename, bins=30):
     mean_val, sem_val = compute_stats(data)
+    histogram = Histogram.from_values(data, bins)
 
-    plt.figure(figsize=(10, 5))
-    plt.hist(data, bins=30, color='blue', alpha=0.7, edgecolor='black', label=title)
+    fig, ax = plt.subplots(figsize=(10, 5))
+    histogram.plot(ax, color='blue', alpha=0.7, edgecolor='black', label=title)
 
     # Add average line
     plt.axvline(mean_val, color='red', linestyle='dashed', label=f'Mean: {mean_val:.2e}')
@@ -48,8 +50,9 @@ def plot_histogram(data, title, xlabel, filename):
     plot_output_file = os.path.join(desktop_path, filename)
     plt.savefig(plot_output_file)
     print(f"Histogram saved to: {plot_output_file}")
+    histogram.save(os.path.splitext(plot_output_file)[0] + ".npz")  # Bin counts, mergeable with other runs
 
-    plt.show()
+    show()
 
 # Dictionary to store statistics
 stats_summary = {}
@@ -109,4 +112,4 @@ print(df_summary)
 
 print(f"\nSummary saved to: {summary_output_file}")
 
-input("Press Enter to exit...")
+pause()
@@ -1,8 +1,10 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.integrate import simpson
 import os
+from capture_loader import load_capture
+from event_metrics import segment_areas
+from figure_renderer import show, pause
 
 # Define the directory path (updated for GitHub directory structure)
 directory = os.path.join(os.path.dirname(os.getcwd()), "raw_data", "Experiment_1_Raw_Data")
@@ -13,19 +15,9 @@ print("Files in directory:", os.listdir(directory))
 file_name = "sMDT_3400V_Event_001.csv"
 file_path = os.path.join(directory, file_name)
 
-# Load Data
-df = pd.read_csv(file_path, skiprows=17)
-df.columns = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J', 'K', 'L', 'M', 'N', 'O', 'P', 'Q', 'R']
-
-# Extract relevant columns
-df = df[['D', 'E', 'K']]  # Time, CH1, CH2
-df.columns = ["Time (s)", "CH1 (V)", "CH2 (V)"]
-df.dropna(inplace=True)
-
-# Convert columns to numeric
-df["Time (s)"] = pd.to_numeric(df["Time (s)"])
-df["CH1 (V)"] = pd.to_numeric(df["CH1 (V)"])
-df["CH2 (V)"] = pd.to_numeric(df["CH2 (V)"])
+# Load Data (Time, CH1, CH2)
+columns, header = load_capture(file_path)
+df = pd.DataFrame(columns)
 
 # Identify First Hit (Threshold-Based)
 threshold = 2.0  # Set based on expected values
@@ -46,8 +38,10 @@ time_window = df.loc[first_hit_index:peak_end_index, "Time (s)"]
 ch1_window = df.loc[first_hit_index:peak_end_index, "CH1 (V)"]
 ch2_window = df.loc[first_hit_index:peak_end_index, "CH2 (V)"]
 
-ch1_integral = simpson(ch1_window, time_window)
-ch2_integral = simpson(ch2_window, time_window)
+# Simpson's rule over the window, end sample included
+window_start, window_stop = [first_hit_index], [peak_end_index + 1]
+ch1_integral = segment_areas(df["Time (s)"].values, df["CH1 (V)"].values, window_start, window_stop, rule="simpson")[0]
+ch2_integral = segment_areas(df["Time (s)"].values, df["CH2 (V)"].values, window_start, window_stop, rule="simpson")[0]
 total_integral = ch1_integral + ch2_integral
 
 # Print Timing and Integral Info
@@ -82,6 +76,6 @@ plt.title('Scintillator Voltage vs. Signal Area')
 plt.legend()
 plt.grid()
 plt.tight_layout()
-plt.show()
+show()
 
-input("Press Enter to exit...")
+pause()
@@ -2,112 +2,106 @@ print("Script is running...")
 
 import pandas as pd
 import os
-import numpy as np
-import matplotlib.pyplot as plt
+from functools import partial
+from event_segmenter import find_segments
+from event_metrics import segment_areas
+from file_executor import map_files
+from running_stats import RunningStats
+from instrumentation import Instrumentation, profile_option, report, timed_call, timed_load
+from histogram_accumulator import Histogram, save_histograms
+from figure_renderer import signal_area_job, render_figures, show_figures, pause
 
 # Define the directory path
 directory = os.path.join(os.path.dirname(os.getcwd()), "raw_data", "Experiment_1_Raw_Data")
 print(f"Processing files in: {directory}")
 print("Files in directory:", os.listdir(directory))
 
-# Function to count events and compute signal areas
-def process_events(file_path, threshold=2.2):
-    df = pd.read_csv(file_path, skiprows=17)  # Load CSV and skip initial rows
-    df.columns = ['A','B','C','D','E','F','G','H','I','J','K','L','M','N','O','P','Q','R']
-    df = df[['D','E','K']]  # Select relevant columns
-    df.columns = ["Time (s)", "CH1 (V)", "CH2 (V)"]
-    df.dropna(inplace=True)  # Remove any NaN values
-    df = df.apply(pd.to_numeric)  # Convert to numeric
+# Parallel execution settings (results are merged in sorted filename order, identical to a serial run)
+workers = 1  # Worker processes used to analyse files (set to os.cpu_count() to use every core)
+chunksize = 1  # Files handed to a worker at a time
+
+# Histogram settings: fine fixed bins are filled file by file, then combined into Rice-rule bins for the plot
+area_range = (0.0, 1e-7)  # Signal area range covered by the bins (V·s); areas outside it are counted as overflow
+area_bins = 4000  # Fine bins across area_range
+
+# Function to count events and compute signal areas (load, segment and integrate are timed separately)
+def process_events(file_path, threshold=2.2, instrumentation=None):
+    instrumentation = Instrumentation() if instrumentation is None else instrumentation
+    columns, header = timed_load(instrumentation, file_path)  # Parse header and samples into arrays
     
     event_areas = {"CH1 (V)": [], "CH2 (V)": []}
     
     for channel in ["CH1 (V)", "CH2 (V)"]:
-        above_threshold = False  # Tracks if we are inside an event
-        start_index = None  # Start index of an event
+        # Find every completed event (rise to fall) at once
+        with instrumentation.stage("segment", samples=len(columns[channel])) as counters:
+            starts, stops = find_segments(columns[channel], threshold, polarity=">=")
+            counters["events"] += len(starts)
         
-        for i in range(len(df)):
-            if df[channel].iloc[i] >= threshold:
-                if not above_threshold:  # New event detected
-                    above_threshold = True
-                    start_index = i  # Mark start of event
-            else:
-                if above_threshold:  # End of event
-                    above_threshold = False
-                    if start_index is not None:
-                        # Compute signal area using Riemann sum
-                        time_values = df["Time (s)"].iloc[start_index:i].values
-                        voltage_values = df[channel].iloc[start_index:i].values
-                        delta_t = np.diff(time_values)  # Time step differences
-                        area = np.sum(voltage_values[:-1] * delta_t)  # Riemann sum
-                        event_areas[channel].append(area)
+        # Compute signal area of every event using a left Riemann sum
+        with instrumentation.stage("integrate", events=len(starts)):
+            areas = segment_areas(columns["Time (s)"], columns[channel], starts, stops, rule="riemann")
+        event_areas[channel].extend(areas.tolist())
     
     return event_areas
 
 # Process all CSV files in a directory and collect signal areas
-def process_all_files(directory):
+def process_all_files(directory, workers=1, chunksize=1, instrumentation=None):
+    instrumentation = Instrumentation("Scintillator Event Areas") if instrumentation is None else instrumentation
     all_areas = {"CH1 (V)": [], "CH2 (V)": []}
+    area_stats = {"CH1 (V)": RunningStats(), "CH2 (V)": RunningStats()}
+    area_histograms = {channel: Histogram.linear(*area_range, area_bins) for channel in ["CH1 (V)", "CH2 (V)"]}
     
-    for file in os.listdir(directory):
-        if file.endswith(".csv"):  # Only process CSV files
-            file_path = os.path.join(directory, file)
-            event_areas = process_events(file_path)
+    # Compute event areas for every CSV file (non-capture files are skipped); worker timings are merged here
+    analyze = partial(timed_call, process_events, profile_directory=instrumentation.profile_directory)
+    for file, (event_areas, stages) in map_files(analyze, directory, workers=workers, chunksize=chunksize):
+        instrumentation.merge(stages)
+        with instrumentation.stage("accumulate", events=len(event_areas["CH1 (V)"]) + len(event_areas["CH2 (V)"])):
             all_areas["CH1 (V)"].extend(event_areas["CH1 (V)"])
             all_areas["CH2 (V)"].extend(event_areas["CH2 (V)"])
+            area_stats["CH1 (V)"].update_many(event_areas["CH1 (V)"])
+            area_stats["CH2 (V)"].update_many(event_areas["CH2 (V)"])
+            area_histograms["CH1 (V)"].fill(event_areas["CH1 (V)"])
+            area_histograms["CH2 (V)"].fill(event_areas["CH2 (V)"])
     
-    # Convert to DataFrame and save to CSV
-    df_areas = pd.DataFrame({"CH1 Area (V·s)": all_areas["CH1 (V)"], "CH2 Area (V·s)": all_areas["CH2 (V)"]})
-    summary_directory = os.path.join(os.path.dirname(os.getcwd()), "summary_reports")
-    os.makedirs(summary_directory, exist_ok=True)  # Ensure the directory exists
-    output_file = os.path.join(summary_directory, "Signal_Area_Summary.csv")
-    df_areas.to_csv(output_file, index=False)
-    print(f"\nSignal area summary saved to: {output_file}")
+    with instrumentation.stage("summarize", events=len(all_areas["CH1 (V)"]) + len(all_areas["CH2 (V)"])):
+        # Convert to DataFrame and save to CSV
+        df_areas = pd.DataFrame({"CH1 Area (V·s)": all_areas["CH1 (V)"], "CH2 Area (V·s)": all_areas["CH2 (V)"]})
+        summary_directory = os.path.join(os.path.dirname(os.getcwd()), "summary_reports")
+        os.makedirs(summary_directory, exist_ok=True)  # Ensure the directory exists
+        output_file = os.path.join(summary_directory, "Signal_Area_Summary.csv")
+        df_areas.to_csv(output_file, index=False)
+        print(f"\nSignal area summary saved to: {output_file}")
+    
+        # Save the fine bin counts so histograms of several runs can be merged without the raw captures
+        histogram_file = os.path.join(summary_directory, "Signal_Area_Histograms.npz")
+        save_histograms(histogram_file, area_histograms)
+        print(f"Signal area histograms saved to: {histogram_file}")
+        for channel, histogram in area_histograms.items():
+            if histogram.underflow or histogram.overflow:
+                print(f"Warning: {histogram.underflow + histogram.overflow} {channel} areas fall outside area_range and are not plotted.")
     
     # Compute statistics
-    mean_ch1 = np.mean(all_areas["CH1 (V)"])
-    mean_ch2 = np.mean(all_areas["CH2 (V)"])
-    sem_ch1 = np.std(all_areas["CH1 (V)"]) / np.sqrt(len(all_areas["CH1 (V)"]))
-    sem_ch2 = np.std(all_areas["CH2 (V)"]) / np.sqrt(len(all_areas["CH2 (V)"]))
-
-    # Dynamically determine bin count using an adjusted Rice Rule (increased resolution)
-    bins = int(2.5 * np.cbrt(len(all_areas["CH1 (V)"])))  # Uses 2.5 × cube root of N for better binning
-
-    # Create Stacked Subplots
-    fig, axes = plt.subplots(2, 1, figsize=(10, 8), sharex=True, gridspec_kw={'hspace': 0.4})
-
-    # Top subplot - CH1
-    axes[0].hist(all_areas["CH1 (V)"], bins=bins, color='blue', alpha=0.5, edgecolor='black', label='CH1')
-    axes[0].axvline(mean_ch1, color='red', linestyle='dashed', label=f'CH1 Mean: {mean_ch1:.2e} V·s')
-    axes[0].fill_betweenx([0, axes[0].get_ylim()[1]], mean_ch1 - sem_ch1, mean_ch1 + sem_ch1, 
-                           color='red', alpha=0.4, edgecolor='red', linestyle="dotted", label=f'CH1 SEM: {sem_ch1:.2e} V·s')
-    axes[0].set_ylabel("Frequency")
-    axes[0].set_title("CH1 Histogram of Signal Areas")
-    axes[0].legend(loc='upper right', framealpha=0.7)  # Semi-transparent legend
-    axes[0].grid(True)
-
-    # Bottom subplot - CH2
-    axes[1].hist(all_areas["CH2 (V)"], bins=bins, color='green', alpha=0.5, edgecolor='black', label='CH2')
-    axes[1].axvline(mean_ch2, color='red', linestyle='dashed', label=f'CH2 Mean: {mean_ch2:.2e} V·s')
-    axes[1].fill_betweenx([0, axes[1].get_ylim()[1]], mean_ch2 - sem_ch2, mean_ch2 + sem_ch2, 
-                           color='red', alpha=0.4, edgecolor='red', linestyle="dotted", label=f'CH2 SEM: {sem_ch2:.2e} V·s')
-    axes[1].set_xlabel("Signal Area (V·s)")
-    axes[1].set_ylabel("Frequency")
-    axes[1].set_title("CH2 Histogram of Signal Areas")
-    axes[1].legend(loc='upper right', framealpha=0.7)  # Semi-transparent legend
-    axes[1].grid(True)
+    mean_ch1 = area_stats["CH1 (V)"].mean
+    mean_ch2 = area_stats["CH2 (V)"].mean
+    sem_ch1 = area_stats["CH1 (V)"].sem()
+    sem_ch2 = area_stats["CH2 (V)"].sem()
 
-    # Ensure "figures" directory exists
-    figures_directory = os.path.join(os.path.dirname(os.getcwd()), "figures")
-    os.makedirs(figures_directory, exist_ok=True)
+    with instrumentation.stage("plot", files=1):
+        # Stacked CH1 / CH2 histograms, drawn off-screen and skipped if the counts and style are unchanged
+        figure_job = signal_area_job(area_histograms, {"CH1 (V)": (mean_ch1, sem_ch1), "CH2 (V)": (mean_ch2, sem_ch2)})
+        state = render_figures([figure_job])[figure_job["output"]]
+        print(f"\nFigure {state}: {figure_job['output']}")
 
-    # Save figure to the specified path
-    figure_path = os.path.join(figures_directory, "Signal_Area_Histogram.png")
-    plt.savefig(figure_path, dpi=600, bbox_inches='tight')
-    print(f"\nFigure saved to: {figure_path}")
+    # Timing of this run: one line here, one row per stage in the timing log
+    report(instrumentation)
 
-    # Display the figure
-    plt.show()
+    # Display the figure (not in headless runs)
+    show_figures([figure_job])
     
-# Run the function
-process_all_files(directory)
+# Run the function (guarded so worker processes can import this script)
+if __name__ == "__main__":
+    # python "Scintillator Event Areas.py" --profile profiles/ runs every stage under cProfile
+    instrumentation = Instrumentation("Scintillator Event Areas", profile_directory=profile_option())
+    process_all_files(directory, workers=workers, chunksize=chunksize, instrumentation=instrumentation)
 
-input("Press Enter to exit...")
+    pause()
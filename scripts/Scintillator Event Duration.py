@@ -1,61 +1,63 @@
 print("Script is running...")
 
-import pandas as pd
 import os
+from functools import partial
 import numpy as np
-import matplotlib.pyplot as plt
+from event_segmenter import find_segments
+from event_metrics import segment_durations
+from file_executor import map_files
+from histogram_accumulator import Histogram, save_histograms
+from instrumentation import Instrumentation, profile_option, report, timed_call, timed_load
+from figure_renderer import duration_job, render_figures, show_figures, pause
 
 # Define the directory path (updated for GitHub structure)
 directory = os.path.join(os.path.dirname(os.getcwd()), "raw_data", "Experiment_1_Raw_Data")
 print(f"Processing files in: {directory}")
 print("Files in directory:", os.listdir(directory))
 
-# Function to compute event durations
-def process_event_durations(file_path, threshold=2.2):
-    df = pd.read_csv(file_path, skiprows=17)  # Load CSV and skip initial rows
-    df.columns = ['A','B','C','D','E','F','G','H','I','J','K','L','M','N','O','P','Q','R']
-    df = df[['D','E','K']]  # Select relevant columns
-    df.columns = ["Time (s)", "CH1 (V)", "CH2 (V)"]
-    df.dropna(inplace=True)  # Remove any NaN values
-    df = df.apply(pd.to_numeric)  # Convert to numeric
+# Parallel execution settings (results are merged in sorted filename order, identical to a serial run)
+workers = 1  # Worker processes used to analyse files (set to os.cpu_count() to use every core)
+chunksize = 1  # Files handed to a worker at a time
+
+# Histogram settings: durations are multiples of the sample interval, so fine fixed bins keep every value apart
+duration_range = (0.0, 1e-7)  # Event duration range covered by the bins (s); longer events are counted as overflow
+duration_bins = 1000  # Fine bins across duration_range (trimmed and combined into 30 bins for the plot)
+
+# Function to compute event durations (load, segment and measure are timed separately)
+def process_event_durations(file_path, threshold=2.2, instrumentation=None):
+    instrumentation = Instrumentation() if instrumentation is None else instrumentation
+    columns, header = timed_load(instrumentation, file_path)  # Parse header and samples into arrays
     
     event_durations = {"CH1 (s)": [], "CH2 (s)": []}
     
     for channel in ["CH1 (V)", "CH2 (V)"]:
-        above_threshold = False  # Tracks if we are inside an event
-        start_time = None  # Start time of an event
+        # Find every completed event (rise to fall) at once
+        with instrumentation.stage("segment", samples=len(columns[channel])) as counters:
+            starts, stops = find_segments(columns[channel], threshold, polarity=">=")
+            counters["events"] += len(starts)
         
-        for i in range(len(df)):
-            if df[channel].iloc[i] >= threshold:
-                if not above_threshold:  # New event detected
-                    above_threshold = True
-                    start_time = df["Time (s)"].iloc[i]  # Mark start time
-            else:
-                if above_threshold:  # End of event
-                    above_threshold = False
-                    if start_time is not None:
-                        end_time = df["Time (s)"].iloc[i]  # Mark end time
-                        duration = end_time - start_time
-                        event_durations[channel.replace("(V)", "(s)")].append(duration)
+        # Duration runs from the first sample above threshold to the first sample back below it
+        with instrumentation.stage("measure", events=len(starts)):
+            durations = segment_durations(columns["Time (s)"], starts, stops)
+        event_durations[channel.replace("(V)", "(s)")].extend(durations.tolist())
     
     return event_durations
 
 # Process all CSV files in a directory and collect event durations
-def process_all_files(directory):
+def process_all_files(directory, workers=1, chunksize=1, instrumentation=None):
+    instrumentation = Instrumentation("Scintillator Event Duration") if instrumentation is None else instrumentation
     all_durations = {"CH1 (s)": [], "CH2 (s)": []}
+    duration_histograms = {channel: Histogram.linear(*duration_range, duration_bins) for channel in ["CH1 (s)", "CH2 (s)"]}
     
-    for file in os.listdir(directory):
-        if file.endswith(".csv"):  # Only process CSV files
-            
-            # Skip Signal_Area_Summary.csv if it doesn't match the expected structure
-            if file == "Signal_Area_Summary.csv":
-                print(f"Skipping {file} due to unexpected structure.")
-                continue
-            
-            file_path = os.path.join(directory, file)
-            event_durations = process_event_durations(file_path)
+    # Summary tables and anything else that isn't a capture are skipped; worker timings are merged here
+    analyze = partial(timed_call, process_event_durations, profile_directory=instrumentation.profile_directory)
+    for file, (event_durations, stages) in map_files(analyze, directory, workers=workers, chunksize=chunksize):
+        instrumentation.merge(stages)
+        with instrumentation.stage("accumulate", events=len(event_durations["CH1 (s)"]) + len(event_durations["CH2 (s)"])):
             all_durations["CH1 (s)"].extend(event_durations["CH1 (s)"])
             all_durations["CH2 (s)"].extend(event_durations["CH2 (s)"])
+            duration_histograms["CH1 (s)"].fill(event_durations["CH1 (s)"])
+            duration_histograms["CH2 (s)"].fill(event_durations["CH2 (s)"])
     
     # Compute and print average durations
     mean_ch1 = np.mean(all_durations["CH1 (s)"])
@@ -64,19 +66,31 @@ def process_all_files(directory):
     print(f"CH1: {mean_ch1:.2e} s")
     print(f"CH2: {mean_ch2:.2e} s")
     
-    # Plot histogram (distribution curve)
-    plt.figure(figsize=(10, 5))
-    plt.hist(all_durations["CH1 (s)"], bins=30, color='blue', alpha=0.7, edgecolor='black', label='CH1')
-    plt.hist(all_durations["CH2 (s)"], bins=30, color='green', alpha=0.7, edgecolor='black', label='CH2')
+    # Save the bin counts so histograms of several runs can be merged without the raw captures
+    with instrumentation.stage("summarize", events=len(all_durations["CH1 (s)"]) + len(all_durations["CH2 (s)"])):
+        summary_directory = os.path.join(os.path.dirname(os.getcwd()), "summary_reports")
+        os.makedirs(summary_directory, exist_ok=True)  # Ensure the directory exists
+        histogram_file = os.path.join(summary_directory, "Event_Duration_Histograms.npz")
+        save_histograms(histogram_file, duration_histograms)
+        print(f"Event duration histograms saved to: {histogram_file}")
+        for channel, histogram in duration_histograms.items():
+            if histogram.underflow or histogram.overflow:
+                print(f"Warning: {histogram.underflow + histogram.overflow} {channel} durations fall outside duration_range and are not plotted.")
     
-    plt.xlabel("Event Duration (s)")
-    plt.ylabel("Frequency")
-    plt.title("Distribution of Event Durations")
-    plt.legend()
-    plt.grid(True)
-    plt.show()
+    # Plot histogram (distribution curve) from the accumulated counts, off-screen and only if it changed
+    with instrumentation.stage("plot", files=1):
+        figure_job = duration_job(duration_histograms)
+        state = render_figures([figure_job])[figure_job["output"]]
+        print(f"Figure {state}: {figure_job['output']}")
+
+    # Timing of this run: one line here, one row per stage in the timing log
+    report(instrumentation)
+    show_figures([figure_job])
 
-# Run the function
-process_all_files(directory)
+# Run the function (guarded so worker processes can import this script)
+if __name__ == "__main__":
+    # --profile FOLDER runs every stage under cProfile
+    instrumentation = Instrumentation("Scintillator Event Duration", profile_directory=profile_option())
+    process_all_files(directory, workers=workers, chunksize=chunksize, instrumentation=instrumentation)
 
-input("Press Enter to exit...")
+    pause()
@@ -1,9 +1,13 @@
 import pyvisa
 import numpy as np
-import csv
 import time
 import os
-import matplotlib.pyplot as plt
+from collections import deque
+from scope_session import ScopeSession
+from acquisition_pipeline import AcquisitionPipeline
+from event_segmenter import find_coincidences
+from run_container import RunWriter
+from waveform_viewer import WaveformViewer
 
 # Initialize VISA resource manager
 rm = pyvisa.ResourceManager()
@@ -23,9 +27,14 @@ oscope.write("*IDN?")
 response = oscope.read()
 print("Oscilloscope ID:", response)
 
+# Configure binary waveform transfer once; scaling preambles are cached by the session
+session = ScopeSession(oscope)
+
 # Define save directory
 save_dir = "C:\\Users\\Swager\\OneDrive\\Desktop\\experiment_folder\\events"
 os.makedirs(save_dir, exist_ok=True)  # Ensure directory exists
+run_path = os.path.join(save_dir, "events.run")  # Events are appended here (export CSVs with run_container.py)
+hv_setting = None  # High voltage applied to the sMDT (V), stored with each event
 
 # Define event detection parameters
 SCINTILLATOR_THRESHOLD = 2.2  # Voltage threshold for CH1 & CH2
@@ -40,86 +49,71 @@ event_target = 1  # Stop after recording this many events
 event_limit = 100  # Stop after this many waveform captures (set None for unlimited)
 start_time = time.time()
 event_count = 0
+latest_event = deque(maxlen=1)  # Newest saved event not yet drawn; older ones are skipped so the display never lags
+
+# Pipeline settings: the scope keeps capturing while earlier captures are analysed and written
+analysis_workers = 2  # Threads running the coincidence check
+queue_size = 8  # Captures (or events) allowed to wait between stages
+capture_timeout = None  # Seconds to wait for a free slot before dropping a capture (None never drops)
+
+
+def acquire_capture():
+    """Acquisition stage: reads CH1 (Scintillator 1), CH2 (Scintillator 2) and CH3 (sMDT) from the scope."""
+    # Binary transfer, scaled to volts in one step
+    channel_data = session.read_channels([1, 2, 3])
+    timestamps = np.linspace(0, len(channel_data[1]) * 1e-9, len(channel_data[1]))  # Assuming 1 ns sample rate
+    scales = [None] + [session.preamble(channel) for channel in [1, 2, 3]]  # Cached, no extra queries
+    return time.time(), timestamps, channel_data, scales
+
+
+def find_events(capture):
+    """Analysis stage: returns (capture, trigger index) for each muon (coincidence followed by an sMDT signal)."""
+    capture_time, timestamps, channel_data, scales = capture
+
+    # CH1 & CH2 above threshold for SCINTILLATOR_DURATION samples, sMDT signal in the expected window, DEAD_TIME applied
+    triggers, smdt_indices = find_coincidences(timestamps, channel_data[1], channel_data[2], channel_data[3],
+                                               SCINTILLATOR_THRESHOLD, SCINTILLATOR_DURATION, SMDT_THRESHOLD,
+                                               SMDT_DELAY, SMDT_WINDOW, DEAD_TIME)
+    print(f"Number of muon candidates: {len(triggers)}")
+    return [(capture, trigger) for trigger in triggers]
+
+
+def save_event(event):
+    """Writer stage: appends one event to the run file and stops the pipeline once event_target is reached."""
+    global event_count
+    if event_count >= event_target:
+        return  # Found by a capture that was already queued when the target was reached
+
+    (capture_time, timestamps, channel_data, scales), trigger = event
+    event_count += 1
+    number = run.append([timestamps, channel_data[1], channel_data[2], channel_data[3]], timestamp=capture_time,
+                        hv=hv_setting, trigger_index=trigger, scales=scales) + 1
+    print(f"Event {number} recorded in {run_path}")
+    latest_event.append((number, timestamps, channel_data))
+
+    if event_count >= event_target:
+        pipeline.stop()
+
+
+def show_latest_event():
+    """Draws the newest recorded event in the live waveform window (matplotlib runs on the main thread)."""
+    if latest_event:
+        number, timestamps, channel_data = latest_event.pop()
+        viewer.update(timestamps, [channel_data[1], channel_data[2], channel_data[3]], f"Waveform for Event {number}")
+
 
 print("\n--- Starting Continuous Data Collection ---")
 
-while event_count < event_target:
-    if event_limit and event_count >= event_limit:
-        break
-
-    all_data = []
-    timestamps = []
-    channel_data = {1: [], 2: [], 3: []}
-    
-    # Acquire data for each channel
-    for channel, name in [(1, "Scintillator 1"), (2, "Scintillator 2"), (3, "sMDT")]:
-        oscope.write(f"DATa:SOUrce CH{channel}")
-        oscope.write("DATa:ENCdg ASCII")
-        oscope.write("DATa:WIDth 1")
-        oscope.write("ACQuire:MODe SAMPLE")
-
-        # Query scaling factors
-        oscope.write("WFMPRe:YMUlt?")
-        ymult = float(oscope.read())
-
-        oscope.write("WFMPRe:YOFf?")
-        yoff = float(oscope.read())
-
-        oscope.write("WFMPRe:YZEro?")
-        yzero = float(oscope.read())
-
-        # Request waveform data
-        oscope.write("CURVe?")
-        raw_data = oscope.read()
-
-        # Convert raw data to numeric values
-        raw_waveform = np.array(raw_data.split(","), dtype=float)
-
-        # Apply scaling conversion
-        voltage_values = (raw_waveform - yoff) * ymult + yzero
-
-        # Store data
-        channel_data[channel] = voltage_values
-        if channel == 1:
-            timestamps = np.linspace(0, len(voltage_values) * 1e-9, len(voltage_values))  # Assuming 1 ns sample rate
-    
-    # Debugging: Print occurrences where CH1 & CH2 exceed threshold together
-    coincident_events = np.where((channel_data[1] > SCINTILLATOR_THRESHOLD) & (channel_data[2] > SCINTILLATOR_THRESHOLD))[0]
-    print(f"Number of CH1 & CH2 coincidences: {len(coincident_events)}")
-    
-    if len(coincident_events) > 0:
-        for idx in coincident_events:
-            if idx + SCINTILLATOR_DURATION < len(channel_data[1]) and all(channel_data[1][idx:idx+SCINTILLATOR_DURATION] > SCINTILLATOR_THRESHOLD) and all(channel_data[2][idx:idx+SCINTILLATOR_DURATION] > SCINTILLATOR_THRESHOLD):
-                smdt_time = timestamps[idx] + SMDT_DELAY
-                smdt_window_start = smdt_time - SMDT_WINDOW
-                smdt_window_end = smdt_time + SMDT_WINDOW
-
-                smdt_event_indices = np.where((timestamps >= smdt_window_start) & (timestamps <= smdt_window_end) & (channel_data[3] < SMDT_THRESHOLD))[0]
-
-                if len(smdt_event_indices) > 0:
-                    event_count += 1
-                    event_filename = os.path.join(save_dir, f"Event_{event_count:03d}.csv")
-                    with open(event_filename, "w", newline="") as event_file:
-                        writer = csv.writer(event_file)
-                        writer.writerow(["Time (s)", "CH1 (V)", "CH2 (V)", "sMDT (V)"])
-                        for i in range(len(timestamps)):
-                            writer.writerow([timestamps[i], channel_data[1][i], channel_data[2][i], channel_data[3][i]])
-                    print(f"Event {event_count} recorded: {event_filename}")
-                    
-                    # Plot the waveform of the recorded event
-                    fig, axs = plt.subplots(3, 1, figsize=(10, 8), sharex=True)
-                    axs[0].plot(timestamps, channel_data[1], label="CH1 (Scintillator 1)")
-                    axs[1].plot(timestamps, channel_data[2], label="CH2 (Scintillator 2)")
-                    axs[2].plot(timestamps, channel_data[3], label="CH3 (sMDT)")
-                    axs[0].axhline(y=SCINTILLATOR_THRESHOLD, color='r', linestyle='--', label="CH1 & CH2 Threshold")
-                    axs[2].axhline(y=SMDT_THRESHOLD, color='g', linestyle='--', label="CH3 Threshold")
-                    axs[2].set_xlabel("Time (s)")
-                    axs[1].set_ylabel("Voltage (V)")
-                    fig.suptitle(f"Waveform for Event {event_count}")
-                    for ax in axs: ax.legend()
-                    for ax in axs: ax.grid()
-                    plt.tight_layout()
-plt.show()
+# One figure for the whole run, updated in place (decimated to screen resolution and blitted)
+viewer = WaveformViewer(thresholds=[(SCINTILLATOR_THRESHOLD, 'r', "CH1 & CH2 Threshold"), None,
+                                    (SMDT_THRESHOLD, 'g', "CH3 Threshold")])
+
+pipeline = AcquisitionPipeline(acquire_capture, find_events, save_event, analysis_workers=analysis_workers,
+                               queue_size=queue_size, capture_timeout=capture_timeout)
+with RunWriter(run_path) as run:
+    pipeline.run(max_captures=event_limit, idle=show_latest_event)
+show_latest_event()
 
 print(f"\nData collection complete. {event_count} events recorded.")
-print(f"Event files saved in: {save_dir}")
+print(f"Events saved in: {run_path}")
+viewer.show()
@@ -1,46 +1,32 @@
 import pandas as pd 
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.optimize import curve_fit
+from running_stats import StatsTable
+from gain_fit import fit_exponential
+import os
+from figure_renderer import SUMMARY_DIRECTORY, optimization_curve_job, render_figures, show_figures
 
 # Load the updated signal area data (make sure it's already been regenerated with the new voltage levels!)
 file_path = r"C:\Users\colin\OneDrive\Desktop\Voltage Optimization Data\sMDT_Signal_Area_By_Voltage.csv"
-data = pd.read_csv(file_path)
-
-# Group and calculate stats
-summary = data.groupby("Voltage (V)")["Signal Area (V·s)"].agg(["mean", "sem"]).reset_index()
-
-# Exponential fit function
-def exponential(x, a, b):
-    return a * np.exp(b * x)
-
-# Prepare data
-voltage_list = np.array(summary["Voltage (V)"])
-area_list = np.array(summary["mean"])
-
-# Fit curve
-try:
-    popt, _ = curve_fit(exponential, voltage_list, area_list, p0=(1e-9, 1e-3), maxfev=10000)
-except RuntimeError as e:
-    print("Fit failed:", e)
-    popt = [np.nan, np.nan]
-
-# Plot
-plt.figure(figsize=(10, 6))
-plt.errorbar(voltage_list, area_list, yerr=summary["sem"], fmt='o', label="Mean ± Standard Error", color="blue", capsize=4)
-
-# Plot exponential fit
-if not np.isnan(popt).any():
-    voltage_fit = np.linspace(min(voltage_list), max(voltage_list), 1000)
-    area_fit = exponential(voltage_fit, *popt)
-    plt.plot(voltage_fit, area_fit, color="red", label=f"Exponential Fit:\n$y = {popt[0]:.2e} \\, e^{{{popt[1]:.2e}x}}$")
-
-# Final touches
-plt.title("Voltage Optimization Curve")
-plt.xlabel("High-Voltage Supply (V)")
-plt.ylabel("Signal Area (V·s)")
-plt.grid(True)
-plt.legend()
-plt.tight_layout()
-plt.savefig("Voltage_Optimization_Curve.png", dpi=300)
-plt.show()
+# Group and calculate stats while reading, so the per-event table is never held in memory at once
+stats = StatsTable()
+for data in pd.read_csv(file_path, chunksize=100000):
+    stats.update_groups(data["Voltage (V)"], "Signal Area (V·s)", data["Signal Area (V·s)"])
+summary = stats.summary("Signal Area (V·s)")
+
+# Saved so figure_renderer.py can redraw the curve with the rest of the run's figures
+os.makedirs(SUMMARY_DIRECTORY, exist_ok=True)
+summary.to_csv(os.path.join(SUMMARY_DIRECTORY, "Voltage_Optimization_Summary.csv"), index=False)
+
+# Exponential fit weighted by the per-voltage SEM, seeded from a log-linear fit (see gain_fit.py)
+fit = fit_exponential(summary["Voltage (V)"].to_numpy(dtype=np.float64), summary["Mean"].to_numpy(), summary["SEM"].to_numpy())
+if fit["converged"]:
+    print(f"Fit: a = {fit['a']:.3e} ± {fit['a_err']:.1e}, b = {fit['b']:.4e} ± {fit['b_err']:.1e} 1/V, "
+          f"chi2/dof = {fit['chi2']:.2f}/{fit['dof']}")
+else:
+    print("Fit failed to converge")
+
+# Plot off-screen (skipped if the summary and fit are unchanged), then show it unless running headless
+figure_job = optimization_curve_job(summary, fit)
+render_figures([figure_job])
+print(f"Saved plot to: {figure_job['output']}")
+show_figures([figure_job])
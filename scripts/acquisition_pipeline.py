@@ -0,0 +1,158 @@
+import queue
+import threading
+import time
+
+# Marks the end of a stream on a queue
+_DONE = object()
+
+
+class AcquisitionPipeline:
+    """
+    Threaded capture -> analysis -> writer pipeline connected by bounded queues.
+
+    The acquisition thread only talks to the instrument, analysis worker threads run the event
+    logic, and a single writer thread persists events. When a queue is full the stage feeding it
+    waits (back-pressure); the acquisition stage can instead drop the capture after capture_timeout
+    seconds, so a slow analysis shows up as dropped captures rather than a stalled scope.
+    """
+
+    def __init__(self, acquire, analyze, write, analysis_workers=1, queue_size=8, capture_timeout=None):
+        """
+        Parameters:
+        - acquire: Called as acquire() in the acquisition thread; returns one capture.
+        - analyze: Called as analyze(capture) in a worker thread; returns a list of events to write.
+        - write: Called as write(event) in the writer thread.
+        - analysis_workers: Number of analysis threads.
+        - queue_size: Capacity of the capture and event queues.
+        - capture_timeout: Seconds to wait for room in the capture queue before dropping a capture
+          (None waits as long as needed, so nothing is dropped).
+        """
+        self.acquire = acquire
+        self.analyze = analyze
+        self.write = write
+        self.analysis_workers = analysis_workers
+        self.capture_timeout = capture_timeout
+        self.captures = queue.Queue(maxsize=queue_size)
+        self.events = queue.Queue(maxsize=queue_size)
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.error = None
+        self.counters = {"captured": 0, "dropped": 0, "analyzed": 0, "events": 0, "written": 0,
+                         "max capture queue": 0, "max event queue": 0}
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def track_depth(self, name, depth):
+        with self.lock:
+            self.counters[name] = max(self.counters[name], depth)
+
+    def fail(self, error):
+        """Records the first exception raised by a stage and stops the pipeline."""
+        with self.lock:
+            if self.error is None:
+                self.error = error
+        self.stop()
+
+    def stop(self):
+        """Stops acquiring; captures already queued are still analysed and written."""
+        self.stopping.set()
+
+    def acquisition_loop(self, max_captures):
+        try:
+            while not self.stopping.is_set():
+                if max_captures is not None and self.counters["captured"] >= max_captures:
+                    break
+                capture = self.acquire()
+                self.count("captured")
+                try:
+                    self.captures.put(capture, timeout=self.capture_timeout)
+                except queue.Full:
+                    self.count("dropped")
+                    continue
+                self.track_depth("max capture queue", self.captures.qsize())
+        except Exception as e:
+            self.fail(e)
+        finally:
+            for _ in range(self.analysis_workers):
+                self.captures.put(_DONE)  # One end marker per worker
+
+    def analysis_loop(self):
+        try:
+            while True:
+                capture = self.captures.get()
+                if capture is _DONE:
+                    break
+                found = self.analyze(capture)
+                self.count("analyzed")
+                for event in found or []:
+                    self.events.put(event)
+                    self.count("events")
+                    self.track_depth("max event queue", self.events.qsize())
+        except Exception as e:
+            self.fail(e)
+            while self.captures.get() is not _DONE:
+                pass  # Keep draining so the acquisition thread is never blocked
+        finally:
+            self.events.put(_DONE)
+
+    def writer_loop(self):
+        finished = 0
+        while finished < self.analysis_workers:
+            event = self.events.get()
+            if event is _DONE:
+                finished += 1
+                continue
+            if self.error is not None:
+                continue  # Drain without writing after a failure
+            try:
+                self.write(event)
+                self.count("written")
+            except Exception as e:
+                self.fail(e)
+
+    def status(self):
+        """One-line summary of the counters and current queue depths."""
+        with self.lock:
+            counters = dict(self.counters)
+        return (f"captured {counters['captured']} | dropped {counters['dropped']} | "
+                f"analysed {counters['analyzed']} | events {counters['events']} | written {counters['written']} | "
+                f"capture queue {self.captures.qsize()} (max {counters['max capture queue']}) | "
+                f"event queue {self.events.qsize()} (max {counters['max event queue']})")
+
+    def run(self, max_captures=None, report_interval=5.0, idle=None):
+        """
+        Runs the pipeline until stop() is called or max_captures captures have been taken,
+        printing the status line every report_interval seconds (None for no reports).
+        idle, if given, is called in the calling thread about every 0.1 s (e.g. to refresh a live plot,
+        which has to happen on the main thread).
+
+        Returns the final counters. An exception raised by any stage is re-raised here.
+        """
+        threads = [threading.Thread(target=self.acquisition_loop, args=(max_captures,), name="acquisition")]
+        threads += [threading.Thread(target=self.analysis_loop, name=f"analysis-{i}")
+                    for i in range(self.analysis_workers)]
+        threads.append(threading.Thread(target=self.writer_loop, name="writer"))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        last_report = time.time()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                threads[-1].join(timeout=0.1)
+                if idle is not None:
+                    idle()
+                if report_interval is not None and time.time() - last_report >= report_interval:
+                    print(self.status())
+                    last_report = time.time()
+        except KeyboardInterrupt:
+            self.stop()  # Ctrl+C: finish writing what is already queued
+            for thread in threads:
+                thread.join()
+
+        print(self.status())
+        if self.error is not None:
+            raise self.error
+        return dict(self.counters)
@@ -0,0 +1,495 @@
+import argparse
+import os
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from baseline import (BASELINE_METHOD, MIN_EVENT_SAMPLES, TRIGGER_GUARD, capture_baseline, detect_events,
+                      detection_threshold)
+from capture_batch import read_header
+from capture_loader import (CACHE_DIRECTORY_VARIABLE, CACHE_LIMIT_VARIABLE, CHANNEL_NAMES, DEFAULT_CHUNK_SIZE,
+                            extract_voltage, stream_capture, time_axis)
+from event_segmenter import PairStream, SegmentStream, find_segments, pair_triggers
+from event_metrics import MetricStream, segment_areas, segment_durations, segment_peaks, segment_time_to_peak
+from file_executor import map_files
+from instrumentation import TIMING_LOG, Instrumentation, dump_profiles, timed_load
+
+# Default locations (same layout the analysis scripts use when run from scripts/)
+DATA_DIRECTORY = os.path.join(os.path.dirname(os.getcwd()), "raw_data", "Experiment_1_Raw_Data")
+SUMMARY_DIRECTORY = os.path.join(os.path.dirname(os.getcwd()), "summary_reports")
+
+# Event detection settings shared by the stages
+SCINTILLATOR_THRESHOLD = 2.2  # Voltage threshold for CH1 & CH2
+SMDT_THRESHOLD = 0.0  # The latency stage takes the first sMDT sample below this voltage as the response
+
+# Channel the latency events are stored under: they are numbered per scintillator coincidence, not per
+# CH1 segment or sMDT dip, so they get their own event numbering in the capture catalog
+COINCIDENCE_CHANNEL = "CH1 & CH2"
+
+# Captures with a longer Record Length are read in chunks (see analyze_file), so peak memory stays
+# bounded whatever the record length; shorter ones are loaded whole
+STREAM_RECORD_LENGTH = 100000
+
+# Registered metric stages: name -> {"function", "output", "columns", "channel", "stream"}
+STAGES = {}
+
+
+def register_stage(name, output, columns, channel=None):
+    """
+    Registers a metric stage with the pipeline.
+
+    Parameters:
+    - name: Stage name used on the command line.
+    - output: File name of the summary table the stage writes.
+    - columns: Column names of that table.
+    - channel: Channel the stage's events come from, for tables without a "Channel" column.
+
+    The decorated function is called as function(file_name, columns, header) with the arrays
+    returned by load_capture and must return a dictionary of equal-length columns.
+    """
+    def decorator(function):
+        STAGES[name] = {"function": function, "output": output, "columns": columns, "channel": channel,
+                        "stream": None}
+        return function
+    return decorator
+
+
+def register_stream(name):
+    """
+    Registers the chunked version of a metric stage, used for captures that are streamed.
+
+    The decorated factory is called as factory(file_name, header) and returns an object whose
+    feed(offset, columns) takes the chunks of capture_loader.stream_capture in order and whose
+    finish() returns the same columns the stage returns for the whole record, or None if the
+    capture cannot be streamed (it is then loaded whole).
+    """
+    def decorator(factory):
+        STAGES[name]["stream"] = factory
+        return factory
+    return decorator
+
+
+class EventStream:
+    """
+    Chunked segmenting of one or more channels with per-event metrics (an event_metrics.MetricStream
+    per channel); finish() returns the events channel by channel, as the whole-record stages list them.
+
+    Parameters:
+    - file_name: Capture file name (the Filename column).
+    - channels: Channels to segment.
+    - threshold, polarity, baseline: See event_segmenter.event_mask.
+    - metrics: Dictionary of column name -> function(columns, starts, stops, channel) returning one value per event.
+    - min_samples: Events shorter than this are dropped (as baseline.detect_events does).
+    - constants: Extra columns holding the same value for every event.
+    """
+
+    def __init__(self, file_name, channels, threshold, metrics, polarity=">=", baseline=0.0, min_samples=0,
+                 constants=None):
+        self.file_name = file_name
+        self.min_samples = min_samples
+        self.constants = constants or {}
+        self.columns = ["Start Index", *metrics]
+        self.streams = {}
+        for channel in channels:
+            bound = {name: partial(metric, channel=channel) for name, metric in metrics.items()}
+            self.streams[channel] = MetricStream(channel, threshold, bound, polarity, baseline)
+        self.events = {channel: {column: [] for column in self.columns} for channel in channels}  # Arrays per chunk
+
+    def feed(self, offset, columns):
+        for channel, stream in self.streams.items():
+            starts, stops, values = stream.feed(offset, columns)
+            keep = stops - starts >= self.min_samples
+            self.events[channel]["Start Index"].append(starts[keep])
+            for name, array in values.items():
+                self.events[channel][name].append(array[keep])
+
+    def finish(self):
+        rows = {"Filename": [], "Channel": [], **{column: [] for column in self.columns}}
+        for channel, events in self.events.items():
+            count = sum(len(starts) for starts in events["Start Index"])
+            rows["Filename"] += [self.file_name] * count
+            rows["Channel"] += [channel] * count
+            for column in self.columns:
+                rows[column] += events[column]
+        for column in self.columns:
+            rows[column] = np.concatenate(rows[column]) if rows[column] else np.array([], dtype=np.intp)
+        for name, value in self.constants.items():
+            rows[name] = [value] * len(rows["Filename"])
+        return rows
+
+
+class SMDTEventStream:
+    """
+    Chunked sMDT event detection. The chunks up to the trigger point are held back until the pre-trigger
+    baseline and noise are known (capture_baseline on those samples gives the same estimate as on the
+    whole record), then every chunk goes through an EventStream with the detect_events threshold.
+
+    Parameters:
+    - file_name, header: As given to the stream factories.
+    - metrics: Dictionary of column name -> function(columns, starts, stops, channel, baseline).
+    - constants: Extra columns holding the same value for every event.
+    """
+
+    def __init__(self, file_name, header, metrics, constants=None):
+        self.file_name = file_name
+        self.header = header
+        self.metrics = metrics
+        self.constants = constants
+        self.prefix_length = int(np.floor(header["sMDT (V)"]["Trigger Point"])) - TRIGGER_GUARD
+        self.pending = []  # Chunks read before the baseline is known
+        self.events = None
+
+    @staticmethod
+    def supports(header):
+        """Whether the baseline of this capture can be estimated from a prefix of the record."""
+        trigger_point = header["sMDT (V)"].get("Trigger Point")
+        return (BASELINE_METHOD != "rolling" and trigger_point is not None
+                and np.floor(trigger_point) - TRIGGER_GUARD >= 2)
+
+    def start(self):
+        """Estimates the baseline from the held-back chunks and feeds them to the event stream."""
+        prefix = {name: np.concatenate([columns[name] for _, columns in self.pending])
+                  for name in ("Time (s)", "sMDT (V)")}
+        baseline, noise = capture_baseline(prefix, "sMDT (V)", self.header, method=BASELINE_METHOD)
+        metrics = {name: partial(metric, baseline=baseline) for name, metric in self.metrics.items()}
+        self.events = EventStream(self.file_name, ["sMDT (V)"], detection_threshold(noise, "<"), metrics,
+                                  polarity="<", baseline=baseline, min_samples=MIN_EVENT_SAMPLES,
+                                  constants=self.constants)
+        for offset, columns in self.pending:
+            self.events.feed(offset, columns)
+        self.pending = []
+
+    def feed(self, offset, columns):
+        if self.events is not None:
+            self.events.feed(offset, columns)
+            return
+        self.pending.append((offset, columns))
+        if offset + len(columns["Time (s)"]) >= self.prefix_length:
+            self.start()
+
+    def finish(self):
+        if self.events is None:  # Record shorter than its trigger point: the whole record is the prefix
+            self.start()
+        return self.events.finish()
+
+
+@register_stage("event_count", "Event_Count_Summary.csv",
+                ["Filename", "CH1 Events", "CH2 Events"])
+def event_count_stage(file_name, columns, header):
+    counts = {}
+    for channel in ["CH1 (V)", "CH2 (V)"]:
+        starts, stops = find_segments(columns[channel], SCINTILLATOR_THRESHOLD, polarity=">=", include_open=True)
+        counts[channel] = len(starts)
+    return {"Filename": [file_name], "CH1 Events": [counts["CH1 (V)"]], "CH2 Events": [counts["CH2 (V)"]]}
+
+
+@register_stream("event_count")
+class EventCountStream:
+    """Chunked event_count_stage (an event still open at the end of the record counts too)."""
+
+    def __init__(self, file_name, header):
+        self.file_name = file_name
+        self.streams = {channel: SegmentStream(SCINTILLATOR_THRESHOLD, ">=") for channel in ["CH1 (V)", "CH2 (V)"]}
+        self.counts = dict.fromkeys(self.streams, 0)
+
+    def feed(self, offset, columns):
+        for channel, stream in self.streams.items():
+            self.counts[channel] += len(stream.feed(columns[channel])[0])
+
+    def finish(self):
+        for channel, stream in self.streams.items():
+            self.counts[channel] += len(stream.finish()[0])
+        return {"Filename": [self.file_name], "CH1 Events": [self.counts["CH1 (V)"]],
+                "CH2 Events": [self.counts["CH2 (V)"]]}
+
+
+@register_stage("scintillator_area", "Scintillator_Signal_Area_Summary.csv",
+                ["Filename", "Channel", "Start Index", "Signal Area (V·s)"])
+def scintillator_area_stage(file_name, columns, header):
+    rows = {"Filename": [], "Channel": [], "Start Index": [], "Signal Area (V·s)": []}
+    for channel in ["CH1 (V)", "CH2 (V)"]:
+        starts, stops = find_segments(columns[channel], SCINTILLATOR_THRESHOLD, polarity=">=")
+        areas = segment_areas(columns["Time (s)"], columns[channel], starts, stops, rule="riemann")
+        rows["Filename"] += [file_name] * len(starts)
+        rows["Channel"] += [channel] * len(starts)
+        rows["Start Index"] += starts.tolist()
+        rows["Signal Area (V·s)"] += areas.tolist()
+    return rows
+
+
+@register_stream("scintillator_area")
+def scintillator_area_stream(file_name, header):
+    area = lambda columns, starts, stops, channel: segment_areas(
+        columns["Time (s)"], columns[channel], starts, stops, rule="riemann")
+    return EventStream(file_name, ["CH1 (V)", "CH2 (V)"], SCINTILLATOR_THRESHOLD, {"Signal Area (V·s)": area})
+
+
+@register_stage("scintillator_duration", "Scintillator_Event_Duration_Summary.csv",
+                ["Filename", "Channel", "Start Index", "Event Duration (s)"])
+def scintillator_duration_stage(file_name, columns, header):
+    rows = {"Filename": [], "Channel": [], "Start Index": [], "Event Duration (s)": []}
+    for channel in ["CH1 (V)", "CH2 (V)"]:
+        starts, stops = find_segments(columns[channel], SCINTILLATOR_THRESHOLD, polarity=">=")
+        rows["Filename"] += [file_name] * len(starts)
+        rows["Channel"] += [channel] * len(starts)
+        rows["Start Index"] += starts.tolist()
+        rows["Event Duration (s)"] += segment_durations(columns["Time (s)"], starts, stops).tolist()
+    return rows
+
+
+@register_stream("scintillator_duration")
+def scintillator_duration_stream(file_name, header):
+    duration = lambda columns, starts, stops, channel: segment_durations(columns["Time (s)"], starts, stops)
+    return EventStream(file_name, ["CH1 (V)", "CH2 (V)"], SCINTILLATOR_THRESHOLD, {"Event Duration (s)": duration})
+
+
+@register_stage("smdt_area", "sMDT_Signal_Area_Summary.csv",
+                ["Filename", "Start Index", "sMDT Signal Area (V·s)"], channel="sMDT (V)")
+def smdt_area_stage(file_name, columns, header):
+    # sMDT events are dips more than NOISE_THRESHOLD noise RMS below the pre-trigger baseline
+    baseline, noise = capture_baseline(columns, "sMDT (V)", header, method=BASELINE_METHOD)
+    starts, stops = detect_events(columns["sMDT (V)"], baseline, noise, polarity="<")
+    areas = segment_areas(columns["Time (s)"], columns["sMDT (V)"], starts, stops, rule="riemann", baseline=baseline)
+    return {"Filename": [file_name] * len(starts), "Start Index": starts, "sMDT Signal Area (V·s)": np.abs(areas)}
+
+
+@register_stream("smdt_area")
+def smdt_area_stream(file_name, header):
+    if not SMDTEventStream.supports(header):
+        return None
+    area = lambda columns, starts, stops, channel, baseline: np.abs(segment_areas(
+        columns["Time (s)"], columns[channel], starts, stops, rule="riemann", baseline=baseline))
+    return SMDTEventStream(file_name, header, {"sMDT Signal Area (V·s)": area})
+
+
+@register_stage("latency", "sMDT_Event_Latency_Summary.csv",
+                ["Filename", "Trigger Index", "Muon Event Latency (s)"], channel=COINCIDENCE_CHANNEL)
+def latency_stage(file_name, columns, header):
+    # Both scintillators above threshold arm the search; the first negative sMDT sample answers it
+    coincidence = (columns["CH1 (V)"] > SCINTILLATOR_THRESHOLD) & (columns["CH2 (V)"] > SCINTILLATOR_THRESHOLD)
+    triggers, responses = pair_triggers(coincidence, columns["sMDT (V)"] < SMDT_THRESHOLD)
+    latencies = columns["Time (s)"][responses] - columns["Time (s)"][triggers]
+    return {"Filename": [file_name] * len(triggers), "Trigger Index": triggers, "Muon Event Latency (s)": latencies}
+
+
+@register_stream("latency")
+class LatencyStream:
+    """Chunked latency_stage: a coincidence still waiting for its sMDT response stays armed into the next chunk."""
+
+    def __init__(self, file_name, header):
+        self.file_name = file_name
+        self.time_header = next(iter(header.values()))  # The time axis comes from the first channel block
+        self.pairs = PairStream()
+        self.triggers = []
+        self.latencies = []
+
+    def feed(self, offset, columns):
+        coincidence = (columns["CH1 (V)"] > SCINTILLATOR_THRESHOLD) & (columns["CH2 (V)"] > SCINTILLATOR_THRESHOLD)
+        triggers, responses = self.pairs.feed(coincidence, columns["sMDT (V)"] < SMDT_THRESHOLD)
+        time = columns["Time (s)"]
+        # A trigger armed in an earlier chunk gets its time from the header, the way the time axis is built
+        trigger_times = np.array([time[index - offset] if index >= offset else time_axis(self.time_header, 1, index)[0]
+                                  for index in triggers], dtype=np.float64)
+        self.triggers.append(triggers)
+        self.latencies.append(time[responses - offset] - trigger_times)
+
+    def finish(self):
+        triggers = np.concatenate(self.triggers) if self.triggers else np.array([], dtype=np.intp)
+        latencies = np.concatenate(self.latencies) if self.latencies else np.array([])
+        return {"Filename": [self.file_name] * len(triggers), "Trigger Index": triggers,
+                "Muon Event Latency (s)": latencies}
+
+
+@register_stage("peak_timing", "sMDT_Peak_Voltage_Summary.csv",
+                ["Filename", "Voltage (V)", "Start Index", "sMDT Peak Voltage (V)", "Time to Peak (s)"],
+                channel="sMDT (V)")
+def peak_timing_stage(file_name, columns, header):
+    smdt = columns["sMDT (V)"]
+    baseline, noise = capture_baseline(columns, "sMDT (V)", header, method=BASELINE_METHOD)
+    starts, stops = detect_events(smdt, baseline, noise, polarity="<")
+    peaks = np.abs(segment_peaks(smdt, starts, stops, polarity="<", baseline=baseline))
+    times = segment_time_to_peak(columns["Time (s)"], smdt, starts, stops, polarity="<")
+    voltage = extract_voltage(file_name)
+    return {"Filename": [file_name] * len(starts), "Voltage (V)": [voltage] * len(starts),
+            "Start Index": starts, "sMDT Peak Voltage (V)": peaks, "Time to Peak (s)": times}
+
+
+@register_stream("peak_timing")
+def peak_timing_stream(file_name, header):
+    if not SMDTEventStream.supports(header):
+        return None
+    peak = lambda columns, starts, stops, channel, baseline: np.abs(segment_peaks(
+        columns[channel], starts, stops, polarity="<", baseline=baseline))
+    time_to_peak = lambda columns, starts, stops, channel, baseline: segment_time_to_peak(
+        columns["Time (s)"], columns[channel], starts, stops, polarity="<")
+    return SMDTEventStream(file_name, header, {"sMDT Peak Voltage (V)": peak, "Time to Peak (s)": time_to_peak},
+                           constants={"Voltage (V)": extract_voltage(file_name)})
+
+
+def stream_file(file_path, stages, channel_names=CHANNEL_NAMES, instrumentation=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                stream_above=0):
+    """
+    Runs the given stages on a capture read chunk_size samples at a time; returns {stage name: result columns}.
+
+    Every chunk goes through the chunked version of each stage (see register_stream), so peak memory
+    stays bounded by the chunk size plus the longest event and the results match analyze_file on the
+    whole record. Returns None, having read only the header, if the capture's Record Length is not
+    above stream_above or a stage cannot stream it.
+    """
+    instrumentation = Instrumentation() if instrumentation is None else instrumentation
+    file = os.path.basename(file_path)
+    header = dict(zip(channel_names, read_header(file_path, len(channel_names))))
+    if header[channel_names[0]].get("Record Length", 0) <= stream_above:
+        return None
+    consumers = {}
+    for name in stages:
+        factory = STAGES[name]["stream"]
+        consumers[name] = factory(file, header) if factory is not None else None
+        if consumers[name] is None:
+            return None
+
+    header, chunks = stream_capture(file_path, channel_names, chunk_size)
+    while True:
+        with instrumentation.stage("load") as counters:
+            chunk = next(chunks, None)
+            if chunk is None:
+                counters["files"] += 1
+                counters["bytes"] += os.path.getsize(file_path)
+                break
+            counters["samples"] += len(chunk[1]["Time (s)"])
+        offset, columns = chunk
+        for name, consumer in consumers.items():
+            with instrumentation.stage(name, samples=len(columns["Time (s)"])):
+                consumer.feed(offset, columns)
+
+    results = {}
+    for name, consumer in consumers.items():
+        with instrumentation.stage(name, files=1) as counters:
+            results[name] = consumer.finish()
+            counters["events"] += len(results[name][STAGES[name]["columns"][0]])
+    return results
+
+
+def analyze_file(file_path, stages, channel_names=CHANNEL_NAMES, instrumentation=None, chunk_size=None,
+                 stream_above=STREAM_RECORD_LENGTH):
+    """
+    Loads one capture and runs the given stages on it; returns {stage name: result columns}.
+
+    With an Instrumentation, the load and every metric stage are timed, with the samples handled
+    and the rows (events) each stage produced. With chunk_size set, a capture whose Record Length
+    exceeds stream_above is streamed instead (see stream_file); the results are the same.
+    """
+    instrumentation = Instrumentation() if instrumentation is None else instrumentation
+    if chunk_size:
+        results = stream_file(file_path, stages, channel_names, instrumentation, chunk_size, stream_above)
+        if results is not None:
+            return results
+
+    columns, header = timed_load(instrumentation, file_path, channel_names)
+    file = os.path.basename(file_path)
+    results = {}
+    for name in stages:
+        with instrumentation.stage(name, files=1, samples=len(columns["Time (s)"])) as counters:
+            results[name] = STAGES[name]["function"](file, columns, header)
+            counters["events"] += len(results[name][STAGES[name]["columns"][0]])
+    return results
+
+
+def analyze_file_timed(file_path, stages, channel_names=CHANNEL_NAMES, profile_directory=None, chunk_size=None,
+                       stream_above=STREAM_RECORD_LENGTH):
+    """analyze_file for worker processes: returns (results, stage counters) so the parent can merge the timings."""
+    instrumentation = Instrumentation(profile_directory=profile_directory)
+    results = analyze_file(file_path, stages, channel_names, instrumentation, chunk_size, stream_above)
+    return results, instrumentation.stages
+
+
+def run_pipeline(directory=DATA_DIRECTORY, output_directory=SUMMARY_DIRECTORY, stages=None,
+                 channel_names=CHANNEL_NAMES, workers=1, chunksize=1, instrumentation=None, files=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE, stream_above=STREAM_RECORD_LENGTH):
+    """
+    Reads every capture in a directory once and fans the arrays out to the registered metric stages.
+
+    Parameters:
+    - directory: Folder of oscilloscope .csv captures.
+    - output_directory: Folder the per-stage summary tables are written to (None to skip writing).
+    - stages: Names of the stages to run (default: all registered stages).
+    - channel_names: Channel names passed to load_capture.
+    - workers, chunksize: Process pool settings passed to file_executor.map_files.
+    - instrumentation: Optional Instrumentation that receives the load, per-stage and summarize timings
+      (from the worker processes too).
+    - files: Capture file names in directory to read (default: every .csv file).
+    - chunk_size: Samples per chunk for captures whose Record Length exceeds stream_above; they are
+      streamed with bounded memory instead of loaded whole (None loads every capture whole).
+
+    Returns a dictionary of summary DataFrames keyed by stage name.
+    """
+    stages = list(STAGES) if stages is None else stages
+    instrumentation = Instrumentation() if instrumentation is None else instrumentation
+    collected = {name: {column: [] for column in STAGES[name]["columns"]} for name in stages}
+
+    analyze = partial(analyze_file_timed, stages=stages, channel_names=channel_names,
+                      profile_directory=instrumentation.profile_directory, chunk_size=chunk_size,
+                      stream_above=stream_above)
+    for file, (results, timings) in map_files(analyze, directory, files, workers, chunksize):
+        instrumentation.merge(timings)
+        for name in stages:
+            for column in STAGES[name]["columns"]:
+                collected[name][column].append(np.asarray(results[name][column]))
+
+    with instrumentation.stage("summarize") as counters:
+        summaries = {}
+        for name in stages:
+            table = {}
+            for column, parts in collected[name].items():
+                parts = [part for part in parts if len(part)]  # Files without events add nothing
+                table[column] = np.concatenate(parts) if parts else []
+            summaries[name] = pd.DataFrame(table, columns=STAGES[name]["columns"])
+            counters["events"] += len(summaries[name])
+
+        if output_directory is not None:
+            os.makedirs(output_directory, exist_ok=True)  # Ensure the directory exists
+            for name, summary in summaries.items():
+                output_file = os.path.join(output_directory, STAGES[name]["output"])
+                summary.to_csv(output_file, index=False)
+                counters["bytes"] += os.path.getsize(output_file)
+                print(f"{name}: {len(summary)} rows saved to {output_file}")
+
+    return summaries
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run every metric stage over a capture directory in one pass.")
+    parser.add_argument("directory", nargs="?", default=DATA_DIRECTORY, help="Folder of capture .csv files")
+    parser.add_argument("--output", default=SUMMARY_DIRECTORY, help="Folder for the summary tables")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), help="Stages to run (default: all)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (default: 1, serial)")
+    parser.add_argument("--chunksize", type=int, default=1, help="Files handed to a worker at a time")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help=f"Samples per chunk when streaming long captures (default: {DEFAULT_CHUNK_SIZE}, 0 loads every capture whole)")
+    parser.add_argument("--stream-above", type=int, default=STREAM_RECORD_LENGTH,
+                        help=f"Stream captures with a longer Record Length (default: {STREAM_RECORD_LENGTH})")
+    parser.add_argument("--cache", help="Folder for the binary capture cache (speeds up repeat runs)")
+    parser.add_argument("--cache-mb", type=float, help="Size limit of the capture cache in MB")
+    parser.add_argument("--log", help=f"Timing log, .csv or JSON lines (default: {TIMING_LOG} in the output folder)")
+    parser.add_argument("--profile", metavar="FOLDER", help="Run every stage under cProfile and write .pstats files here")
+    args = parser.parse_args()
+
+    # Set through the environment so worker processes use the same cache
+    if args.cache:
+        os.environ[CACHE_DIRECTORY_VARIABLE] = args.cache
+    if args.cache_mb:
+        os.environ[CACHE_LIMIT_VARIABLE] = str(args.cache_mb)
+
+    print(f"Processing files in: {args.directory}")
+    instrumentation = Instrumentation("analysis_pipeline", profile_directory=args.profile)
+    run_pipeline(args.directory, args.output, args.stages, workers=args.workers, chunksize=args.chunksize,
+                 instrumentation=instrumentation, chunk_size=args.chunk_size, stream_above=args.stream_above)
+
+    log_path = args.log or os.path.join(args.output, TIMING_LOG)
+    instrumentation.save(log_path)
+    print(instrumentation.summary())
+    print(f"Timing log: {log_path}")
+    if args.profile:
+        dump_profiles()
+        print(f"Profiles saved to: {args.profile} (view with python -m pstats)")
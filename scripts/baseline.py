@@ -0,0 +1,236 @@
+import numpy as np
+
+from event_segmenter import find_segments
+
+# Baseline estimators
+METHODS = ["pretrigger", "trimmed", "rolling"]
+BASELINE_METHOD = "trimmed"
+
+TRIGGER_GUARD = 10  # Samples just before the trigger point left out of the pre-trigger region
+TRIM_FRACTION = 0.1  # Fraction cut from each end of the sorted pre-trigger samples by the trimmed mean
+ROLLING_WINDOW = 201  # Samples in the rolling median/percentile window
+ROLLING_PERCENTILE = 50.0  # 50 is the rolling median; a higher one ignores negative pulses better
+ROLLING_STEP = 25  # The rolling estimate is evaluated every ROLLING_STEP samples and interpolated
+
+# Events start this many noise RMS beyond the baseline
+NOISE_THRESHOLD = 5.0
+MIN_EVENT_SAMPLES = 2  # Shorter excursions are single-sample spikes (zero area under the Riemann rule)
+
+# Scale of the median absolute deviation to the standard deviation of Gaussian noise
+MAD_TO_SIGMA = 1.4826
+
+# ADC levels per vertical division of the DPO2024B (8 bits over 10 divisions)
+LEVELS_PER_DIVISION = 25
+
+
+def adc_resolution(channel_header):
+    """
+    Voltage step of one ADC level (0 if unknown): the channel's YMUlt when it has one (event archives
+    store it), or else its Vertical Scale over LEVELS_PER_DIVISION.
+    """
+    if "YMUlt" in channel_header:
+        return channel_header["YMUlt"]
+    return channel_header.get("Vertical Scale", 0.0) / LEVELS_PER_DIVISION
+
+
+def trigger_from_time(time):
+    """
+    Trigger Point (in samples) of a capture whose time axis is zero at the trigger (as load_capture builds it).
+
+    The zero crossing is interpolated from the first two samples and rounded to a millionth of a
+    sample, so its floor is the floor of the header's Trigger Point (399.99998757 gives 399, 400 gives 400).
+    """
+    time = np.asarray(time)
+    if len(time) < 2 or time[1] == time[0]:
+        return None
+    return round(float(-time[0] / (time[1] - time[0])), 6)
+
+
+def pretrigger_mask(trigger_points, sample_count, guard=TRIGGER_GUARD):
+    """
+    (captures x samples) mask of the samples before each capture's trigger point (less guard samples).
+    Captures without a usable pre-trigger region (trigger point None/NaN or too early) use every sample.
+    """
+    trigger_points = np.asarray(trigger_points, dtype=np.float64).reshape(-1, 1)
+    ends = np.floor(np.nan_to_num(trigger_points, nan=sample_count)) - guard
+    ends = np.where(ends >= 2, ends, sample_count)
+    return np.arange(sample_count) < ends
+
+
+def _sorted_rows(values, mask):
+    """Each row's masked values sorted ascending (NaN padded at the end) and their counts."""
+    return np.sort(np.where(mask, values, np.nan), axis=1), mask.sum(axis=1)
+
+
+def _row_quantile(ordered, counts, q):
+    """Quantile q of each row of _sorted_rows output (linear interpolation)."""
+    position = q * (counts - 1)
+    below = np.floor(position).astype(np.intp)
+    above = np.minimum(below + 1, counts - 1)
+    fraction = position - below
+    rows = np.arange(len(ordered))
+    return ordered[rows, below] * (1 - fraction) + ordered[rows, above] * fraction
+
+
+def _robust_noise(residuals, mask):
+    """MAD-based noise RMS of each row's masked residuals."""
+    ordered, counts = _sorted_rows(np.abs(residuals), mask)
+    return MAD_TO_SIGMA * _row_quantile(ordered, counts, 0.5)
+
+
+def rolling_percentile(samples, window=ROLLING_WINDOW, percentile=ROLLING_PERCENTILE, step=ROLLING_STEP):
+    """
+    Rolling percentile of every row of a (captures x samples) array.
+
+    The percentile is taken over window samples centred every step samples (ends padded with the
+    edge values) and linearly interpolated in between, so the cost is samples * window / step
+    instead of samples * window.
+    """
+    captures, sample_count = samples.shape
+    window = max(1, min(window, sample_count))
+    half = window // 2
+    padded = np.pad(samples, ((0, 0), (half, window - 1 - half)), mode="edge")
+    centers = np.arange(0, sample_count, max(1, step))
+    if centers[-1] != sample_count - 1:
+        centers = np.append(centers, sample_count - 1)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window, axis=1)[:, centers]
+    levels = np.percentile(windows, percentile, axis=2)
+
+    # Linear interpolation between the evaluated centres (shared by every row)
+    right = np.clip(np.searchsorted(centers, np.arange(sample_count), side="right"), 1, len(centers) - 1)
+    left = right - 1
+    span = centers[right] - centers[left]
+    fraction = (np.arange(sample_count) - centers[left]) / np.where(span > 0, span, 1)
+    return levels[:, left] * (1 - fraction) + levels[:, right] * fraction
+
+
+def estimate_baseline(samples, method=BASELINE_METHOD, trigger_points=None, trim=TRIM_FRACTION,
+                      window=ROLLING_WINDOW, percentile=ROLLING_PERCENTILE, guard=TRIGGER_GUARD, resolution=0.0):
+    """
+    Baseline and noise RMS of a batch of captures, all at once.
+
+    Parameters:
+    - samples: (captures x samples) voltages of one channel (a single 1-D capture also works).
+    - method:
+        "pretrigger": mean of the pre-trigger samples; noise is their standard deviation.
+        "trimmed": mean of the pre-trigger samples after dropping the trim fraction at each end
+          (pulses and spikes that leak into the pre-trigger region); noise from their median
+          absolute deviation.
+        "rolling": rolling percentile over the whole record (follows drifts; the baseline is
+          per sample); noise from the median absolute deviation of the pre-trigger residuals.
+    - trigger_points: Trigger Point of every capture (header field, in samples). None uses the
+      whole record as the pre-trigger region.
+    - trim: Fraction cut from each end by "trimmed".
+    - window, percentile: Rolling window (samples) and percentile of "rolling".
+    - guard: Samples just before the trigger point left out of the pre-trigger region.
+    - resolution: ADC step (V), one for all captures or one per capture; the noise is never taken below
+      its quantization noise, resolution / sqrt(12).
+
+    Returns a dictionary with baseline (one value per capture, or captures x samples for "rolling")
+    and noise (one RMS per capture). For 1-D input both are scalars / 1-D.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown baseline method {method!r}, expected one of {METHODS}.")
+    samples = np.asarray(samples, dtype=np.float64)
+    single = samples.ndim == 1
+    samples = np.atleast_2d(samples)
+    captures, sample_count = samples.shape
+    if trigger_points is None:
+        trigger_points = np.full(captures, np.nan)
+    mask = pretrigger_mask(np.broadcast_to(np.asarray(trigger_points, dtype=np.float64), (captures,)), sample_count, guard)
+    counts = mask.sum(axis=1)
+
+    if method == "pretrigger":
+        # Running sums read at each row's last pre-trigger sample: unlike sum(), the result does not
+        # depend on how many samples follow, so a streamed pre-trigger prefix gives the same estimate
+        rows, last = np.arange(captures), counts - 1
+        region = slice(0, counts.max())
+        baseline = np.cumsum(np.where(mask, samples, 0.0)[:, region], axis=1)[rows, last] / counts
+        squares = np.where(mask, (samples - baseline[:, None]) ** 2, 0.0)[:, region]
+        noise = np.sqrt(np.cumsum(squares, axis=1)[rows, last] / counts)
+    elif method == "trimmed":
+        ordered, counts = _sorted_rows(samples, mask)
+        cut = np.floor(trim * counts).astype(np.intp)
+        kept = counts - 2 * cut
+        sums = np.concatenate((np.zeros((captures, 1)), np.nancumsum(ordered, axis=1)), axis=1)
+        rows = np.arange(captures)
+        baseline = (sums[rows, counts - cut] - sums[rows, cut]) / kept
+        noise = _robust_noise(samples - baseline[:, None], mask)
+    else:
+        baseline = rolling_percentile(samples, window, percentile)
+        noise = _robust_noise(samples - baseline, mask)
+
+    noise = np.maximum(noise, resolution / np.sqrt(12))
+    if single:
+        return {"baseline": baseline[0] if baseline.ndim == 2 else float(baseline[0]), "noise": float(noise[0])}
+    return {"baseline": baseline, "noise": noise}
+
+
+def capture_baseline(columns, channel, header=None, method=BASELINE_METHOD, **options):
+    """
+    Baseline and noise RMS of one channel of a capture (columns as load_capture or an event archive returns them).
+
+    The pre-trigger region comes from the channel's Trigger Point header field, or else from where
+    the time axis crosses zero. Extra options are passed to estimate_baseline.
+    Returns (baseline, noise).
+    """
+    channel_header = (header or {}).get(channel, {})
+    trigger_point = channel_header.get("Trigger Point")
+    if trigger_point is None and "Time (s)" in columns:
+        trigger_point = trigger_from_time(columns["Time (s)"])
+    options.setdefault("resolution", adc_resolution(channel_header))
+    result = estimate_baseline(columns[channel], method, trigger_point, **options)
+    return result["baseline"], result["noise"]
+
+
+def batch_baseline(samples, lengths, trigger_points=None, method=BASELINE_METHOD, resolution=0.0, **options):
+    """
+    Baseline and noise RMS of every capture of a NaN-padded batch (as capture_batch.load_batch returns it).
+
+    Parameters:
+    - samples: (captures x samples) voltages of one channel, NaN past the end of shorter records.
+    - lengths: Valid samples of every capture.
+    - trigger_points: Trigger Point of every capture (NaN or None: the whole record is the pre-trigger region).
+    - method: Baseline method (see estimate_baseline).
+    - resolution: ADC step (V), one for all captures or one per capture.
+
+    Captures of the same length are estimated together in one estimate_baseline call, so the
+    padding never enters an estimate and a batch of equal-length records costs a single call.
+    Extra options are passed to estimate_baseline.
+    Returns (baselines, noise): a list with each capture's baseline (a float, or an array of the
+    record's length for "rolling") and an array with each capture's noise RMS.
+    """
+    samples = np.atleast_2d(samples)
+    captures = len(samples)
+    lengths = np.asarray(lengths, dtype=np.intp)
+    if trigger_points is None:
+        trigger_points = np.full(captures, np.nan)
+    trigger_points = np.broadcast_to(np.asarray(trigger_points, dtype=np.float64), (captures,))
+    resolution = np.broadcast_to(np.asarray(resolution, dtype=np.float64), (captures,))
+
+    baselines = [None] * captures
+    noise = np.empty(captures)
+    for length in np.unique(lengths):
+        rows = np.flatnonzero(lengths == length)
+        result = estimate_baseline(samples[rows, :length], method, trigger_points[rows],
+                                   resolution=resolution[rows], **options)
+        noise[rows] = result["noise"]
+        for row, baseline in zip(rows, result["baseline"]):
+            baselines[row] = baseline if np.ndim(baseline) else float(baseline)
+    return baselines, noise
+
+
+def detection_threshold(noise, polarity="<", k=NOISE_THRESHOLD):
+    """Threshold relative to the baseline (for event_segmenter.find_segments): k noise RMS beyond it."""
+    return -k * noise if polarity in ("<", "<=") else k * noise
+
+
+def detect_events(values, baseline, noise, polarity="<", k=NOISE_THRESHOLD, min_samples=MIN_EVENT_SAMPLES):
+    """
+    Segments that go more than k noise RMS beyond the baseline for at least min_samples samples.
+
+    Returns (starts, stops) as event_segmenter.find_segments does.
+    """
+    starts, stops = find_segments(values, detection_threshold(noise, polarity, k), polarity=polarity, baseline=baseline)
+    keep = stops - starts >= min_samples
+    return starts[keep], stops[keep]
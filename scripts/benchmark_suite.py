@@ -0,0 +1,194 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+from datetime import datetime
+
+import matplotlib
+import numpy as np
+
+from analysis_pipeline import run_pipeline
+from capture_loader import CACHE_DIRECTORY_VARIABLE
+from figure_renderer import render, signal_area_job
+from histogram_accumulator import Histogram
+from instrumentation import COUNTERS, Instrumentation
+from running_stats import RunningStats
+from synthetic_captures import RECORD_LENGTH, write_dataset
+
+# Size of the current dataset (raw_data/Experiment_1_Raw_Data: 99 captures, almost all of RECORD_LENGTH samples)
+BASE_FILES = 99
+SCALES = [1, 100, 10000]
+
+# Distinct synthetic captures written per scale; larger scales read them several times over
+MAX_FILES = 1000
+
+# Runs per scale; every stage reports its median run and the spread between runs
+REPEAT = 5
+
+# A stage is flagged when its time per unit grows by more than this fraction over the baseline
+# (or by more than the spread measured between runs, if that is larger)
+REGRESSION_THRESHOLD = 0.2
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.getcwd()), "summary_reports", "benchmark_results.json")
+BASELINE_PATH = os.path.join(os.path.dirname(os.getcwd()), "summary_reports", "benchmark_baseline.json")
+
+def run_scale(data_directory, scale, max_files=MAX_FILES, seed=0):
+    """
+    Times the shipped analysis on scale times the current dataset (BASE_FILES captures of RECORD_LENGTH samples).
+
+    The captures go through analysis_pipeline.run_pipeline, so the stages timed are its own: load
+    (load_capture), every registered metric stage and summarize, counted by its Instrumentation.
+    The area summaries are then aggregated into per-channel statistics and histograms, and the
+    signal area histogram is rendered with figure_renderer, as Scintillator Event Areas.py does.
+    At most max_files distinct captures are generated; the rest of the scale is made up by passes
+    over them again, so the per-file costs are measured without the disk space of the full dataset.
+    Returns {stage: {seconds, calls, files, samples, events, bytes, files_per_s, samples_per_s}}.
+    """
+    total_files = BASE_FILES * scale
+    distinct = min(total_files, max_files)
+    paths = write_dataset(os.path.join(data_directory, f"{distinct}_files"), distinct, RECORD_LENGTH, seed=seed)
+    directory = os.path.dirname(paths[0])
+    files = [os.path.basename(path) for path in paths]
+
+    instrumentation = Instrumentation("benchmark")
+    channels = ["CH1 (V)", "CH2 (V)"]
+    stats = {channel: RunningStats() for channel in channels}
+    histograms = {channel: Histogram.linear(0.0, 1e-7, 4000) for channel in channels}
+    for first in range(0, total_files, distinct):
+        summaries = run_pipeline(directory, output_directory=None, instrumentation=instrumentation,
+                                 files=files[:min(distinct, total_files - first)])
+        with instrumentation.stage("aggregate") as counters:
+            areas = summaries["scintillator_area"]
+            for channel in channels:
+                values = np.abs(areas.loc[areas["Channel"] == channel, "Signal Area (V·s)"].to_numpy(dtype=np.float64))
+                stats[channel].update_many(values)
+                histograms[channel].fill(values)
+                counters["events"] += len(values)
+
+    # One figure from the accumulated counts, drawn off-screen as the analysis scripts draw it
+    with instrumentation.stage("plot", files=1):
+        render(signal_area_job(histograms, {channel: (stats[channel].mean, stats[channel].sem()) for channel in channels},
+                               data_directory))
+
+    results = {}
+    for stage, counters in instrumentation.stages.items():
+        seconds = counters["seconds"]
+        results[stage] = {counter: counters[counter] for counter in COUNTERS}
+        results[stage]["files_per_s"] = counters["files"] / seconds if seconds and counters["files"] else None
+        results[stage]["samples_per_s"] = counters["samples"] / seconds if seconds and counters["samples"] else None
+    return results
+
+
+def median_run(runs):
+    """
+    Per stage, the run with the median time (the lower one of the middle two for an even count) and the
+    spread between runs: the interquartile range of the times over the median, so one cold or
+    disturbed run does not widen it.
+    """
+    results = {}
+    for stage in runs[0]:
+        ordered = sorted((run[stage] for run in runs), key=lambda result: result["seconds"])
+        median = dict(ordered[(len(ordered) - 1) // 2])
+        spread = ordered[len(ordered) * 3 // 4]["seconds"] - ordered[len(ordered) // 4]["seconds"]
+        median["spread"] = spread / median["seconds"] if median["seconds"] else 0.0
+        results[stage] = median
+    return results
+
+
+def run_suite(scales=SCALES, data_directory=None, max_files=MAX_FILES, repeat=REPEAT):
+    """
+    Runs every scale repeat times, keeping each stage's median run, and returns the results document.
+
+    Parameters:
+    - scales: Multiples of the current dataset size.
+    - data_directory: Folder for the synthetic captures (default: a temporary folder, removed afterwards).
+    - max_files: Distinct captures generated per scale.
+    - repeat: Runs per scale.
+
+    The capture cache is switched off, so the load stage always times the CSV parse.
+    """
+    temporary = None
+    if data_directory is None:
+        temporary = tempfile.TemporaryDirectory(prefix="smdt_benchmark_")
+        data_directory = temporary.name
+    os.environ.pop(CACHE_DIRECTORY_VARIABLE, None)
+
+    document = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "machine": {"platform": platform.platform(), "processor": platform.processor(), "cpus": os.cpu_count(),
+                    "python": platform.python_version(), "numpy": np.__version__, "matplotlib": matplotlib.__version__},
+        "base": {"files": BASE_FILES, "record_length": RECORD_LENGTH},
+        "results": {},
+    }
+    try:
+        for scale in scales:
+            results = median_run([run_scale(data_directory, scale, max_files) for _ in range(max(1, repeat))])
+            document["results"][f"{scale}x"] = results
+            print(f"{scale}x: " + ", ".join(f"{stage} {result['seconds']:.3f} s (±{result['spread'] / 2:.0%})"
+                                            for stage, result in results.items()))
+    finally:
+        if temporary is not None:
+            temporary.cleanup()
+    return document
+
+
+def time_per_unit(result):
+    """Seconds per sample (per event for summarize and aggregate, per figure for plot)."""
+    return result["seconds"] / (result["samples"] or result["events"] or result["files"] or result.get("calls") or 1)
+
+
+def compare(document, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Flags stages slower than the baseline by more than threshold (time per unit, see time_per_unit).
+
+    A slowdown within the spread measured between the repeated runs (of either document) is taken
+    as noise and not flagged. Stages missing from the baseline are skipped.
+    Returns a list of rows (scale, stage, baseline value, current value, ratio, regression).
+    """
+    rows = []
+    for scale, stages in document["results"].items():
+        for stage, current in stages.items():
+            previous = baseline.get("results", {}).get(scale, {}).get(stage)
+            if previous is None or not previous["seconds"]:
+                continue
+            ratio = time_per_unit(current) / time_per_unit(previous)
+            allowed = max(threshold, current.get("spread", 0.0), previous.get("spread", 0.0))
+            rows.append((scale, stage, time_per_unit(previous), time_per_unit(current), ratio, ratio > 1 + allowed))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the analysis pipeline stages, aggregation and plotting on synthetic captures.")
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES, help="Multiples of the current dataset (default: 1 100 10000)")
+    parser.add_argument("--data", help="Folder for the synthetic captures (kept and reused between runs)")
+    parser.add_argument("--max-files", type=int, default=MAX_FILES, help="Distinct captures generated per scale")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help=f"Runs per scale (the median is kept; default: {REPEAT})")
+    parser.add_argument("--output", default=RESULTS_PATH, help="JSON results file")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="JSON baseline to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Slowdown fraction flagged as a regression")
+    args = parser.parse_args()
+
+    document = run_suite(args.scales, args.data, args.max_files, args.repeat)
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+    print(f"Results saved to: {args.output}")
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        for scale, stage, previous, current, ratio, regression in compare(document, baseline, args.threshold):
+            flag = "REGRESSION" if regression else "ok"
+            print(f"{scale:>7} {stage:<10} {previous:.3e} -> {current:.3e} s/unit ({ratio:.2f}x) {flag}")
+            if regression:
+                regressions.append((scale, stage))
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+        print(f"Baseline saved to: {args.baseline}")
+
+    if regressions:
+        raise SystemExit(f"{len(regressions)} stage(s) slower than the baseline by more than {args.threshold:.0%}")
@@ -0,0 +1,141 @@
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from baseline import BASELINE_METHOD, LEVELS_PER_DIVISION, batch_baseline
+from capture_loader import BLOCK_WIDTH, CHANNEL_NAMES, HEADER_ROWS, default_cache, parse_header, read_samples
+from file_executor import list_capture_files
+
+# Threads reading files at once (file reads and the C parser overlap; the per-file work is small)
+DEFAULT_THREADS = min(8, os.cpu_count() or 1)
+
+# Per-file header fields copied into the metadata table (taken from the first channel block)
+METADATA_FIELDS = ["Record Length", "Sample Interval", "Trigger Point"]
+
+
+def read_header(file_path, channel_count):
+    """
+    Parses only the header rows of a capture (one dictionary per channel block).
+    Raises ValueError if the file is not a capture with enough channel blocks.
+    """
+    with open(file_path, "r", newline="") as f:
+        lines = [line.rstrip("\r\n") for line in itertools.islice(f, HEADER_ROWS)]
+    block_count = len(lines[0].split(",")) // BLOCK_WIDTH if lines else 0
+    if block_count < channel_count or not lines[0].startswith("Record Length"):
+        raise ValueError(f"{file_path} is not a capture with {channel_count} channel block(s).")
+    return parse_header(lines, channel_count)
+
+
+def _read_into(out, row, file_path, channel_names):
+    """Parses one capture into out[row] (through the capture cache when it is enabled); returns its sample count."""
+    cache = default_cache()
+    if cache is not None:
+        columns, _ = cache.load(file_path, channel_names)
+        samples = np.stack([columns[name] for name in channel_names])
+    else:
+        samples, _ = read_samples(file_path, len(channel_names))
+    count = min(samples.shape[1], out.shape[2])
+    out[row, :, :count] = samples[:, :count]
+    return count
+
+
+def load_batch(directory=None, files=None, channel_names=CHANNEL_NAMES, sample_count=None, threads=DEFAULT_THREADS):
+    """
+    Loads every capture of a directory (or a list of files) into one (files x channels x samples) array.
+
+    Parameters:
+    - directory: Folder holding the captures (every .csv file in it, in sorted order).
+    - files: File paths to load instead, or file names relative to directory.
+    - channel_names: Names given to the channel blocks, in file order.
+    - sample_count: Samples kept per record (default: the longest Record Length in the batch).
+    - threads: Threads reading files at once (1 reads them one after another).
+
+    The headers are read first (18 lines per file) to size the array, which is then allocated once
+    and filled in place by a thread pool. Records shorter than sample_count are padded with NaN,
+    so NaN-aware reductions (np.nanmean, np.nansum, ...) over the sample axis handle mixed lengths.
+
+    Returns (samples, metadata): samples is a float64 array indexed [file, channel, sample] and
+    metadata a DataFrame with one row per file: File, Path, Record Length, Sample Interval,
+    Trigger Point, Samples (number of valid samples in the array) and "<channel> Source" /
+    "<channel> Vertical Scale" for each channel.
+    Files that are not captures are reported and left out, as in file_executor.map_files.
+    """
+    if files is None:
+        files = list_capture_files(directory)
+    paths = [file if directory is None else os.path.join(directory, file) for file in files]
+
+    rows = []
+    for path in paths:
+        try:
+            headers = read_header(path, len(channel_names))
+        except ValueError as e:
+            print(f"Skipping {os.path.basename(path)}: {e}")
+            continue
+        row = {"File": os.path.basename(path), "Path": path}
+        row.update({field: headers[0].get(field) for field in METADATA_FIELDS})
+        for name, channel_header in zip(channel_names, headers):
+            row[f"{name} Source"] = channel_header.get("Source")
+            row[f"{name} Vertical Scale"] = channel_header.get("Vertical Scale")
+        rows.append(row)
+    metadata = pd.DataFrame(rows, columns=["File", "Path"] + METADATA_FIELDS +
+                            [f"{name} {field}" for name in channel_names for field in ["Source", "Vertical Scale"]])
+
+    if sample_count is None:
+        sample_count = int(metadata["Record Length"].max()) if len(metadata) else 0
+    samples = np.full((len(metadata), len(channel_names), sample_count), np.nan)
+
+    def read(row):
+        return _read_into(samples, row, metadata["Path"].iat[row], channel_names)
+
+    if threads > 1 and len(metadata) > 1:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            counts = list(pool.map(read, range(len(metadata))))
+    else:
+        counts = [read(row) for row in range(len(metadata))]
+    metadata.insert(metadata.columns.get_loc("Trigger Point") + 1, "Samples", counts)
+
+    return samples, metadata
+
+
+def batch_time(metadata, sample_count):
+    """(files x samples) time axes rebuilt from each file's Sample Interval and Trigger Point, like capture_loader.time_axis."""
+    interval = metadata["Sample Interval"].to_numpy(dtype=np.float64)[:, np.newaxis]
+    trigger = metadata["Trigger Point"].fillna(0.0).to_numpy(dtype=np.float64)[:, np.newaxis]
+    return (np.arange(sample_count) - trigger) * interval
+
+
+def batch_trapezoid(time, samples):
+    """
+    Trapezoid-rule area of every record, integrating each file on its own time axis.
+
+    Parameters:
+    - time: (files x samples) time axes (batch_time).
+    - samples: (files x channels x samples) voltages; NaN padding adds nothing.
+
+    Returns a (files x channels) array.
+    """
+    widths = np.diff(time, axis=-1)[:, np.newaxis, :]
+    return np.nansum(0.5 * (samples[..., 1:] + samples[..., :-1]) * widths, axis=-1)
+
+
+def estimate_batch_baseline(samples, metadata, channel, channel_names=CHANNEL_NAMES, method=BASELINE_METHOD, **options):
+    """
+    Baseline and noise RMS of one channel of every capture in a batch, all at once (baseline.batch_baseline).
+
+    Parameters:
+    - samples, metadata: The batch, as load_batch returns it.
+    - channel: Name of the channel (one of channel_names).
+    - channel_names: Channel names the batch was loaded with.
+    - method: Baseline method (see baseline.estimate_baseline).
+
+    The pre-trigger region of each capture comes from its Trigger Point and the noise floor from its
+    Vertical Scale, as baseline.capture_baseline takes them from a single capture's header.
+    Returns (baselines, noise) as baseline.batch_baseline does.
+    """
+    scale = metadata[f"{channel} Vertical Scale"].fillna(0.0).to_numpy(dtype=np.float64)
+    return batch_baseline(samples[:, channel_names.index(channel)], metadata["Samples"],
+                          metadata["Trigger Point"].to_numpy(dtype=np.float64), method,
+                          resolution=scale / LEVELS_PER_DIVISION, **options)
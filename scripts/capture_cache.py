@@ -0,0 +1,117 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from capture_loader import CHANNEL_NAMES, build_columns, read_samples
+
+# Default size limit of the cache folder
+DEFAULT_MAX_BYTES = 1024 ** 3  # 1 GiB
+
+
+class CaptureCache:
+    """
+    On-disk cache of parsed captures.
+
+    Each entry is a .npy file holding the (channels x samples) array plus a .json file with the
+    header fields and the source file's size and modification time. An entry is reparsed when the
+    source CSV changes, and the least recently used entries are deleted once the folder grows past
+    max_bytes.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = None  # Measured on the first write
+        os.makedirs(directory, exist_ok=True)
+
+    def entry_paths(self, file_path, channel_names):
+        """Paths of the .npy and .json files for one capture and channel layout."""
+        key = os.path.abspath(file_path) + "|" + ",".join(channel_names)
+        name = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, name)
+        return base + ".npy", base + ".json"
+
+    def load(self, file_path, channel_names=CHANNEL_NAMES):
+        """
+        Loads a capture, from the cache when a valid entry exists, otherwise by parsing the CSV.
+
+        Returns (columns, header) exactly like capture_loader.load_capture.
+        """
+        channel_names = list(channel_names)
+        samples_path, metadata_path = self.entry_paths(file_path, channel_names)
+        source = os.stat(file_path)
+
+        try:
+            with open(metadata_path, "r", encoding="utf-8") as f:
+                metadata = json.load(f)
+            if metadata["size"] == source.st_size and metadata["mtime_ns"] == source.st_mtime_ns:
+                samples = np.load(samples_path)
+                os.utime(samples_path)  # Mark as recently used
+                return build_columns(samples, metadata["headers"], channel_names)
+        except (OSError, ValueError, KeyError):
+            pass  # Missing, stale or damaged entry: parse the CSV again
+
+        samples, headers = read_samples(file_path, len(channel_names))
+        self.store(samples_path, metadata_path, samples,
+                   {"source": os.path.abspath(file_path), "size": source.st_size,
+                    "mtime_ns": source.st_mtime_ns, "channels": channel_names, "headers": headers})
+        return build_columns(samples, headers, channel_names)
+
+    def store(self, samples_path, metadata_path, samples, metadata):
+        """Writes one entry atomically (safe with several worker processes) and enforces the size limit."""
+        pid = os.getpid()
+        with open(f"{samples_path}.{pid}.tmp", "wb") as f:
+            np.save(f, samples)
+        with open(f"{metadata_path}.{pid}.tmp", "w", encoding="utf-8") as f:
+            json.dump(metadata, f)
+        os.replace(f"{samples_path}.{pid}.tmp", samples_path)
+        os.replace(f"{metadata_path}.{pid}.tmp", metadata_path)  # Written last: the entry is valid from here
+
+        if self.total_bytes is None:
+            self.total_bytes = sum(size for _, size, _ in self.entries())
+        else:
+            self.total_bytes += os.path.getsize(samples_path) + os.path.getsize(metadata_path)
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def entries(self):
+        """Lists (base path, size in bytes, last use time) for every cache entry."""
+        entries = []
+        for item in os.scandir(self.directory):
+            if not item.name.endswith(".npy"):
+                continue
+            base = item.path[:-len(".npy")]
+            try:
+                stat = item.stat()
+                size = stat.st_size + os.path.getsize(base + ".json")
+            except OSError:
+                continue  # Removed by another process meanwhile
+            entries.append((base, size, stat.st_mtime))
+        return entries
+
+    def evict(self):
+        """Deletes least recently used entries until the cache fits in max_bytes."""
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for base, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            for path in (base + ".json", base + ".npy"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+        self.total_bytes = total
+
+    def clear(self):
+        """Deletes every entry."""
+        for base, _, _ in self.entries():
+            for path in (base + ".json", base + ".npy"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self.total_bytes = 0
@@ -0,0 +1,257 @@
+import argparse
+import os
+import re
+import sqlite3
+from datetime import datetime
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from analysis_pipeline import STAGES
+from capture_loader import CHANNEL_NAMES, extract_voltage, load_capture
+from file_executor import list_capture_files, map_files
+
+# Default catalog location (next to the summary tables)
+CATALOG_PATH = os.path.join(os.path.dirname(os.getcwd()), "summary_reports", "capture_catalog.sqlite")
+
+# Stage table columns that identify an event rather than measure it
+EVENT_INDEX_COLUMNS = ["Start Index", "Trigger Index"]
+KEY_COLUMNS = ["Filename", "Channel", "Voltage (V)"] + EVENT_INDEX_COLUMNS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    filename TEXT NOT NULL,
+    voltage REAL,
+    captured_at TEXT,
+    record_length INTEGER,
+    sample_interval REAL,
+    size INTEGER,
+    mtime_ns INTEGER
+);
+CREATE INDEX IF NOT EXISTS captures_voltage ON captures (voltage);
+
+CREATE TABLE IF NOT EXISTS event_metrics (
+    capture_id INTEGER NOT NULL REFERENCES captures (id) ON DELETE CASCADE,
+    channel TEXT NOT NULL,
+    event_index INTEGER NOT NULL,
+    sample_index INTEGER,
+    metric TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (capture_id, channel, event_index, metric)
+);
+CREATE INDEX IF NOT EXISTS event_metrics_metric ON event_metrics (metric, capture_id);
+"""
+
+
+def parse_note_time(note):
+    """Reads the capture time from a Note header like "DPO2024B - 2:23:59 PM   12/19/2024" (ISO string or None)."""
+    match = re.search(r"(\d{1,2}:\d{2}:\d{2}\s*[AP]M)\s+(\d{1,2}/\d{1,2}/\d{4})", note or "")
+    if not match:
+        return None
+    return datetime.strptime(f"{match.group(1)} {match.group(2)}", "%I:%M:%S %p %m/%d/%Y").isoformat()
+
+
+def catalog_file(file_path, stages, channel_names=CHANNEL_NAMES):
+    """Loads one capture and runs the stages on it; returns (header, {stage name: result columns})."""
+    columns, header = load_capture(file_path, channel_names)
+    file = os.path.basename(file_path)
+    return header, {name: STAGES[name]["function"](file, columns, header) for name in stages}
+
+
+def event_rows(stage, result):
+    """
+    Turns one stage result into (channel, event index, sample index, metric, value) rows.
+
+    Event indices count the events of each channel in order, so stages that segment the same
+    channel the same way (e.g. scintillator area and duration) share event indices. Stages that
+    find events differently store them under different channels (sMDT dips under "sMDT (V)",
+    latency triggers under analysis_pipeline.COINCIDENCE_CHANNEL); joins across those use sample_index.
+    """
+    columns = STAGES[stage]["columns"]
+    index_column = next((column for column in EVENT_INDEX_COLUMNS if column in columns), None)
+    if index_column is None:
+        return []  # Per-file stage (e.g. event counts): nothing per event to store
+
+    sample_indices = np.asarray(result[index_column])
+    if "Channel" in result:
+        channels = np.asarray(result["Channel"])
+    else:
+        channels = np.full(len(sample_indices), STAGES[stage]["channel"], dtype=object)
+
+    # Position of each event among the events of its channel
+    event_indices = np.zeros(len(sample_indices), dtype=np.intp)
+    for channel in set(channels.tolist()):
+        selected = channels == channel
+        event_indices[selected] = np.arange(np.count_nonzero(selected))
+
+    rows = []
+    for metric in [column for column in columns if column not in KEY_COLUMNS]:
+        values = np.asarray(result[metric], dtype=np.float64)
+        rows += zip(channels.tolist(), event_indices.tolist(), sample_indices.tolist(), [metric] * len(values),
+                    values.tolist())
+    return rows
+
+
+class CaptureCatalog:
+    """
+    SQLite catalog of captures and of the per-event metrics derived from them.
+
+    Every capture is stored once with its voltage (parsed from the file name when it is added),
+    capture time from the Note header, record length and sample interval. Event metrics are keyed
+    by (capture, channel, event index, metric), so per-voltage aggregations and drill-downs back
+    to the source file are indexed queries. Metrics of the same event share channel and event
+    index; to relate events found by different detectors (e.g. an sMDT dip and the coincidence
+    trigger before it), join on sample_index.
+    """
+
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add_capture(self, file_path, header, results):
+        """
+        Stores (or replaces) one capture and its stage results.
+
+        Parameters:
+        - file_path: Path of the capture.
+        - header: Header dictionary from load_capture.
+        - results: {stage name: result columns} as returned by catalog_file.
+        """
+        first = next(iter(header.values()))
+        stat = os.stat(file_path)
+        path = os.path.abspath(file_path)
+        with self.connection:
+            self.connection.execute("DELETE FROM captures WHERE path = ?", (path,))  # Old metrics go with it
+            cursor = self.connection.execute(
+                "INSERT INTO captures (path, filename, voltage, captured_at, record_length, sample_interval, size, mtime_ns) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, os.path.basename(file_path), extract_voltage(os.path.basename(file_path)),
+                 parse_note_time(first.get("Note")), first.get("Record Length"), first.get("Sample Interval"),
+                 stat.st_size, stat.st_mtime_ns))
+            capture_id = cursor.lastrowid
+            for stage, result in results.items():
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO event_metrics (capture_id, channel, event_index, sample_index, metric, value) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [(capture_id,) + row for row in event_rows(stage, result)])
+        return capture_id
+
+    def is_current(self, file_path):
+        """True if the capture is catalogued and has not changed since."""
+        stat = os.stat(file_path)
+        row = self.connection.execute("SELECT size, mtime_ns FROM captures WHERE path = ?",
+                                      (os.path.abspath(file_path),)).fetchone()
+        return row is not None and tuple(row) == (stat.st_size, stat.st_mtime_ns)
+
+    def update(self, directory, stages=None, channel_names=CHANNEL_NAMES, workers=1, chunksize=1):
+        """
+        Catalogs every new or changed capture in a directory (unchanged captures are not read).
+
+        Parameters:
+        - directory: Folder of oscilloscope .csv captures.
+        - stages: Names of the analysis_pipeline stages whose metrics are stored (default: all).
+        - channel_names: Channel names passed to load_capture.
+        - workers, chunksize: Process pool settings passed to file_executor.map_files.
+
+        Returns the number of captures added or refreshed.
+        """
+        stages = list(STAGES) if stages is None else stages
+        files = [file for file in list_capture_files(directory)
+                 if not self.is_current(os.path.join(directory, file))]
+
+        analyze = partial(catalog_file, stages=stages, channel_names=channel_names)
+        results = map_files(analyze, directory, files, workers=workers, chunksize=chunksize)
+        for file, (header, stage_results) in results:
+            self.add_capture(os.path.join(directory, file), header, stage_results)
+        return len(results)
+
+    def voltages(self):
+        """Voltages with at least one capture."""
+        rows = self.connection.execute("SELECT DISTINCT voltage FROM captures WHERE voltage IS NOT NULL ORDER BY voltage")
+        return [row[0] for row in rows]
+
+    def metrics(self):
+        """Names of the stored metrics."""
+        return [row[0] for row in self.connection.execute("SELECT DISTINCT metric FROM event_metrics ORDER BY metric")]
+
+    def events(self, metric, voltage=None, channel=None):
+        """
+        Drill-down: every value of a metric with the file, channel and event it came from.
+
+        Returns a DataFrame with Filename, Voltage (V), Captured At, Channel, Event Index, Sample Index and Value.
+        """
+        query = ("SELECT c.filename, c.voltage, c.captured_at, m.channel, m.event_index, m.sample_index, m.value "
+                 "FROM event_metrics m JOIN captures c ON c.id = m.capture_id WHERE m.metric = ?")
+        parameters = [metric]
+        if voltage is not None:
+            query += " AND c.voltage = ?"
+            parameters.append(voltage)
+        if channel is not None:
+            query += " AND m.channel = ?"
+            parameters.append(channel)
+        query += " ORDER BY c.filename, m.channel, m.event_index"
+        return pd.read_sql_query(query, self.connection, params=parameters).rename(columns={
+            "filename": "Filename", "voltage": "Voltage (V)", "captured_at": "Captured At", "channel": "Channel",
+            "event_index": "Event Index", "sample_index": "Sample Index", "value": "Value"})
+
+    def voltage_summary(self, metric, channel=None):
+        """
+        Per-voltage count, mean and SEM (sample standard deviation / sqrt(n)) of a metric, aggregated in SQL.
+
+        The squared deviations are summed in a second pass over the values, around each voltage's
+        mean, rather than taken from the sum of squares (which cancels when the spread is small next
+        to the mean).
+        Returns a DataFrame with Voltage (V), Events, Mean and SEM.
+        """
+        selected = ("SELECT c.voltage AS voltage, m.value AS value "
+                    "FROM event_metrics m JOIN captures c ON c.id = m.capture_id "
+                    "WHERE m.metric = ? AND c.voltage IS NOT NULL")
+        parameters = [metric]
+        if channel is not None:
+            selected += " AND m.channel = ?"
+            parameters.append(channel)
+        query = (f"WITH selected AS ({selected}), "
+                 "means AS (SELECT voltage, COUNT(value) AS events, AVG(value) AS mean FROM selected GROUP BY voltage) "
+                 "SELECT means.voltage, means.events, means.mean, SUM((value - mean) * (value - mean)) "
+                 "FROM selected JOIN means ON selected.voltage = means.voltage "
+                 "GROUP BY means.voltage ORDER BY means.voltage")
+        summary = pd.DataFrame(self.connection.execute(query, parameters).fetchall(),
+                               columns=["Voltage (V)", "Events", "Mean", "Squared Deviations"])
+
+        # Sample variance (ddof=1), matching pandas' sem
+        n = summary["Events"]
+        summary["SEM"] = np.sqrt(summary["Squared Deviations"] / (n - 1) / n).where(n > 1)
+        return summary.drop(columns="Squared Deviations")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Catalog captures and their per-event metrics in SQLite.")
+    parser.add_argument("directory", help="Folder of capture .csv files")
+    parser.add_argument("--catalog", default=CATALOG_PATH, help="SQLite catalog file")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), help="Stages whose metrics are stored (default: all)")
+    parser.add_argument("--channels", nargs="+", default=CHANNEL_NAMES, help="Names of the channel blocks")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes (default: 1, serial)")
+    parser.add_argument("--summary", help="Print the per-voltage summary of this metric after updating")
+    args = parser.parse_args()
+
+    with CaptureCatalog(args.catalog) as catalog:
+        updated = catalog.update(args.directory, args.stages, args.channels, workers=args.workers)
+        print(f"{updated} captures added or refreshed in {args.catalog}")
+        if args.summary:
+            print(catalog.voltage_summary(args.summary).to_string(index=False))
@@ -0,0 +1,202 @@
+import itertools
+import os
+import re
+
+import numpy as np
+
+# Column names used throughout the analysis scripts for the three DPO2024B
+# channel blocks (CSV columns E, K and Q)
+CHANNEL_NAMES = ["CH1 (V)", "CH2 (V)", "sMDT (V)"]
+
+# Each channel block in the CSV is 6 columns wide: label, value, unit, time, voltage, blank
+BLOCK_WIDTH = 6
+TIME_OFFSET = 3
+VOLTAGE_OFFSET = 4
+
+# Header rows written by the oscilloscope before the samples start carrying only numbers
+HEADER_ROWS = 18
+
+# Header fields converted to numbers (everything else is kept as text)
+INTEGER_FIELDS = ["Record Length"]
+FLOAT_FIELDS = ["Sample Interval", "Trigger Point", "Vertical Scale", "Vertical Offset",
+                "Horizontal Scale", "Yzero", "Probe Atten"]
+
+# Samples per chunk yielded by stream_capture
+DEFAULT_CHUNK_SIZE = 65536
+
+# Environment variables that turn on the binary capture cache (see capture_cache.py)
+CACHE_DIRECTORY_VARIABLE = "SMDT_CAPTURE_CACHE"
+CACHE_LIMIT_VARIABLE = "SMDT_CAPTURE_CACHE_MB"
+
+# Cache object for the current process, rebuilt if the environment settings change
+_cache = {"settings": None, "cache": None}
+
+
+def parse_header(lines, block_count):
+    """
+    Parses the per-channel header block of a DPO2024B capture.
+
+    Parameters:
+    - lines: The first lines of the capture file (as text).
+    - block_count: Number of channel blocks in the file.
+
+    Returns a list with one dictionary of header fields per channel block.
+    """
+    headers = [{} for _ in range(block_count)]
+
+    for line in lines[:HEADER_ROWS]:
+        fields = line.split(",")
+        for block in range(block_count):
+            label = fields[block * BLOCK_WIDTH].strip()
+            if not label:
+                continue  # Sample-only row for this block
+            value = fields[block * BLOCK_WIDTH + 1].strip()
+            if label in INTEGER_FIELDS:
+                value = int(float(value))
+            elif label in FLOAT_FIELDS:
+                value = float(value)
+            headers[block][label] = value
+
+    return headers
+
+
+def read_samples(file_path, channel_count):
+    """
+    Parses a capture CSV without any caching.
+
+    Returns (samples, headers): a (channels x samples) float64 array and one header dictionary
+    per channel block. Raises ValueError if the file is not a capture with enough channel blocks.
+    """
+    with open(file_path, "r", newline="") as f:
+        lines = f.read().splitlines()
+
+    block_count = len(lines[0].split(",")) // BLOCK_WIDTH if lines else 0
+    if block_count < channel_count or not lines[0].startswith("Record Length"):
+        raise ValueError(f"{file_path} is not a capture with {channel_count} channel block(s).")
+
+    headers = parse_header(lines, channel_count)
+
+    # Only the voltage columns are parsed; the time axis is rebuilt from the header
+    voltage_columns = [block * BLOCK_WIDTH + VOLTAGE_OFFSET for block in range(channel_count)]
+    samples = np.loadtxt(lines, delimiter=",", usecols=voltage_columns, ndmin=2, dtype=np.float64)
+    samples = np.ascontiguousarray(samples.T)  # One contiguous row per channel
+
+    return samples, headers
+
+
+def time_axis(channel_header, sample_count, start=0):
+    """Rebuilds the time axis (s) from a channel's Sample Interval and Trigger Point (from sample start on)."""
+    trigger_point = channel_header.get("Trigger Point", 0.0)
+    return (np.arange(start, start + sample_count) - trigger_point) * channel_header["Sample Interval"]
+
+
+def build_columns(samples, headers, channel_names):
+    """Names the rows of a (channels x samples) array and its headers; returns (columns, header)."""
+    columns = {"Time (s)": time_axis(headers[0], samples.shape[1])}
+    header = {}
+    for block, name in enumerate(channel_names):
+        columns[name] = samples[block]
+        header[name] = headers[block]
+
+    return columns, header
+
+
+def extract_voltage(filename):
+    """Reads the high-voltage setting from names like "3200 V - Capture 1.csv" or "sMDT_3400V_Event_001.csv"."""
+    match = re.search(r"(\d+)\s*V", filename)
+    return int(match.group(1)) if match else None
+
+
+def read_capture(file_path, channel_names=CHANNEL_NAMES):
+    """Same as load_capture, but always parses the CSV text (the cache is bypassed)."""
+    samples, headers = read_samples(file_path, len(channel_names))
+    return build_columns(samples, headers, channel_names)
+
+
+def default_cache():
+    """
+    Returns the capture cache configured through the environment, or None when caching is off.
+
+    Set SMDT_CAPTURE_CACHE to a cache folder (and optionally SMDT_CAPTURE_CACHE_MB to its size limit)
+    to enable it; worker processes inherit the setting.
+    """
+    settings = (os.environ.get(CACHE_DIRECTORY_VARIABLE), os.environ.get(CACHE_LIMIT_VARIABLE))
+    if settings != _cache["settings"]:
+        cache = None
+        if settings[0]:
+            from capture_cache import CaptureCache  # Imported here because capture_cache builds on this module
+            if settings[1]:
+                cache = CaptureCache(settings[0], max_bytes=int(float(settings[1]) * 1024 ** 2))
+            else:
+                cache = CaptureCache(settings[0])
+        _cache["settings"], _cache["cache"] = settings, cache
+    return _cache["cache"]
+
+
+def load_capture(file_path, channel_names=CHANNEL_NAMES):
+    """
+    Loads a DPO2024B capture CSV into contiguous NumPy arrays.
+
+    Parameters:
+    - file_path: Path to the oscilloscope .csv file.
+    - channel_names: Names given to the channel blocks, in file order (CSV columns E, K, Q, ...).
+
+    Returns (columns, header) where columns maps "Time (s)" and each channel name to a
+    float64 array holding every sample, and header maps each channel name to its parsed
+    header fields (Record Length, Sample Interval, Trigger Point, Vertical Scale, Yzero, Source, ...).
+    The time axis is rebuilt from Sample Interval and Trigger Point rather than parsed from text.
+    When the binary capture cache is enabled (see default_cache), repeat loads skip the CSV parse.
+    Raises ValueError if the file is not a capture with enough channel blocks.
+    """
+    cache = default_cache()
+    if cache is not None:
+        return cache.load(file_path, channel_names)
+    return read_capture(file_path, channel_names)
+
+
+def stream_capture(file_path, channel_names=CHANNEL_NAMES, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Reads a capture in fixed-size chunks, so long records never have to fit in memory at once.
+
+    Parameters:
+    - file_path: Path to the oscilloscope .csv file.
+    - channel_names: Names given to the channel blocks, in file order.
+    - chunk_size: Samples per chunk.
+
+    Returns (header, chunks): header is the same dictionary load_capture returns, and chunks is a
+    generator of (offset, columns) where offset is the index of the chunk's first sample and columns
+    holds "Time (s)" and each channel for chunk_size samples (fewer in the last chunk). The time axis
+    and voltages are identical to the ones load_capture returns for the same samples.
+    Raises ValueError if the file is not a capture with enough channel blocks.
+    """
+    f = open(file_path, "r", newline="")
+    try:
+        lines = list(itertools.islice(f, HEADER_ROWS))
+        block_count = len(lines[0].split(",")) // BLOCK_WIDTH if lines else 0
+        if block_count < len(channel_names) or not lines[0].startswith("Record Length"):
+            raise ValueError(f"{file_path} is not a capture with {len(channel_names)} channel block(s).")
+        headers = parse_header([line.rstrip("\r\n") for line in lines], len(channel_names))
+    except Exception:
+        f.close()
+        raise
+
+    header = dict(zip(channel_names, headers))
+    voltage_columns = [block * BLOCK_WIDTH + VOLTAGE_OFFSET for block in range(len(channel_names))]
+
+    def chunks():
+        with f:
+            pending = lines  # The header rows also carry the first samples
+            offset = 0
+            while True:
+                pending += list(itertools.islice(f, max(chunk_size - len(pending), 0)))
+                if not pending:
+                    break
+                samples = np.loadtxt(pending, delimiter=",", usecols=voltage_columns, ndmin=2, dtype=np.float64)
+                columns = {"Time (s)": time_axis(headers[0], len(samples), offset)}
+                for block, name in enumerate(channel_names):
+                    columns[name] = np.ascontiguousarray(samples[:, block])
+                yield offset, columns
+                offset += len(samples)
+                pending = []
+
+    return header, chunks()
@@ -0,0 +1,214 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from baseline import adc_resolution, trigger_from_time
+from capture_loader import CHANNEL_NAMES, extract_voltage, load_capture
+from file_executor import list_capture_files
+from run_container import INDEX_DTYPE, RunReader, RunWriter, container_paths
+
+
+def sources_path(path):
+    """File listing the source capture of every archived event, one name per line."""
+    return path + ".sources"
+
+
+def read_sources(path):
+    if not os.path.exists(sources_path(path)):
+        return []
+    with open(sources_path(path), "r", encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def capture_scales(header, channel_names):
+    """Scale record of every archive column for a capture's header (None for the time axis)."""
+    return [None] + [{"YMUlt": adc_resolution(header[name]), "YOFf": np.nan,
+                      "YZEro": header[name].get("Yzero", np.nan)} for name in channel_names]
+
+
+def build_archive(directory, path, channel_names=CHANNEL_NAMES):
+    """
+    Adds every capture in a directory to an event archive (a run container plus a list of source files).
+
+    Parameters:
+    - directory: Folder of oscilloscope .csv captures.
+    - path: The archive's .run file (created if missing).
+    - channel_names: Channel names passed to load_capture.
+
+    Each capture becomes one event with its HV setting read from the file name, the whole samples of
+    its Trigger Point as trigger index and each channel's ADC step as YMUlt, so baselines estimated
+    from the archive match the ones estimated from the CSV files. Captures already in the archive
+    are skipped, so the archive can be updated as new captures arrive.
+    Returns the number of events added.
+    """
+    sources = read_sources(path)
+    added = 0
+
+    with RunWriter(path, columns=["Time (s)"] + list(channel_names)) as run:
+        # An interrupted update may have listed a source whose event was never indexed
+        if len(sources) > len(run):
+            sources = sources[:len(run)]
+            with open(sources_path(path), "w", encoding="utf-8") as f:
+                f.writelines(source + "\n" for source in sources)
+        archived = set(sources)
+
+        with open(sources_path(path), "a", encoding="utf-8") as source_file:
+            for file in list_capture_files(directory):
+                if file in archived:
+                    continue
+                file_path = os.path.join(directory, file)
+                try:
+                    columns, header = load_capture(file_path, channel_names)
+                except ValueError as e:
+                    print(f"Skipping {file}: {e}")
+                    continue
+
+                voltage = extract_voltage(file)
+                trigger_point = header[channel_names[0]].get("Trigger Point")
+                source_file.write(file + "\n")
+                source_file.flush()
+                run.append([columns[name] for name in run.columns], timestamp=os.path.getmtime(file_path),
+                           hv=np.nan if voltage is None else voltage,
+                           trigger_index=-1 if trigger_point is None else int(np.floor(trigger_point)),
+                           scales=capture_scales(header, channel_names))
+                added += 1
+
+    return added
+
+
+class EventArchive:
+    """
+    Read-only view of an event archive.
+
+    The index is read once when the archive is opened and the samples are memory-mapped, so
+    queries by event id, HV or source file return NumPy views into the map without reading or
+    copying anything else.
+    """
+
+    def __init__(self, path):
+        reader = RunReader(path)
+        data_path, index_path, _ = container_paths(path)
+        self.path = path
+        self.columns = reader.columns
+
+        # Events are complete once both their index record and their source line exist
+        sources = read_sources(path)
+        index = np.fromfile(index_path, dtype=INDEX_DTYPE, count=len(reader))
+        count = min(len(sources), len(index))
+        self.sources = sources[:count]
+        self.index = index[:count]
+
+        if os.path.getsize(data_path):
+            self.samples = np.memmap(data_path, dtype=reader.dtype, mode="r")
+        else:
+            self.samples = np.empty(0, dtype=reader.dtype)
+        self.offsets = (self.index["offset"] // reader.dtype.itemsize).astype(np.intp)
+        self.lengths = self.index["samples"].astype(np.intp)
+
+    def __len__(self):
+        return len(self.index)
+
+    def event(self, event_id):
+        """Returns event event_id as a dictionary mapping each column name to a view of the memory map."""
+        if not 0 <= event_id < len(self):
+            raise IndexError(f"Event {event_id} is not in {self.path} ({len(self)} events).")
+        start = self.offsets[event_id]
+        block = self.samples[start:start + self.lengths[event_id] * len(self.columns)]
+        block = block.reshape(len(self.columns), self.lengths[event_id])
+        return {name: block[row] for row, name in enumerate(self.columns)}
+
+    def header(self, event_id):
+        """
+        Header fields of event event_id per channel column, in the form baseline.capture_baseline takes:
+        "Trigger Point" (whole samples) and "YMUlt" (ADC step), where the archive recorded them.
+        """
+        record = self.index[event_id]
+        header = {}
+        for column, name in enumerate(self.columns):
+            fields = {}
+            if record["trigger_index"] >= 0:
+                fields["Trigger Point"] = float(record["trigger_index"])
+            if not np.isnan(record["ymult"][column]):
+                fields["YMUlt"] = float(record["ymult"][column])
+            header[name] = fields
+        return header
+
+    def stack(self, event_ids, column):
+        """
+        One column of several events as a (events x samples) array, NaN past the end of shorter events.
+        Returns (samples, lengths), the layout capture_batch.load_batch and baseline.batch_baseline use.
+        """
+        event_ids = np.asarray(event_ids, dtype=np.intp)
+        lengths = self.lengths[event_ids]
+        row = self.columns.index(column)
+        samples = np.full((len(event_ids), lengths.max() if len(event_ids) else 0), np.nan)
+        for k, event_id in enumerate(event_ids):
+            start = self.offsets[event_id] + row * lengths[k]
+            samples[k, :lengths[k]] = self.samples[start:start + lengths[k]]
+        return samples, lengths
+
+    def trigger_points(self, event_ids):
+        """
+        Trigger Point of each event: the recorded trigger index, or for events archived without one,
+        where the time axis crosses zero (NaN if the archive has no time axis).
+        """
+        points = []
+        for event_id in event_ids:
+            trigger_index = self.index["trigger_index"][event_id]
+            if trigger_index >= 0:
+                points.append(float(trigger_index))
+            elif "Time (s)" in self.columns:
+                trigger_point = trigger_from_time(self.event(event_id)["Time (s)"])
+                points.append(np.nan if trigger_point is None else trigger_point)
+            else:
+                points.append(np.nan)
+        return np.array(points, dtype=np.float64)
+
+    def adc_steps(self, event_ids, column):
+        """ADC step (YMUlt) of one column for each event; 0 where the archive did not record it."""
+        steps = self.index["ymult"][np.asarray(event_ids, dtype=np.intp), self.columns.index(column)]
+        return np.nan_to_num(steps, nan=0.0)
+
+    def select(self, hv=None, source=None):
+        """
+        Event ids matching every given condition.
+
+        Parameters:
+        - hv: HV setting (V), e.g. 3400.
+        - source: Name of the source capture file.
+        """
+        keep = np.ones(len(self), dtype=bool)
+        if hv is not None:
+            keep &= self.index["hv"] == hv
+        if source is not None:
+            keep &= np.array([name == source for name in self.sources], dtype=bool)
+        return np.flatnonzero(keep)
+
+    def events(self, hv=None, source=None):
+        """Yields (event id, event) for the events matching select(hv, source)."""
+        for event_id in self.select(hv, source):
+            yield event_id, self.event(event_id)
+
+    def voltages(self):
+        """Sorted HV settings present in the archive."""
+        hv = self.index["hv"]
+        return np.unique(hv[~np.isnan(hv)])
+
+    def table(self):
+        """The index as a DataFrame (event id, HV, source file, sample offset, length)."""
+        return pd.DataFrame({"Event": np.arange(len(self)), "Voltage (V)": self.index["hv"],
+                             "Filename": self.sources, "Sample Offset": self.offsets, "Samples": self.lengths})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add a folder of captures to a memory-mapped event archive.")
+    parser.add_argument("directory", help="Folder of capture .csv files")
+    parser.add_argument("archive", help="The archive's .run file (created if missing)")
+    parser.add_argument("--channels", nargs="+", default=CHANNEL_NAMES,
+                        help="Names of the channel blocks (e.g. \"sMDT (V)\" for the voltage optimization captures)")
+    args = parser.parse_args()
+
+    added = build_archive(args.directory, args.archive, args.channels)
+    print(f"{added} events added; {len(EventArchive(args.archive))} events in {args.archive}")
@@ -0,0 +1,227 @@
+import numpy as np
+
+from event_segmenter import SegmentStream
+
+# Integration rules accepted by segment_areas
+INTEGRATION_RULES = ["riemann", "trapezoid", "simpson"]
+
+
+def reduce_segments(ufunc, values, starts, stops, empty=0.0):
+    """
+    Applies a ufunc reduction (np.add, np.minimum, ...) to values[start:stop] for every segment at once.
+
+    Parameters:
+    - ufunc: NumPy ufunc whose reduceat is used.
+    - values: 1-D array to reduce.
+    - starts, stops: Segment boundaries (stop is exclusive).
+    - empty: Result reported for segments with no samples.
+    """
+    starts = np.asarray(starts, dtype=np.intp)
+    stops = np.asarray(stops, dtype=np.intp)
+    result = np.full(len(starts), empty, dtype=np.float64)
+
+    nonempty = stops > starts
+    if not nonempty.any():
+        return result
+
+    # reduceat needs every index inside the array, so pad one element for segments ending at the end
+    padded = np.append(np.asarray(values, dtype=np.float64), empty)
+    bounds = np.empty(2 * np.count_nonzero(nonempty), dtype=np.intp)
+    bounds[0::2] = starts[nonempty]
+    bounds[1::2] = stops[nonempty]
+    result[nonempty] = ufunc.reduceat(padded, bounds)[0::2]
+    return result
+
+
+def segment_sums(values, starts, stops):
+    """Sum of the samples in every segment."""
+    return reduce_segments(np.add, values, starts, stops)
+
+
+def segment_areas(time, values, starts, stops, rule="riemann", baseline=0.0):
+    """
+    Integrates every segment in one vectorized pass.
+
+    Parameters:
+    - time: Time axis (s) shared by the samples.
+    - values: Voltages (V).
+    - starts, stops: Segment boundaries as returned by event_segmenter.find_segments.
+    - rule: "riemann" (left Riemann sum over values[start:stop], the rule used by the analysis scripts),
+      "trapezoid", or "simpson" (composite Simpson on evenly spaced samples, matching scipy.integrate.simpson).
+    - baseline: Offset subtracted from the samples before integrating.
+
+    Returns an array of areas (V·s), one per segment.
+    """
+    if rule not in INTEGRATION_RULES:
+        raise ValueError(f"Unknown integration rule {rule!r}, expected one of {INTEGRATION_RULES}.")
+
+    time = np.asarray(time, dtype=np.float64)
+    relative = np.asarray(values, dtype=np.float64) - baseline
+    starts = np.asarray(starts, dtype=np.intp)
+    stops = np.asarray(stops, dtype=np.intp)
+
+    if rule == "simpson":
+        return simpson_areas(time, relative, starts, stops)
+
+    # Interval j spans samples j and j + 1, so a segment covers intervals start .. stop - 2
+    delta_t = np.diff(time)
+    if rule == "riemann":
+        strips = relative[:-1] * delta_t
+    else:
+        strips = 0.5 * (relative[:-1] + relative[1:]) * delta_t
+    return reduce_segments(np.add, strips, starts, np.maximum(stops - 1, starts))
+
+
+def simpson_areas(time, values, starts, stops):
+    """
+    Composite Simpson integral of every segment, assuming evenly spaced samples (as load_capture provides).
+
+    Segments with an odd number of intervals use the same end correction as scipy.integrate.simpson,
+    two-sample segments fall back to the trapezoid rule and single samples integrate to zero.
+    """
+    areas = np.zeros(len(starts), dtype=np.float64)
+    lengths = stops - starts
+    keep = lengths >= 2
+    if not keep.any():
+        return areas
+
+    starts, lengths = starts[keep], lengths[keep]
+    step = time[starts + 1] - time[starts]
+
+    # Flatten every segment into one index array with each sample's position inside its segment
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    segment = np.repeat(np.arange(len(starts)), lengths)
+    position = np.arange(lengths.sum()) - offsets[segment]
+    length = lengths[segment]
+
+    # Standard 1-4-2-...-4-1 weights over the longest run with an even number of intervals
+    simpson_length = np.where(length % 2 == 1, length, length - 1)
+    weights = np.where(position % 2 == 1, 4.0, 2.0)
+    weights[(position == 0) | (position == simpson_length - 1)] = 1.0
+    weights[position >= simpson_length] = 0.0
+    weights /= 3.0
+
+    # Odd number of intervals: add the last interval with scipy's uniform-spacing correction
+    corrected = (length % 2 == 0) & (length >= 4)
+    weights += np.where(corrected & (position == length - 1), 5.0 / 12.0, 0.0)
+    weights += np.where(corrected & (position == length - 2), 8.0 / 12.0, 0.0)
+    weights -= np.where(corrected & (position == length - 3), 1.0 / 12.0, 0.0)
+
+    # Two samples: plain trapezoid
+    pair = length == 2
+    weights[pair] = 0.5
+
+    samples = values[starts[segment] + position]
+    areas[keep] = np.add.reduceat(weights * samples, offsets) * step
+    return areas
+
+
+def segment_durations(time, starts, stops):
+    """Time from the first sample of each event to the first sample after it (stop must be a valid index)."""
+    time = np.asarray(time, dtype=np.float64)
+    return time[stops] - time[starts]
+
+
+def segment_peaks(values, starts, stops, polarity="<", baseline=0.0):
+    """
+    Peak amplitude of every segment relative to the baseline.
+
+    Parameters:
+    - polarity: "<" takes the minimum (negative sMDT pulses), ">=" or ">" takes the maximum.
+    """
+    ufunc = np.minimum if polarity == "<" else np.maximum
+    return reduce_segments(ufunc, np.asarray(values, dtype=np.float64) - baseline, starts, stops, empty=np.nan)
+
+
+def segment_peak_indices(values, starts, stops, polarity="<"):
+    """Index of the first sample reaching each segment's peak (like idxmin / idxmax)."""
+    values = np.asarray(values, dtype=np.float64)
+    starts = np.asarray(starts, dtype=np.intp)
+    stops = np.asarray(stops, dtype=np.intp)
+    if len(starts) == 0:
+        return np.empty(0, dtype=np.intp)
+
+    peaks = segment_peaks(values, starts, stops, polarity)
+
+    # Flag the samples equal to their segment's peak and keep the first one in each segment
+    lengths = stops - starts
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    segment = np.repeat(np.arange(len(starts)), lengths)
+    index = starts[segment] + np.arange(lengths.sum()) - offsets[segment]
+    hits = np.flatnonzero(values[index] == peaks[segment])
+    _, first = np.unique(segment[hits], return_index=True)
+    return index[hits[first]]
+
+
+def segment_time_to_peak(time, values, starts, stops, polarity="<"):
+    """Time from the start of each event to its peak sample."""
+    time = np.asarray(time, dtype=np.float64)
+    return time[segment_peak_indices(values, starts, stops, polarity)] - time[np.asarray(starts, dtype=np.intp)]
+
+
+class MetricStream:
+    """
+    Push version of stream_metrics: segments one channel of a chunked capture as the chunks are
+    handed over and computes metrics for each event as soon as it ends.
+
+    Parameters:
+    - channel: Name of the channel to segment.
+    - threshold, polarity, baseline, hold_equal: See event_segmenter.event_mask.
+    - metrics: Dictionary of name -> function(columns, starts, stops) returning one value per event,
+      e.g. lambda columns, starts, stops: segment_areas(columns["Time (s)"], columns["sMDT (V)"], starts, stops).
+
+    The samples of an event in progress are carried into the next chunk, so each metric sees exactly
+    the samples it would see on the whole record and the results are identical. Memory stays bounded
+    by the chunk size plus the longest event. Events still open at the end of the record are not reported.
+    """
+
+    def __init__(self, channel, threshold, metrics, polarity=">=", baseline=0.0, hold_equal=False):
+        self.channel = channel
+        self.metrics = metrics
+        self.stream = SegmentStream(threshold, polarity, baseline, hold_equal)
+        self.buffer = None  # Carried samples followed by the current chunk
+        self.buffer_start = 0  # Record index of the first sample in buffer
+
+    def feed(self, offset, columns):
+        """
+        Processes the next (offset, columns) chunk of capture_loader.stream_capture.
+
+        Returns (starts, stops, values) of the events that ended in it, where starts and stops count
+        from the start of the record and values maps each metric name to its array (all empty if none ended).
+        """
+        starts, stops = self.stream.feed(columns[self.channel])
+        if self.buffer is None:
+            self.buffer, self.buffer_start = columns, offset
+        else:
+            self.buffer = {name: np.concatenate((self.buffer[name], columns[name])) for name in columns}
+
+        if len(starts):
+            local_starts, local_stops = starts - self.buffer_start, stops - self.buffer_start
+            values = {name: metric(self.buffer, local_starts, local_stops) for name, metric in self.metrics.items()}
+        else:
+            values = {name: np.empty(0) for name in self.metrics}
+
+        # Keep only the event in progress (nothing if the chunk ended outside an event)
+        keep_from = self.stream.position if self.stream.open_start is None else self.stream.open_start
+        self.buffer = {name: samples[keep_from - self.buffer_start:] for name, samples in self.buffer.items()}
+        self.buffer_start = keep_from
+        return starts, stops, values
+
+
+def stream_metrics(chunks, channel, threshold, metrics, polarity=">=", baseline=0.0, hold_equal=False):
+    """
+    Segments one channel of a chunked capture and computes metrics for each event as soon as it ends.
+
+    Parameters:
+    - chunks: (offset, columns) pairs as yielded by capture_loader.stream_capture.
+    - channel, threshold, metrics, polarity, baseline, hold_equal: See MetricStream.
+
+    Yields (starts, stops, values) for every chunk in which events ended, where starts and stops
+    count from the start of the record and values maps each metric name to its array. The results
+    are identical to the metrics of the whole record (see MetricStream).
+    """
+    stream = MetricStream(channel, threshold, metrics, polarity, baseline, hold_equal)
+    for offset, columns in chunks:
+        starts, stops, values = stream.feed(offset, columns)
+        if len(starts):
+            yield starts, stops, values
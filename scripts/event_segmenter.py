@@ -0,0 +1,269 @@
+import numpy as np
+
+# Comparison used to decide whether a sample is inside an event
+POLARITIES = {
+    ">=": np.greater_equal,
+    ">": np.greater,
+    "<": np.less,
+}
+
+# Comparison that ends an event when samples equal to the threshold hold the current state
+RELEASES = {
+    ">=": np.less,
+    ">": np.less,
+    "<": np.greater,
+}
+
+
+def event_mask(values, threshold, polarity=">=", baseline=0.0, hold_equal=False, initial=False):
+    """
+    Flags every sample that lies inside an event.
+
+    Parameters:
+    - values: 1-D array of voltages.
+    - threshold: Threshold applied to (values - baseline).
+    - polarity: ">=" or ">" for positive pulses, "<" for negative pulses.
+    - baseline: Offset subtracted from the samples before the comparison.
+    - hold_equal: If True, samples exactly at the threshold keep the previous state
+      (an event starts on the strict comparison and only ends on the opposite one).
+    - initial: State held by samples at the threshold before any sample has decided it
+      (the state at the end of the previous chunk when streaming).
+    """
+    if polarity not in POLARITIES:
+        raise ValueError(f"Unknown polarity {polarity!r}, expected one of {list(POLARITIES)}.")
+
+    relative = np.asarray(values, dtype=np.float64) - baseline
+    inside = POLARITIES[polarity](relative, threshold)
+    if not hold_equal:
+        return inside
+
+    # Samples that neither start nor end an event inherit the last decided state
+    decided = inside | RELEASES[polarity](relative, threshold)
+    last_decided = np.where(decided, np.arange(len(relative)), -1)
+    np.maximum.accumulate(last_decided, out=last_decided)
+    return np.where(last_decided >= 0, inside[np.maximum(last_decided, 0)], initial)
+
+
+def find_segments(values, threshold, polarity=">=", baseline=0.0, hold_equal=False, include_open=False):
+    """
+    Finds all threshold-crossing events in a waveform at once.
+
+    Parameters:
+    - values: 1-D array of voltages.
+    - threshold, polarity, baseline, hold_equal: See event_mask.
+    - include_open: Keep an event still in progress at the end of the record
+      (its stop index is then len(values)).
+
+    Returns (starts, stops) index arrays: each event covers values[start:stop], where stop is
+    the first sample after the signal leaves the event, matching the per-sample loops.
+    """
+    inside = event_mask(values, threshold, polarity, baseline, hold_equal)
+
+    # Rising edges are +1 and falling edges -1 once the mask is padded with "outside" on both ends
+    edges = np.diff(np.concatenate(([0], inside.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+
+    if not include_open and len(stops) and stops[-1] == len(inside):
+        starts, stops = starts[:-1], stops[:-1]
+
+    return starts, stops
+
+
+def find_channel_segments(columns, channels, threshold, polarity=">=", baseline=0.0, hold_equal=False, include_open=False):
+    """
+    Runs find_segments on several channels of a loaded capture.
+
+    Parameters:
+    - columns: Channel arrays as returned by capture_loader.load_capture.
+    - channels: Channel names to segment.
+    - baseline: A single offset, or a dictionary of offsets keyed by channel name.
+
+    Returns a dictionary mapping each channel name to its (starts, stops) arrays.
+    """
+    segments = {}
+    for channel in channels:
+        offset = baseline[channel] if isinstance(baseline, dict) else baseline
+        segments[channel] = find_segments(columns[channel], threshold, polarity, offset, hold_equal, include_open)
+    return segments
+
+
+def pair_triggers(trigger, response):
+    """
+    Pairs each trigger with the first response at or after it, re-arming only after that response.
+
+    Parameters:
+    - trigger: Boolean mask of samples that arm the search (e.g. CH1 and CH2 both above threshold).
+    - response: Boolean mask of samples that complete it (e.g. sMDT below zero).
+
+    Returns (trigger_indices, response_indices), matching the sample-by-sample latency loop.
+    Each step is a binary search, so the cost grows with the number of events, not samples.
+    """
+    trigger_indices = np.flatnonzero(trigger)
+    response_indices = np.flatnonzero(response)
+    paired_triggers = []
+    paired_responses = []
+
+    position = 0
+    while position < len(trigger_indices):
+        start = trigger_indices[position]
+        found = np.searchsorted(response_indices, start, side="left")
+        if found == len(response_indices):
+            break  # Armed but never answered before the end of the record
+        stop = response_indices[found]
+        paired_triggers.append(start)
+        paired_responses.append(stop)
+        position = np.searchsorted(trigger_indices, stop, side="right")  # Re-arm after the response
+
+    return np.array(paired_triggers, dtype=np.intp), np.array(paired_responses, dtype=np.intp)
+
+
+def apply_dead_time(times, dead_time):
+    """
+    Keeps the first of every group of times closer together than dead_time.
+
+    Parameters:
+    - times: Sorted candidate times (s).
+    - dead_time: Time after an accepted candidate during which new candidates are ignored.
+
+    Returns the positions of the accepted candidates. One binary search per accepted candidate.
+    """
+    accepted = []
+    position = 0
+    while position < len(times):
+        accepted.append(position)
+        position = max(position + 1, np.searchsorted(times, times[position] + dead_time, side="left"))
+    return np.array(accepted, dtype=np.intp)
+
+
+def find_coincidences(timestamps, ch1, ch2, smdt, threshold, duration, smdt_threshold, delay, window, dead_time=0.0):
+    """
+    Finds muon candidates: both scintillators above threshold for duration samples, followed by an
+    sMDT signal within delay +/- window, with at most one candidate per dead_time.
+
+    Parameters:
+    - timestamps: Sorted sample times (s).
+    - ch1, ch2: Scintillator voltages.
+    - smdt: sMDT voltages.
+    - threshold: Scintillator threshold (strictly exceeded).
+    - duration: Consecutive samples both scintillators must stay above threshold.
+    - smdt_threshold: sMDT threshold (the signal must drop strictly below it).
+    - delay, window: The sMDT sample must fall in [t + delay - window, t + delay + window].
+    - dead_time: Candidates within dead_time of an accepted one are ignored.
+
+    Returns (trigger_indices, smdt_indices): the first sample of each accepted coincidence and the
+    first sMDT sample below threshold in its window. Candidates are the same as the per-index
+    loop (a full duration-long window that ends before the last sample), but every step is an
+    array operation or a binary search.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    both = (np.asarray(ch1) > threshold) & (np.asarray(ch2) > threshold)
+
+    # Sliding count of coincident samples: a start qualifies when its whole window is coincident
+    counts = np.concatenate(([0], np.cumsum(both, dtype=np.intp)))
+    last_start = len(both) - duration - 1  # The window must end before the final sample
+    if last_start < 0:
+        return np.array([], dtype=np.intp), np.array([], dtype=np.intp)
+    starts = np.arange(last_start + 1)
+    candidates = starts[counts[starts + duration] - counts[starts] == duration]
+
+    # First sMDT sample below threshold inside each candidate's time window
+    below = np.flatnonzero(np.asarray(smdt) < smdt_threshold)
+    expected = timestamps[candidates] + delay
+    window_start = np.searchsorted(timestamps, expected - window, side="left")
+    window_end = np.searchsorted(timestamps, expected + window, side="right")
+    first = np.searchsorted(below, window_start, side="left")
+    hit = first < len(below)
+    hit[hit] = below[first[hit]] < window_end[hit]
+
+    candidates = candidates[hit]
+    responses = below[first[hit]]
+
+    # One candidate per muon
+    keep = apply_dead_time(timestamps[candidates], dead_time)
+    return candidates[keep], responses[keep]
+
+
+class SegmentStream:
+    """
+    Incremental version of find_segments for waveforms read in chunks (see capture_loader.stream_capture).
+
+    Chunks are fed in order; each call returns the events that ended inside that chunk, with
+    indices counted from the start of the record. An event still in progress at the end of a
+    chunk is carried into the next one, so the events match find_segments on the whole record.
+    """
+
+    def __init__(self, threshold, polarity=">=", baseline=0.0, hold_equal=False):
+        self.threshold = threshold
+        self.polarity = polarity
+        self.baseline = baseline
+        self.hold_equal = hold_equal
+        self.position = 0  # Samples fed so far
+        self.state = False  # Whether the last sample fed was inside an event
+        self.open_start = None  # Start of the event in progress, if any
+
+    def feed(self, values):
+        """Processes the next chunk; returns (starts, stops) of the events completed in it."""
+        inside = event_mask(values, self.threshold, self.polarity, self.baseline, self.hold_equal, self.state)
+        if len(inside) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+
+        # Edges against the state carried from the previous chunk
+        edges = np.diff(np.concatenate(([int(self.state)], inside.view(np.int8))))
+        starts = np.flatnonzero(edges == 1) + self.position
+        stops = np.flatnonzero(edges == -1) + self.position
+
+        if self.open_start is not None:
+            starts = np.concatenate(([self.open_start], starts))
+        self.state = bool(inside[-1])
+        if self.state:
+            self.open_start, starts = starts[-1], starts[:-1]
+        else:
+            self.open_start = None
+
+        self.position += len(inside)
+        return starts, stops
+
+    def finish(self):
+        """Returns the event still open at the end of the record as (starts, stops), stop being the record length."""
+        if self.open_start is None:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        return np.array([self.open_start], dtype=np.intp), np.array([self.position], dtype=np.intp)
+
+
+class PairStream:
+    """
+    Incremental version of pair_triggers for captures read in chunks.
+
+    A trigger still waiting for its response at the end of a chunk stays armed into the next one,
+    so the pairs match pair_triggers on the whole record.
+    """
+
+    def __init__(self):
+        self.position = 0  # Samples fed so far
+        self.armed = None  # Index of the trigger waiting for a response, if any
+
+    def feed(self, trigger, response):
+        """Processes the next chunk of both masks; returns (triggers, responses) of the pairs answered in it."""
+        trigger_indices = np.flatnonzero(trigger) + self.position
+        response_indices = np.flatnonzero(response) + self.position
+        if self.armed is not None:
+            trigger_indices = np.concatenate(([self.armed], trigger_indices))
+        paired_triggers = []
+        paired_responses = []
+
+        self.armed = None
+        position = 0
+        while position < len(trigger_indices):
+            start = trigger_indices[position]
+            found = np.searchsorted(response_indices, start, side="left")
+            if found == len(response_indices):
+                self.armed = start  # Answered in a later chunk, if at all
+                break
+            stop = response_indices[found]
+            paired_triggers.append(start)
+            paired_responses.append(stop)
+            position = np.searchsorted(trigger_indices, stop, side="right")
+
+        self.position += len(trigger)
+        return np.array(paired_triggers, dtype=np.intp), np.array(paired_responses, dtype=np.intp)
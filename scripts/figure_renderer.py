@@ -0,0 +1,365 @@
+import argparse
+import hashlib
+import inspect
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+from gain_fit import exponential, fit_exponential
+
+# Resolution of saved figures (600 dpi took seconds per histogram for no visible gain)
+FIGURE_DPI = 200
+
+# Set to 1 to run the analysis scripts unattended: figures are saved but not shown, and nothing waits for Enter
+HEADLESS_VARIABLE = "SMDT_HEADLESS"
+
+# Hash of the data and style each figure in a folder was last rendered from
+RENDER_CACHE = ".render_cache.json"
+
+FIGURES_DIRECTORY = os.path.join(os.path.dirname(os.getcwd()), "figures")
+SUMMARY_DIRECTORY = os.path.join(os.path.dirname(os.getcwd()), "summary_reports")
+
+
+def headless():
+    """True when the scripts should not block: SMDT_HEADLESS is set, or matplotlib has no interactive backend."""
+    if os.environ.get(HEADLESS_VARIABLE, "").lower() in ("1", "true", "yes"):
+        return True
+    import matplotlib
+    return matplotlib.get_backend().lower() in ("agg", "pdf", "ps", "svg", "cairo", "template")
+
+
+def show():
+    """plt.show() for interactive runs; headless runs just release the figures."""
+    import matplotlib.pyplot as plt
+    if headless():
+        plt.close("all")
+    else:
+        plt.show()
+
+
+def pause(prompt="Press Enter to exit..."):
+    """Waits for Enter, except in headless runs."""
+    if not headless():
+        input(prompt)
+
+
+def _feed(digest, value):
+    """Adds a value (arrays, tables, containers, objects such as Histogram) to a hash."""
+    if isinstance(value, np.ndarray):
+        digest.update(f"array{value.dtype.str}{value.shape}".encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (pd.DataFrame, pd.Series)):
+        _feed(digest, value.to_dict("list") if isinstance(value, pd.DataFrame) else value.tolist())
+    elif isinstance(value, dict):
+        digest.update(b"dict")
+        for key in sorted(value, key=str):
+            _feed(digest, str(key))
+            _feed(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"list{len(value)}".encode())
+        for item in value:
+            _feed(digest, item)
+    elif hasattr(value, "__dict__") and not callable(value):
+        _feed(digest, vars(value))
+    else:
+        digest.update(repr(value).encode())
+
+
+def figure_hash(job):
+    """Hash of everything a figure depends on: the plotting code, its data, its style and output settings."""
+    digest = hashlib.sha256()
+    function = job["function"]
+    try:
+        source = inspect.getsource(function)
+    except (OSError, TypeError):
+        source = ""
+    _feed(digest, [function.__qualname__, source])  # Not the module: it is __main__ when run as a script
+    _feed(digest, job.get("data", {}))
+    _feed(digest, job.get("style", {}))
+    _feed(digest, [os.path.basename(job["output"]), job.get("dpi", FIGURE_DPI)])
+    return digest.hexdigest()
+
+
+def draw(job, fig=None):
+    """Draws a job on fig (a new off-screen Figure by default) and returns the figure."""
+    style = job.get("style", {})
+    fig = Figure(figsize=style.get("figsize", (10, 6))) if fig is None else fig
+    job["function"](fig, job.get("data", {}), style)
+    return fig
+
+
+def render(job):
+    """Draws a job off-screen and saves it; returns the output path. Runs in worker processes."""
+    fig = draw(job)
+    if os.path.dirname(job["output"]):
+        os.makedirs(os.path.dirname(job["output"]), exist_ok=True)
+    fig.savefig(job["output"], dpi=job.get("dpi", FIGURE_DPI), bbox_inches="tight")
+    return job["output"]
+
+
+def read_cache(directory):
+    path = os.path.join(directory, RENDER_CACHE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_cache(directory, cache):
+    with open(os.path.join(directory, RENDER_CACHE), "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+
+
+def render_figures(jobs, workers=1, force=False):
+    """
+    Renders a set of figures, skipping every figure whose data and style have not changed.
+
+    Parameters:
+    - jobs: List of figure jobs, each a dictionary with
+        - function: Module-level function(fig, data, style) that draws on a matplotlib Figure.
+        - data: Arrays, tables and values the figure is drawn from.
+        - style: Plot settings (figsize, colors, labels, ...).
+        - output: Image path.
+        - dpi: Resolution (default FIGURE_DPI).
+    - workers: Worker processes used to render the figures that changed (1 renders in this process).
+    - force: Render every figure even if it is unchanged.
+
+    Figures are drawn on off-screen Figure objects (no pyplot, no window), so any backend is fine.
+    Returns {output path: "rendered" or "unchanged"}.
+    """
+    hashes = [figure_hash(job) for job in jobs]
+    caches = {}
+    stale = []
+    status = {}
+    for job, key in zip(jobs, hashes):
+        directory = os.path.dirname(os.path.abspath(job["output"]))
+        cache = caches.setdefault(directory, read_cache(directory))
+        name = os.path.basename(job["output"])
+        if not force and cache.get(name) == key and os.path.exists(job["output"]):
+            status[job["output"]] = "unchanged"
+        else:
+            stale.append((job, key))
+
+    if workers > 1 and len(stale) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(render, [job for job, key in stale]))
+    else:
+        for job, key in stale:
+            render(job)
+
+    for job, key in stale:
+        directory = os.path.dirname(os.path.abspath(job["output"]))
+        caches[directory][os.path.basename(job["output"])] = key
+        status[job["output"]] = "rendered"
+    for directory, cache in caches.items():
+        os.makedirs(directory, exist_ok=True)
+        write_cache(directory, cache)
+    return status
+
+
+def show_figures(jobs):
+    """Opens interactive windows for figure jobs (after they were rendered), unless running headless."""
+    if headless():
+        return
+    import matplotlib.pyplot as plt
+    for job in jobs:
+        draw(job, plt.figure(figsize=job.get("style", {}).get("figsize", (10, 6))))
+    plt.show()
+
+
+def histogram_figure(fig, data, style):
+    """
+    Histograms drawn from accumulated counts, stacked (one panel each) or overlaid, with mean and SEM bands.
+
+    data: {"histograms": {label: Histogram}, "stats": {label: (mean, sem)} (optional)}
+    style: colors (one per label), xlabel, unit, alpha, stacked (default True), titles (one per label) or title.
+    """
+    labels = list(data["histograms"])
+    stacked = style.get("stacked", True)
+    if stacked:
+        axes = fig.subplots(len(labels), 1, sharex=True, squeeze=False, gridspec_kw={"hspace": 0.4})[:, 0]
+    else:
+        axes = [fig.subplots()] * len(labels)
+    colors = style.get("colors", ["blue", "green", "orange"])
+    unit = style.get("unit", "")
+    for k, (ax, label) in enumerate(zip(axes, labels)):
+        data["histograms"][label].plot(ax, color=colors[k % len(colors)], alpha=style.get("alpha", 0.5),
+                                       edgecolor="black", label=label)
+        if label in data.get("stats", {}):
+            mean, sem = data["stats"][label]
+            ax.axvline(mean, color="red", linestyle="dashed", label=f"{label} Mean: {mean:.2e} {unit}")
+            ax.fill_betweenx([0, ax.get_ylim()[1]], mean - sem, mean + sem, color="red", alpha=0.4,
+                             edgecolor="red", linestyle="dotted", label=f"{label} SEM: {sem:.2e} {unit}")
+        ax.set_ylabel("Frequency")
+        ax.set_title(style.get("titles", labels)[k] if stacked else style.get("title", ""))
+        ax.legend(loc="upper right", framealpha=0.7)  # Semi-transparent legend
+        ax.grid(True)
+    axes[-1].set_xlabel(style.get("xlabel", ""))
+
+
+def gain_curve_figure(fig, data, style):
+    """
+    Mean signal per HV setting with SEM error bars and the exponential gain fit.
+
+    data: {"voltages", "means", "sems", "fit": (a, b) or None}
+    style: title, ylabel.
+    """
+    ax = fig.subplots()
+    voltages = np.asarray(data["voltages"], dtype=np.float64)
+    ax.errorbar(voltages, data["means"], yerr=data["sems"], fmt="o", label="Mean ± Standard Error", color="blue", capsize=4)
+    if data.get("fit") is not None and not np.isnan(data["fit"]).any():
+        a, b = data["fit"]
+        voltage_fit = np.linspace(voltages.min(), voltages.max(), 1000)
+        ax.plot(voltage_fit, exponential(voltage_fit, a, b), color="red",
+                label=f"Exponential Fit:\n$y = {a:.2e} \\, e^{{{b:.2e}x}}$")
+    ax.set_title(style.get("title", "Voltage Optimization Curve"))
+    ax.set_xlabel("High-Voltage Supply (V)")
+    ax.set_ylabel(style.get("ylabel", "Signal Area (V·s)"))
+    ax.grid(True)
+    ax.legend()
+    fig.tight_layout()
+
+
+def bar_figure(fig, data, style):
+    """
+    One bar per capture with the overall mean and a ±1 standard deviation band.
+
+    data: {"values": per-capture values}
+    style: label, title, xlabel, ylabel, color.
+    """
+    ax = fig.subplots()
+    values = np.asarray(data["values"], dtype=np.float64)
+    numbers = np.arange(1, len(values) + 1)
+    mean = np.nanmean(values) if len(values) else np.nan
+    std = np.nanstd(values, ddof=1) if len(values) > 1 else np.nan
+    ax.bar(numbers, values, color=style.get("color", "blue"), alpha=0.7, label=style.get("label", "Signal Area"))
+    ax.axhline(y=mean, color="red", linestyle="--", label=f"Overall Mean: {mean:.2e}")
+    ax.fill_between(numbers, mean - std, mean + std, color="red", alpha=0.2, label=f"±1 Std Dev: {std:.2e}")
+    ax.text(len(values) - 1, mean + std * 0.5, f"Mean: {mean:.2e}", color="red", fontsize=10)
+    ax.set_xlabel(style.get("xlabel", "Event Number"))
+    ax.set_ylabel(style.get("ylabel", "Total Signal Area"))
+    ax.set_title(style.get("title", ""))
+    ax.tick_params(axis="x", labelrotation=45)
+    ax.legend()
+    ax.grid()
+    fig.tight_layout()
+
+
+def signal_area_job(histograms, stats, figures_directory=FIGURES_DIRECTORY):
+    """
+    Job for Signal_Area_Histogram.png (Scintillator Event Areas.py).
+
+    Parameters:
+    - histograms: {"CH1 (V)": Histogram, "CH2 (V)": Histogram} of the fine area bins.
+    - stats: {"CH1 (V)": (mean, sem), "CH2 (V)": (mean, sem)} of the areas.
+    """
+    from histogram_accumulator import rice_bins
+
+    bins = rice_bins(histograms["CH1 (V)"].total())  # Uses 2.5 × cube root of N for better binning
+    return {
+        "function": histogram_figure,
+        # Stats rounded past the printed precision, so the same run summarized either way hashes the same
+        "data": {"histograms": {channel.split()[0]: histogram.trimmed().rebinned(bins) for channel, histogram in histograms.items()},
+                 "stats": {channel.split()[0]: (float(f"{mean:.4e}"), float(f"{sem:.4e}")) for channel, (mean, sem) in stats.items()}},
+        "style": {"figsize": (10, 8), "colors": ["blue", "green"], "xlabel": "Signal Area (V·s)", "unit": "V·s",
+                  "titles": ["CH1 Histogram of Signal Areas", "CH2 Histogram of Signal Areas"]},
+        "output": os.path.join(figures_directory, "Signal_Area_Histogram.png"),
+    }
+
+
+def duration_job(histograms, figures_directory=FIGURES_DIRECTORY):
+    """Job for Scintillator_Distribution_of_Event_Durations.png: CH1 and CH2 durations overlaid, 30 bins."""
+    return {
+        "function": histogram_figure,
+        "data": {"histograms": {channel.split()[0]: histogram.trimmed().rebinned(30) for channel, histogram in histograms.items()}},
+        "style": {"figsize": (10, 5), "colors": ["blue", "green"], "xlabel": "Event Duration (s)", "alpha": 0.7,
+                  "stacked": False, "title": "Distribution of Event Durations"},
+        "output": os.path.join(figures_directory, "Scintillator_Distribution_of_Event_Durations.png"),
+    }
+
+
+def signal_area_bar_jobs(table, figures_directory=FIGURES_DIRECTORY):
+    """
+    Jobs for the <channel>_Signal_Area_Bar_Graph.png figures (Voltage_vs_Signal_Area-Bar_Graph.py).
+
+    Parameters:
+    - table: One row per capture with a "<channel> Total Area" column for every channel.
+    """
+    jobs = []
+    for column in [column for column in table.columns if column.endswith(" Total Area")]:
+        channel = column[:-len(" Total Area")]
+        jobs.append({
+            "function": bar_figure,
+            "data": {"values": np.asarray(table[column], dtype=np.float64)},
+            "style": {"figsize": (14, 7), "color": "blue", "label": f"{channel} Signal Area",
+                      "title": f"{channel} - Voltage vs. Signal Area", "xlabel": "Event Number", "ylabel": "Total Signal Area"},
+            "output": os.path.join(figures_directory, f"{channel.replace(' ', '_')}_Signal_Area_Bar_Graph.png"),
+        })
+    return jobs
+
+
+def optimization_curve_job(summary, fit, figures_directory=FIGURES_DIRECTORY):
+    """
+    Job for Voltage_Optimization_Curve.png (Voltage_Optimization_Curve.py).
+
+    Parameters:
+    - summary: Per-voltage table with Voltage (V), Mean and SEM columns (running_stats.StatsTable.summary).
+    - fit: gain_fit.fit_exponential result for it (the curve is left out if the fit did not converge).
+    """
+    return {
+        "function": gain_curve_figure,
+        "data": {"voltages": np.asarray(summary["Voltage (V)"]), "means": np.asarray(summary["Mean"]),
+                 "sems": np.asarray(summary["SEM"]), "fit": [fit["a"], fit["b"]] if fit["converged"] else [np.nan, np.nan]},
+        "style": {"title": "Voltage Optimization Curve", "ylabel": "Signal Area (V·s)"},
+        "output": os.path.join(figures_directory, "Voltage_Optimization_Curve.png"),
+        "dpi": 300,
+    }
+
+
+def run_figure_jobs(summary_directory=SUMMARY_DIRECTORY, figures_directory=FIGURES_DIRECTORY):
+    """
+    Figure jobs for the saved results of a run: the area and duration histograms, the per-capture
+    signal area bar graphs and the voltage optimization curve (each if its results were saved).
+    """
+    from histogram_accumulator import load_histograms
+    from running_stats import RunningStats
+
+    jobs = []
+    area_file = os.path.join(summary_directory, "Signal_Area_Histograms.npz")
+    if os.path.exists(area_file):
+        areas = pd.read_csv(os.path.join(summary_directory, "Signal_Area_Summary.csv"))
+        stats = {}
+        for channel in ["CH1 (V)", "CH2 (V)"]:
+            running = RunningStats().update_many(areas[f"{channel.split()[0]} Area (V·s)"].dropna())
+            stats[channel] = (running.mean, running.sem())
+        jobs.append(signal_area_job(load_histograms(area_file), stats, figures_directory))
+    duration_file = os.path.join(summary_directory, "Event_Duration_Histograms.npz")
+    if os.path.exists(duration_file):
+        jobs.append(duration_job(load_histograms(duration_file), figures_directory))
+    bar_file = os.path.join(summary_directory, "Signal_Area_By_Capture.csv")
+    if os.path.exists(bar_file):
+        # Parsed back to the exact values the scripts saved, so figures they already rendered stay unchanged
+        jobs += signal_area_bar_jobs(pd.read_csv(bar_file, float_precision="round_trip"), figures_directory)
+    curve_file = os.path.join(summary_directory, "Voltage_Optimization_Summary.csv")
+    if os.path.exists(curve_file):
+        summary = pd.read_csv(curve_file, float_precision="round_trip")
+        fit = fit_exponential(summary["Voltage (V)"].to_numpy(dtype=np.float64), summary["Mean"].to_numpy(), summary["SEM"].to_numpy())
+        jobs.append(optimization_curve_job(summary, fit, figures_directory))
+    return jobs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the figures of a run off-screen, skipping unchanged ones.")
+    parser.add_argument("--summary", default=SUMMARY_DIRECTORY, help="Folder with the saved run results")
+    parser.add_argument("--figures", default=FIGURES_DIRECTORY, help="Folder for the figures")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes (default: every core)")
+    parser.add_argument("--force", action="store_true", help="Render every figure even if unchanged")
+    args = parser.parse_args()
+
+    jobs = run_figure_jobs(args.summary, args.figures)
+    for output, state in render_figures(jobs, workers=args.workers, force=args.force).items():
+        print(f"{state:>9}: {output}")
@@ -0,0 +1,49 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+
+def list_capture_files(directory):
+    """Sorted names of the .csv files in a directory (sorted so every run visits files in the same order)."""
+    return sorted(file for file in os.listdir(directory) if file.endswith(".csv"))
+
+
+def guarded_call(function, file_path):
+    """Runs function(file_path), turning a ValueError (file is not a capture) into a skip message."""
+    try:
+        return True, function(file_path)
+    except ValueError as e:
+        return False, str(e)
+
+
+def map_files(function, directory, files=None, workers=1, chunksize=1):
+    """
+    Applies a per-file analysis function to every capture in a directory, optionally across processes.
+
+    Parameters:
+    - function: Called as function(file_path); must be defined at module level so it can be pickled.
+    - directory: Folder holding the captures.
+    - files: File names to process (default: every .csv file in the directory).
+    - workers: Number of worker processes (1 runs serially in this process).
+    - chunksize: Files handed to a worker at a time; larger chunks cut overhead for many small files.
+
+    Returns a list of (file, result) in sorted file name order, so output is identical to a serial run.
+    Files for which the function raises ValueError are reported and left out.
+    """
+    files = list_capture_files(directory) if files is None else sorted(files)
+    paths = [os.path.join(directory, file) for file in files]
+    call = partial(guarded_call, function)
+
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(call, paths, chunksize=chunksize))
+    else:
+        outcomes = [call(path) for path in paths]
+
+    results = []
+    for file, (ok, value) in zip(files, outcomes):
+        if ok:
+            results.append((file, value))
+        else:
+            print(f"Skipping {file}: {value}")
+    return results
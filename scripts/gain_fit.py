@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+
+# Levenberg-Marquardt settings
+MAX_ITERATIONS = 100
+TOLERANCE = 1e-12  # Relative decrease of chi-square below which a fit has converged
+INITIAL_DAMPING = 1e-3
+
+
+def exponential(x, a, b):
+    """Gain curve model y = a * exp(b * x)."""
+    return a * np.exp(b * x)
+
+
+def _prepare(x, y, sigma):
+    """Broadcasts x, y and sigma to (curves, points) arrays and builds the weight of every point."""
+    y = np.atleast_2d(np.asarray(y, dtype=np.float64))
+    x = np.broadcast_to(np.asarray(x, dtype=np.float64), y.shape)
+    if sigma is None:
+        sigma = np.ones_like(y)
+    sigma = np.broadcast_to(np.asarray(sigma, dtype=np.float64), y.shape)
+
+    # Points without a usable value or uncertainty (e.g. a voltage with a single event) get no weight
+    valid = np.isfinite(x) & np.isfinite(y) & np.isfinite(sigma) & (sigma > 0)
+    weights = np.where(valid, 1.0 / np.where(valid, sigma, 1.0) ** 2, 0.0)
+    return np.where(valid, x, 0.0), np.where(valid, y, 0.0), weights
+
+
+def _weighted_line(x, z, weights):
+    """Closed-form weighted least-squares line z = c + b * (x - x0) per curve; returns (x0, c, b)."""
+    total = weights.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x0 = (weights * x).sum(axis=1) / total
+        z0 = (weights * z).sum(axis=1) / total
+        dx = x - x0[:, None]
+        b = (weights * dx * (z - z0[:, None])).sum(axis=1) / (weights * dx * dx).sum(axis=1)
+    return x0, z0, b
+
+
+def log_linear_guess(x, y, sigma=None):
+    """
+    Initial a and b for y = a * exp(b * x) from a weighted straight-line fit of ln(y) against x.
+
+    Parameters:
+    - x: Voltages, shape (points,) or (curves, points).
+    - y: Means, shape (points,) or (curves, points); points with y <= 0 are left out of the guess.
+    - sigma: Uncertainties of y (e.g. SEM). ln(y) then has uncertainty sigma / y.
+
+    Returns (a, b) arrays with one value per curve (NaN where fewer than two points are usable).
+    """
+    x, y, weights = _prepare(x, y, sigma)
+    weights = np.where(y > 0, weights * y * y, 0.0)  # 1 / (sigma / y)^2
+    x0, c, b = _weighted_line(x, np.log(np.where(y > 0, y, 1.0)), weights)
+    return np.exp(c - b * x0), b
+
+
+def fit_exponential(x, y, sigma=None, absolute_sigma=True, max_iterations=MAX_ITERATIONS, tolerance=TOLERANCE):
+    """
+    Weighted least-squares fits of y = a * exp(b * x), for many curves at once.
+
+    Parameters:
+    - x: Voltages, shape (points,) shared by every curve, or (curves, points) padded with NaN.
+    - y: Mean signal per voltage, shape (points,) for one curve or (curves, points).
+    - sigma: Uncertainty of each mean (e.g. the per-voltage SEM); points with a missing or zero
+      sigma are left out. Without sigma every point has the same weight.
+    - absolute_sigma: If True the covariance uses sigma as given; if False it is scaled by the
+      reduced chi-square (as scipy's curve_fit does by default).
+    - max_iterations, tolerance: Levenberg-Marquardt stopping rules.
+
+    The fit starts from the log-linear guess and runs Levenberg-Marquardt on every curve in the
+    same array operations, with x centered per curve so the two parameters are well conditioned.
+    Returns a dictionary of per-curve arrays: a, b, covariance (curves, 2, 2) of (a, b), a_err, b_err,
+    chi2, dof, converged and iterations (scalars instead of arrays if y was 1-D).
+    """
+    single = np.ndim(y) == 1
+    x, y, weights = _prepare(x, y, sigma)
+    curves = y.shape[0]
+
+    # Parameters are c = ln(a) + b * x0 and b, with the model exp(c + b * (x - x0))
+    guess_weights = np.where(y > 0, weights * y * y, 0.0)
+    x0, c, b = _weighted_line(x, np.log(np.where(y > 0, y, 1.0)), guess_weights)
+    dx = np.where(weights > 0, x - np.nan_to_num(x0)[:, None], 0.0)
+
+    def chi_square(c, b):
+        return (weights * (y - np.exp(c[:, None] + b[:, None] * dx)) ** 2).sum(axis=1)
+
+    active = np.isfinite(c) & np.isfinite(b) & (np.count_nonzero(weights, axis=1) >= 2)
+    c = np.where(active, c, 0.0)
+    b = np.where(active, b, 0.0)
+    cost = chi_square(c, b)
+    damping = np.full(curves, INITIAL_DAMPING)
+    converged = np.zeros(curves, dtype=bool)
+    iterations = np.zeros(curves, dtype=np.intp)
+
+    for _ in range(max_iterations):
+        if not active.any():
+            break
+        model = np.exp(c[:, None] + b[:, None] * dx)
+        residual = y - model
+        j_c, j_b = model, model * dx  # Jacobian columns
+
+        # 2 x 2 normal equations per curve, damped on the diagonal
+        h_cc = (weights * j_c * j_c).sum(axis=1) * (1 + damping)
+        h_bb = (weights * j_b * j_b).sum(axis=1) * (1 + damping)
+        h_cb = (weights * j_c * j_b).sum(axis=1)
+        g_c = (weights * j_c * residual).sum(axis=1)
+        g_b = (weights * j_b * residual).sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            det = h_cc * h_bb - h_cb * h_cb
+            step_c = np.where(active, (h_bb * g_c - h_cb * g_b) / det, 0.0)
+            step_b = np.where(active, (h_cc * g_b - h_cb * g_c) / det, 0.0)
+        step_c = np.nan_to_num(step_c)
+        step_b = np.nan_to_num(step_b)
+
+        with np.errstate(over="ignore", invalid="ignore"):
+            new_cost = chi_square(c + step_c, b + step_b)
+        accepted = active & (new_cost <= cost)
+        finished = accepted & (cost - new_cost <= tolerance * cost)
+
+        c = np.where(accepted, c + step_c, c)
+        b = np.where(accepted, b + step_b, b)
+        cost = np.where(accepted, new_cost, cost)
+        damping = np.where(accepted, damping / 10, damping * 10)
+        iterations += active
+
+        # A curve is done once chi-square stops falling (or no damping finds a better step)
+        finished |= active & (damping > 1e12)
+        converged |= finished
+        active &= ~finished
+
+    # Covariance of (c, b) from the undamped normal equations at the solution
+    model = np.exp(c[:, None] + b[:, None] * dx)
+    h_cc = (weights * model * model).sum(axis=1)
+    h_bb = (weights * (model * dx) ** 2).sum(axis=1)
+    h_cb = (weights * model * model * dx).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        det = h_cc * h_bb - h_cb * h_cb
+        covariance_cb = np.stack([np.stack([h_bb, -h_cb], axis=-1), np.stack([-h_cb, h_cc], axis=-1)], axis=-2)
+        covariance_cb = covariance_cb / det[:, None, None]
+
+    dof = np.count_nonzero(weights, axis=1) - 2
+    if not absolute_sigma:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            covariance_cb = covariance_cb * np.where(dof > 0, cost / dof, np.nan)[:, None, None]
+
+    # Back to y = a * exp(b * x): a = exp(c - b * x0), so da/dc = a and da/db = -a * x0
+    fitted = converged | (iterations > 0)
+    a = np.where(fitted, np.exp(c - b * np.nan_to_num(x0)), np.nan)
+    b = np.where(fitted, b, np.nan)
+    transform = np.zeros((curves, 2, 2))
+    transform[:, 0, 0] = a
+    transform[:, 0, 1] = -a * np.nan_to_num(x0)
+    transform[:, 1, 1] = 1.0
+    covariance = transform @ covariance_cb @ np.swapaxes(transform, 1, 2)
+    covariance[~fitted] = np.nan
+
+    result = {
+        "a": a,
+        "b": b,
+        "covariance": covariance,
+        "a_err": np.sqrt(covariance[:, 0, 0]),
+        "b_err": np.sqrt(covariance[:, 1, 1]),
+        "chi2": np.where(fitted, cost, np.nan),
+        "dof": dof,
+        "converged": converged,
+        "iterations": iterations,
+    }
+    if single:
+        result = {name: value[0] for name, value in result.items()}
+    return result
+
+
+def fit_groups(summary, by, x="Voltage (V)", y="Mean", sigma="SEM", **kwargs):
+    """
+    Fits one gain curve per group of a long per-voltage table in a single batched call.
+
+    Parameters:
+    - summary: DataFrame with one row per (group, voltage), e.g. StatsTable.summary() or
+      CaptureCatalog.voltage_summary() results stacked with channel / run / threshold columns.
+    - by: Column name(s) identifying a curve (e.g. "Metric" or ["Run", "Channel"]).
+    - x, y, sigma: Columns holding the voltage, the mean and its uncertainty (sigma=None: unweighted).
+    - kwargs: Passed to fit_exponential.
+
+    Returns a DataFrame with one row per group: a, b, their errors, cov(a, b), chi2, dof and converged.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    groups = list(summary.groupby(by, sort=True))
+    points = max((len(group) for _, group in groups), default=0)
+
+    # Pad every curve to the same number of points with NaN (ignored by the fit)
+    xs = np.full((len(groups), points), np.nan)
+    ys = np.full((len(groups), points), np.nan)
+    sigmas = None if sigma is None else np.full((len(groups), points), np.nan)
+    for row, (_, group) in enumerate(groups):
+        xs[row, :len(group)] = group[x]
+        ys[row, :len(group)] = group[y]
+        if sigma is not None:
+            sigmas[row, :len(group)] = group[sigma]
+
+    result = fit_exponential(xs, ys, sigmas, **kwargs)
+    keys = [key if isinstance(key, tuple) else (key,) for key, _ in groups]
+    fits = pd.DataFrame(keys, columns=by)
+    for name in ["a", "a_err", "b", "b_err"]:
+        fits[name] = result[name]
+    fits["cov_ab"] = result["covariance"][:, 0, 1]
+    for name in ["chi2", "dof", "converged"]:
+        fits[name] = result[name]
+    return fits
@@ -0,0 +1,161 @@
+import argparse
+import os
+
+import numpy as np
+
+
+def rice_bins(count, factor=2.5):
+    """Bin count from the Rice rule scaled by factor (2.5 × cube root of N gives the finer binning used for the area plots)."""
+    return max(1, int(factor * np.cbrt(count)))
+
+
+class Histogram:
+    """
+    Histogram with fixed bin edges that is filled incrementally.
+
+    Values are binned as they arrive (the last bin includes its right edge, as np.histogram does)
+    and values outside the edges are counted as underflow / overflow, so only the counts are kept.
+    Histograms with the same edges from parallel workers or separate runs merge exactly, and are
+    saved to and loaded from small .npz files.
+    """
+
+    def __init__(self, edges, counts=None, underflow=0, overflow=0):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        if self.edges.ndim != 1 or len(self.edges) < 2 or np.any(np.diff(self.edges) <= 0):
+            raise ValueError("Bin edges must be a 1-D array of at least two increasing values.")
+        if counts is None:
+            counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.counts = np.asarray(counts, dtype=np.int64).copy()
+        self.underflow = int(underflow)
+        self.overflow = int(overflow)
+
+    @classmethod
+    def linear(cls, low, high, bins):
+        """bins equal-width bins from low to high."""
+        return cls(np.linspace(low, high, bins + 1))
+
+    @classmethod
+    def log(cls, low, high, bins):
+        """bins logarithmically spaced bins from low to high (both > 0)."""
+        if low <= 0:
+            raise ValueError("Log bins need a lower edge above zero.")
+        return cls(np.geomspace(low, high, bins + 1))
+
+    @classmethod
+    def from_values(cls, values, bins):
+        """bins equal-width bins spanning the values, filled with them (the binning of plt.hist(values, bins))."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        edges = np.histogram_bin_edges(values, bins)
+        return cls(edges).fill(values)
+
+    def fill(self, values):
+        """Adds a batch of values (NaNs are ignored)."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        index = np.searchsorted(self.edges, values, side="right") - 1
+        index[values == self.edges[-1]] = len(self.counts) - 1  # Last bin is closed
+        inside = (index >= 0) & (index < len(self.counts))
+        self.underflow += int(np.count_nonzero(index < 0))
+        self.overflow += int(np.count_nonzero(index >= len(self.counts)))
+        self.counts += np.bincount(index[inside], minlength=len(self.counts))
+        return self
+
+    def merge(self, other):
+        """Adds another histogram's counts (the bin edges must be the same)."""
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Histograms with different bin edges cannot be merged.")
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def total(self):
+        """Number of values filled, including underflow and overflow."""
+        return int(self.counts.sum()) + self.underflow + self.overflow
+
+    def centers(self):
+        return (self.edges[:-1] + self.edges[1:]) / 2
+
+    def trimmed(self):
+        """Copy without the empty bins at either end (under/overflow are kept)."""
+        filled = np.flatnonzero(self.counts)
+        if len(filled) == 0:
+            return Histogram(self.edges, self.counts, self.underflow, self.overflow)
+        first, last = filled[0], filled[-1] + 1
+        return Histogram(self.edges[first:last + 1], self.counts[first:last], self.underflow, self.overflow)
+
+    def rebinned(self, bins):
+        """Copy with consecutive bins combined into about bins wider bins (e.g. fine fixed bins down to a Rice-rule count)."""
+        boundaries = np.unique(np.round(np.linspace(0, len(self.counts), min(bins, len(self.counts)) + 1)).astype(np.intp))
+        counts = np.add.reduceat(self.counts, boundaries[:-1])
+        return Histogram(self.edges[boundaries], counts, self.underflow, self.overflow)
+
+    def plot(self, ax, **kwargs):
+        """
+        Draws the counts as bars on a matplotlib axis.
+
+        Keyword arguments are passed to ax.hist (color, alpha, edgecolor, label, ...), so the figure
+        looks the same as plt.hist on the original values with the same bins.
+        """
+        return ax.hist(self.centers(), bins=self.edges, weights=self.counts, **kwargs)
+
+    def save(self, file_path):
+        save_histograms(file_path, {"histogram": self})
+
+    @classmethod
+    def load(cls, file_path):
+        return load_histograms(file_path)["histogram"]
+
+    def __repr__(self):
+        return (f"Histogram(bins={len(self.counts)}, range=({self.edges[0]:.6g}, {self.edges[-1]:.6g}), "
+                f"total={self.total()})")
+
+
+def save_histograms(file_path, histograms):
+    """Writes several named histograms to one .npz file."""
+    arrays = {}
+    for name, histogram in histograms.items():
+        arrays[f"{name}/edges"] = histogram.edges
+        arrays[f"{name}/counts"] = histogram.counts
+        arrays[f"{name}/flow"] = np.array([histogram.underflow, histogram.overflow], dtype=np.int64)
+    with open(file_path, "wb") as f:  # A file object keeps np.savez from appending another .npz
+        np.savez_compressed(f, **arrays)
+
+
+def load_histograms(file_path):
+    """Reads the named histograms written by save_histograms."""
+    with np.load(file_path) as arrays:
+        names = [key[:-len("/edges")] for key in arrays.files if key.endswith("/edges")]
+        return {name: Histogram(arrays[f"{name}/edges"], arrays[f"{name}/counts"], *arrays[f"{name}/flow"])
+                for name in names}
+
+
+def merge_files(file_paths):
+    """Merges the histograms of several .npz files by name (e.g. the per-run partials of a campaign)."""
+    merged = {}
+    for file_path in file_paths:
+        for name, histogram in load_histograms(file_path).items():
+            if name in merged:
+                merged[name].merge(histogram)
+            else:
+                merged[name] = histogram
+    return merged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge saved histograms (e.g. per-run partials) into one file.")
+    parser.add_argument("output", help=".npz file for the merged histograms")
+    parser.add_argument("inputs", nargs="+", help="Saved histogram .npz files")
+    args = parser.parse_args()
+
+    merged = merge_files(args.inputs)
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    save_histograms(args.output, merged)
+    for name, histogram in merged.items():
+        print(f"{name}: {histogram}")
+    print(f"Merged histograms saved to: {args.output}")
@@ -0,0 +1,206 @@
+import argparse
+
+import numpy as np
+
+from gain_fit import exponential, fit_exponential
+from running_stats import StatsTable
+
+# Default scan settings (HV supply range used for the voltage optimization captures)
+METRIC = "Signal Area (V·s)"
+VOLTAGE_RANGE = (2800.0, 3800.0)  # Lowest and highest HV setting the planner may suggest (V)
+VOLTAGE_STEP = 50.0  # Resolution of the suggested setpoints (V)
+MIN_EVENTS = 100  # Fewest events collected at a setpoint
+MAX_EVENTS = 5000  # Most events collected at a setpoint in one step
+KNEE_WINDOW = 250.0  # Half-width of the HV window around the operating point that is fitted and measured (V)
+
+
+class HVScanPlanner:
+    """
+    Suggests the next HV setpoint of a voltage scan, and how many events to collect there.
+
+    The signal area grows exponentially with HV, so the operating point is taken as the knee
+    where the fitted mean area reaches target (the area the readout needs to clear its
+    threshold reliably). Its uncertainty follows from the gain fit's covariance. Once the knee is
+    located, only setpoints within window of it are fitted and suggested, so the exponential only
+    has to hold locally and the beam time goes to the knee instead of a fixed grid. Each suggestion
+    is the setpoint (and event count) in that window that shrinks the uncertainty the most; the
+    scan is done once the uncertainty is below tolerance.
+    """
+
+    def __init__(self, target, tolerance, voltage_range=VOLTAGE_RANGE, step=VOLTAGE_STEP,
+                 min_events=MIN_EVENTS, max_events=MAX_EVENTS, window=KNEE_WINDOW, metric=METRIC):
+        self.target = target
+        self.tolerance = tolerance
+        self.voltage_range = voltage_range
+        self.step = step
+        self.min_events = min_events
+        self.max_events = max_events
+        self.window = window
+        self.metric = metric
+        self.candidates = np.arange(voltage_range[0], voltage_range[1] + step / 2, step)
+
+    def operating_point(self, fit):
+        """Knee voltage V = ln(target / a) / b of a gain fit, and its standard error from the covariance."""
+        a, b = fit["a"], fit["b"]
+        voltage = np.log(self.target / a) / b
+        gradient = np.array([-1.0 / (a * b), -voltage / b])  # dV/da, dV/db
+        return voltage, np.sqrt(gradient @ fit["covariance"] @ gradient)
+
+    def relative_spread(self, summary):
+        """Pooled event-to-event spread of the metric relative to its mean (std / mean)."""
+        usable = (summary["Count"] > 1) & (summary["Mean"] != 0)
+        weights = summary["Count"][usable] - 1
+        ratio = (summary["Std"][usable] / summary["Mean"][usable]) ** 2
+        return np.sqrt((weights * ratio).sum() / weights.sum()) if weights.sum() else 1.0
+
+    def predicted_error(self, fit, spread, voltages, events):
+        """
+        Standard error of the operating point after collecting events more events at each voltage.
+
+        Each new point adds its Fisher information (model gradient outer product / SEM^2) to the
+        inverse of the current (ln a, b) covariance.
+        """
+        a, b = fit["a"], fit["b"]
+        transform = np.diag([1.0 / a, 1.0])  # (a, b) -> (ln a, b)
+        information = np.linalg.inv(transform @ fit["covariance"] @ transform.T)
+        voltage = np.log(self.target / a) / b
+        gradient = np.array([-1.0 / b, -voltage / b])  # dV/d(ln a), dV/db
+
+        voltages = np.asarray(voltages, dtype=np.float64)
+        events = np.asarray(events, dtype=np.float64)
+        mean = exponential(voltages, a, b)
+        jacobian = np.stack([mean, mean * voltages], axis=-1)  # d mean / d(ln a), d mean / db
+        sem_squared = (spread * mean) ** 2 / events
+        added = jacobian[..., :, None] * jacobian[..., None, :] / sem_squared[..., None, None]
+        covariance = np.linalg.inv(information + added)
+        return np.sqrt(np.einsum("i,...ij,j->...", gradient, covariance, gradient))
+
+    def suggest(self, stats):
+        """
+        Next step of the scan from the statistics collected so far.
+
+        Parameters:
+        - stats: StatsTable holding the metric per voltage.
+
+        Returns a dictionary with voltage and events (the next setpoint, None when done),
+        operating_point and operating_point_err (NaN until a fit is possible), done and reason.
+        """
+        summary = stats.summary(self.metric)
+        summary = summary[summary["Voltage (V)"].notna() & (summary["Count"] > 0)]
+        measured = summary[summary["Count"] > 1]
+        step = {"voltage": None, "events": self.min_events, "operating_point": np.nan,
+                "operating_point_err": np.nan, "done": False, "reason": ""}
+
+        # Bracket the range first: the range ends and the middle, until three voltages have errors
+        if len(measured) < 3:
+            for voltage in [self.candidates[0], self.candidates[-1], self.candidates[len(self.candidates) // 2]]:
+                if voltage not in measured["Voltage (V)"].values:
+                    step.update(voltage=float(voltage), reason="initial bracket")
+                    return step
+
+        fit = fit_exponential(measured["Voltage (V)"], measured["Mean"], measured["SEM"])
+        if not fit["converged"] or not fit["a"] > 0 or not fit["b"] > 0:
+            # Add the setpoint farthest from every measured voltage
+            distance = np.abs(self.candidates[:, None] - measured["Voltage (V)"].values[None, :]).min(axis=1)
+            step.update(voltage=float(self.candidates[np.argmax(distance)]), reason="gain fit failed; adding a point")
+            return step
+
+        voltage, error = self.operating_point(fit)
+
+        # Refit on the setpoints near the knee once there are enough of them
+        near = measured[np.abs(measured["Voltage (V)"] - voltage) <= self.window]
+        if len(near) >= 3:
+            local = fit_exponential(near["Voltage (V)"], near["Mean"], near["SEM"])
+            if local["converged"] and local["a"] > 0 and local["b"] > 0:
+                fit = local
+                voltage, error = self.operating_point(fit)
+        step.update(operating_point=voltage, operating_point_err=error)
+        inside = self.voltage_range[0] <= voltage <= self.voltage_range[1]
+        if inside and error <= self.tolerance:
+            step.update(done=True, events=0, reason=f"operating point known to ±{error:.1f} V")
+            return step
+        if not inside:
+            # Measure at the end of the range nearest the knee to pull the fit towards it
+            nearest = self.candidates[0] if voltage < self.voltage_range[0] else self.candidates[-1]
+            step.update(voltage=float(nearest), events=self.max_events, reason="operating point outside the range")
+            return step
+
+        # Setpoint whose next batch shrinks the operating point error the most
+        spread = self.relative_spread(summary)
+        candidates = self.candidates[np.abs(self.candidates - voltage) <= self.window]
+        if len(candidates) == 0:
+            candidates = self.candidates[[np.argmin(np.abs(self.candidates - voltage))]]
+        errors = self.predicted_error(fit, spread, candidates, np.full(len(candidates), self.min_events))
+        best = candidates[np.argmin(errors)]
+
+        # Fewest events there that reach the tolerance (or the most allowed in one step)
+        counts = np.unique(np.geomspace(self.min_events, self.max_events, 32).astype(int))
+        reached = self.predicted_error(fit, spread, np.full(len(counts), best), counts) <= self.tolerance
+        events = counts[np.argmax(reached)] if reached.any() else self.max_events
+        step.update(voltage=float(best), events=int(events), reason="largest reduction of the operating point error")
+        return step
+
+
+class SimulatedDetector:
+    """
+    Offline stand-in for the detector: signal areas drawn around a * exp(b * HV) with a
+    relative event-to-event spread (gamma distributed, so areas stay positive).
+    """
+
+    def __init__(self, a=1e-9, b=1e-3, spread=0.3, seed=None):
+        self.a = a
+        self.b = b
+        self.spread = spread
+        self.random = np.random.default_rng(seed)
+
+    def measure(self, voltage, events):
+        """Signal areas of events simulated events at one HV setting."""
+        shape = 1.0 / self.spread ** 2
+        return self.random.gamma(shape, exponential(voltage, self.a, self.b) / shape, size=events)
+
+
+def run_scan(planner, detector, stats=None, max_steps=50, verbose=True):
+    """
+    Runs a scan against a detector (anything with measure(voltage, events)) until the planner is done.
+
+    Returns (stats, steps): the filled StatsTable and the list of suggestions that were followed.
+    """
+    stats = StatsTable() if stats is None else stats
+    steps = []
+    for number in range(max_steps):
+        step = planner.suggest(stats)
+        steps.append(step)
+        if verbose:
+            print(f"Step {number + 1}: V_op = {step['operating_point']:.1f} ± {step['operating_point_err']:.1f} V; "
+                  + ("done" if step["done"] else f"measure {step['events']} events at {step['voltage']:.0f} V")
+                  + f" ({step['reason']})")
+        if step["done"]:
+            break
+        stats.update(step["voltage"], planner.metric, detector.measure(step["voltage"], step["events"]))
+    return stats, steps
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Suggest the next HV setpoint of a voltage scan.")
+    parser.add_argument("--target", type=float, required=True, help="Signal area that defines the operating point (V·s)")
+    parser.add_argument("--tolerance", type=float, default=5.0, help="Operating point uncertainty at which the scan stops (V)")
+    parser.add_argument("--range", type=float, nargs=2, default=VOLTAGE_RANGE, help="Lowest and highest HV setting (V)")
+    parser.add_argument("--step", type=float, default=VOLTAGE_STEP, help="Setpoint resolution (V)")
+    parser.add_argument("--stats", help="Saved StatsTable CSV of the scan so far (running_stats.StatsTable.save)")
+    parser.add_argument("--metric", default=METRIC, help="Metric name in the StatsTable")
+    parser.add_argument("--simulate", action="store_true", help="Run a whole scan against a simulated detector")
+    parser.add_argument("--seed", type=int, help="Random seed of the simulated detector")
+    args = parser.parse_args()
+
+    planner = HVScanPlanner(args.target, args.tolerance, tuple(args.range), args.step, metric=args.metric)
+    stats = StatsTable.load(args.stats) if args.stats else StatsTable()
+    if args.simulate:
+        stats, steps = run_scan(planner, SimulatedDetector(seed=args.seed), stats)
+        total = sum(row.count for (voltage, metric), row in stats.stats.items() if metric == args.metric)
+        print(f"{total} events at {len(stats.stats)} setpoints")
+    else:
+        step = planner.suggest(stats)
+        if step["done"]:
+            print(f"Done: operating point {step['operating_point']:.1f} ± {step['operating_point_err']:.1f} V")
+        else:
+            print(f"Next: {step['events']} events at {step['voltage']:.0f} V ({step['reason']})")
@@ -0,0 +1,247 @@
+import argparse
+import cProfile
+import csv
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from multiprocessing.util import Finalize
+
+from capture_batch import DEFAULT_THREADS, load_batch
+from capture_loader import CHANNEL_NAMES, load_capture
+
+# Timing log file name, appended to in the summary_reports folder
+TIMING_LOG = "Pipeline_Timing_Log.csv"
+
+# Folder the analysis scripts append their timing to (they are run from scripts/)
+LOG_DIRECTORY = os.path.join(os.path.dirname(os.getcwd()), "summary_reports")
+
+# Counters kept for every stage
+COUNTERS = ["calls", "seconds", "files", "samples", "events", "bytes"]
+
+# Columns of the CSV log (one row per stage and run)
+LOG_COLUMNS = ["Run", "Started", "Stage", "Calls", "Seconds", "Files", "Samples", "Events", "Bytes",
+               "Files/s", "Samples/s", "Events/s", "MB/s", "Peak Memory (MB)"]
+
+
+def peak_memory_bytes():
+    """Peak resident memory of this process so far (None where the platform does not report it)."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024  # Linux reports kB, macOS bytes
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    except (AttributeError, OSError):
+        pass
+    return None
+
+
+def rate(amount, seconds):
+    """amount per second (None if nothing was timed or counted)."""
+    return amount / seconds if seconds and amount else None
+
+
+# Profilers, one per (process, folder, stage), so repeated stages accumulate into one file per process
+_profiles = {}
+
+
+class Instrumentation:
+    """
+    Wall time, counts and peak memory per pipeline stage.
+
+    Stages are timed with a context manager that costs two clock reads and a memory query, so the
+    instrumentation can stay on for every run. Records from worker processes are plain dictionaries
+    that merge into the parent's. With profile_directory set, every stage also runs under cProfile
+    and its statistics are written to <stage>-<pid>.pstats in that folder once per process
+    (by report, or when the process exits).
+    """
+
+    def __init__(self, name="analysis", profile_directory=None):
+        self.name = name
+        self.profile_directory = profile_directory
+        self.started = datetime.now().isoformat(timespec="seconds")
+        self.start_time = time.perf_counter()
+        self.stages = {}
+
+    def record(self, name):
+        """Counters of a stage (created on first use)."""
+        if name not in self.stages:
+            self.stages[name] = dict.fromkeys(COUNTERS, 0)
+            self.stages[name]["peak_memory"] = None
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name, files=0, samples=0, events=0, nbytes=0):
+        """
+        Times a block as one call of a stage; yields the stage's counters so the block can add to them.
+
+        Parameters:
+        - name: Stage name (e.g. "load", "segment", "integrate", "summarize", "plot").
+        - files, samples, events, nbytes: Amounts handled by the block, if known up front.
+        """
+        counters = self.record(name)
+        profile = None
+        if self.profile_directory:
+            profile = stage_profile(self.profile_directory, name)
+            profile.enable()
+        started = time.perf_counter()
+        try:
+            yield counters
+        finally:
+            counters["seconds"] += time.perf_counter() - started
+            if profile is not None:
+                profile.disable()
+            counters["calls"] += 1
+            counters["files"] += files
+            counters["samples"] += samples
+            counters["events"] += events
+            counters["bytes"] += nbytes
+            peak = peak_memory_bytes()
+            if peak is not None:
+                counters["peak_memory"] = max(counters["peak_memory"] or 0, peak)
+
+    def merge(self, stages):
+        """Adds stage counters from another Instrumentation (or its .stages from a worker process)."""
+        stages = stages.stages if isinstance(stages, Instrumentation) else stages
+        for name, other in stages.items():
+            counters = self.record(name)
+            for counter in COUNTERS:
+                counters[counter] += other[counter]
+            if other["peak_memory"] is not None:
+                counters["peak_memory"] = max(counters["peak_memory"] or 0, other["peak_memory"])
+        return self
+
+    def rows(self):
+        """One dictionary per stage with the counters and the derived rates (LOG_COLUMNS)."""
+        rows = []
+        for name, counters in self.stages.items():
+            seconds = counters["seconds"]
+            rows.append({
+                "Run": self.name, "Started": self.started, "Stage": name, "Calls": counters["calls"],
+                "Seconds": seconds, "Files": counters["files"], "Samples": counters["samples"],
+                "Events": counters["events"], "Bytes": counters["bytes"], "Files/s": rate(counters["files"], seconds),
+                "Samples/s": rate(counters["samples"], seconds), "Events/s": rate(counters["events"], seconds),
+                "MB/s": rate(counters["bytes"] / 1024 ** 2, seconds),
+                "Peak Memory (MB)": None if counters["peak_memory"] is None else counters["peak_memory"] / 1024 ** 2,
+            })
+        return rows
+
+    def save(self, file_path):
+        """
+        Appends this run to a log: one row per stage for a .csv file, one JSON object per line otherwise.
+        """
+        if os.path.dirname(file_path):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        if file_path.lower().endswith(".csv"):
+            new = not os.path.exists(file_path) or os.path.getsize(file_path) == 0
+            with open(file_path, "a", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=LOG_COLUMNS)
+                if new:
+                    writer.writeheader()
+                writer.writerows(self.rows())
+        else:
+            with open(file_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"run": self.name, "started": self.started,
+                                    "wall_seconds": time.perf_counter() - self.start_time,
+                                    "stages": self.rows()}) + "\n")
+
+    def summary(self):
+        """One line: totals, wall time, time per stage and peak memory."""
+        files = max((counters["files"] for counters in self.stages.values()), default=0)
+        samples = max((counters["samples"] for counters in self.stages.values()), default=0)
+        events = max((counters["events"] for counters in self.stages.values()), default=0)
+        wall = time.perf_counter() - self.start_time
+        peaks = [counters["peak_memory"] for counters in self.stages.values() if counters["peak_memory"] is not None]
+        parts = ", ".join(f"{name} {counters['seconds']:.2f} s" for name, counters in self.stages.items())
+        line = (f"{self.name}: {files} files, {samples} samples, {events} events in {wall:.2f} s "
+                f"({files / wall if wall else 0:.1f} files/s; {parts})")
+        if peaks:
+            line += f", peak {max(peaks) / 1024 ** 2:.0f} MB"
+        return line
+
+
+def stage_profile(directory, name):
+    """
+    The cProfile.Profile of a stage in this process (created on first use). The first one created
+    in a process registers dump_profiles to run when the process exits, worker processes included.
+    """
+    pid = os.getpid()
+    if not any(key[0] == pid for key in _profiles):
+        Finalize(None, dump_profiles, exitpriority=0)
+    return _profiles.setdefault((pid, directory, name), cProfile.Profile())
+
+
+def dump_profiles():
+    """Writes every stage profiled in this process to <stage>-<pid>.pstats in its folder."""
+    pid = os.getpid()
+    for key in [key for key in _profiles if key[0] == pid]:
+        _, directory, name = key
+        os.makedirs(directory, exist_ok=True)
+        _profiles.pop(key).dump_stats(os.path.join(directory, f"{name}-{pid}.pstats"))
+
+
+def timed_call(function, file_path, profile_directory=None):
+    """
+    Runs function(file_path, instrumentation=...) with a fresh Instrumentation, in a worker process or this one.
+
+    Returns (result, stage counters); the parent adds the counters to its own with Instrumentation.merge.
+    Wrap it with functools.partial to pass it to file_executor.map_files.
+    """
+    instrumentation = Instrumentation(profile_directory=profile_directory)
+    return function(file_path, instrumentation=instrumentation), instrumentation.stages
+
+
+def timed_load(instrumentation, file_path, channel_names=CHANNEL_NAMES):
+    """load_capture timed as the "load" stage (files, bytes read and samples per channel counted)."""
+    with instrumentation.stage("load") as counters:
+        columns, header = load_capture(file_path, channel_names)
+        counters["files"] += 1
+        counters["bytes"] += os.path.getsize(file_path)
+        counters["samples"] += len(columns["Time (s)"])
+    return columns, header
+
+
+def timed_load_batch(instrumentation, directory, files=None, channel_names=CHANNEL_NAMES, threads=DEFAULT_THREADS):
+    """capture_batch.load_batch timed as the "load" stage (files, bytes read and valid samples per channel counted)."""
+    with instrumentation.stage("load") as counters:
+        samples, metadata = load_batch(directory, files, channel_names, threads=threads)
+        counters["files"] += len(metadata)
+        counters["bytes"] += sum(os.path.getsize(path) for path in metadata["Path"])
+        counters["samples"] += int(metadata["Samples"].sum())
+    return samples, metadata
+
+
+def profile_option():
+    """Folder given as --profile FOLDER on an analysis script's command line (None without it)."""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--profile", metavar="FOLDER")
+    return parser.parse_known_args()[0].profile
+
+
+def report(instrumentation, log_path=None):
+    """Appends a script's run to the timing log (TIMING_LOG in LOG_DIRECTORY by default) and prints its summary."""
+    log_path = log_path or os.path.join(LOG_DIRECTORY, TIMING_LOG)
+    instrumentation.save(log_path)
+    print(instrumentation.summary())
+    if instrumentation.profile_directory:
+        dump_profiles()
+        print(f"Profiles saved to: {instrumentation.profile_directory} (view with python -m pstats)")
@@ -0,0 +1,209 @@
+import argparse
+import csv
+import json
+import os
+import time
+
+import numpy as np
+
+# Column layout of the legacy per-event CSV files
+LEGACY_COLUMNS = ["Time (s)", "CH1 (V)", "CH2 (V)", "sMDT (V)"]
+
+# Most columns a run can hold (sizes the per-column scale fields of the index)
+MAX_COLUMNS = 8
+
+# One fixed-size index record per event, so record k sits at k * INDEX_DTYPE.itemsize
+INDEX_DTYPE = np.dtype([
+    ("offset", "<u8"),  # Byte offset of the event's samples in the data file
+    ("samples", "<u4"),  # Samples per column
+    ("timestamp", "<f8"),  # Capture time (s since the epoch)
+    ("hv", "<f8"),  # High-voltage setting (V), NaN if unknown
+    ("trigger_index", "<i8"),  # Sample that triggered the event, -1 if none
+    ("ymult", "<f8", (MAX_COLUMNS,)),  # Channel scales (WFMPRe:YMUlt/YOFf/YZEro), NaN if unknown
+    ("yoff", "<f8", (MAX_COLUMNS,)),
+    ("yzero", "<f8", (MAX_COLUMNS,)),
+])
+
+
+def container_paths(path):
+    """Paths of the data, index and description files of a run (path is the .run data file)."""
+    return path, path + ".idx", path + ".json"
+
+
+class RunWriter:
+    """
+    Appends event waveforms to a run container.
+
+    A run is three files: <name>.run holds the samples of every event back to back as raw binary
+    (one row per column), <name>.run.idx holds one fixed-size record per event (offset, length,
+    timestamp, HV, trigger index, channel scales) and <name>.run.json names the columns and the
+    sample type. Samples are written before their index record, so an interrupted write is simply
+    not part of the run; reopening a run cuts such leftovers and continues appending.
+    """
+
+    def __init__(self, path, columns=LEGACY_COLUMNS, dtype="float64"):
+        if len(columns) > MAX_COLUMNS:
+            raise ValueError(f"A run holds at most {MAX_COLUMNS} columns, got {len(columns)}.")
+        self.path = path
+        self.columns = list(columns)
+        self.dtype = np.dtype(dtype)
+        data_path, index_path, description_path = container_paths(path)
+
+        if os.path.exists(description_path):
+            with open(description_path, "r", encoding="utf-8") as f:
+                description = json.load(f)
+            if description["columns"] != self.columns or np.dtype(description["dtype"]) != self.dtype:
+                raise ValueError(f"{path} was written with columns {description['columns']} "
+                                 f"and type {description['dtype']}.")
+        else:
+            with open(description_path, "w", encoding="utf-8") as f:
+                json.dump({"columns": self.columns, "dtype": self.dtype.str}, f)
+
+        self.data = open(data_path, "ab")
+        self.index = open(index_path, "ab")
+        self.recover()
+
+    def recover(self):
+        """Drops a partial index record or unindexed samples left by an interrupted write."""
+        self.count = self.index.tell() // INDEX_DTYPE.itemsize
+        self.index.truncate(self.count * INDEX_DTYPE.itemsize)
+        end = 0
+        if self.count:
+            self.index.flush()
+            last = np.fromfile(self.index.name, dtype=INDEX_DTYPE, count=1,
+                               offset=(self.count - 1) * INDEX_DTYPE.itemsize)[0]
+            end = int(last["offset"]) + int(last["samples"]) * len(self.columns) * self.dtype.itemsize
+        self.data.truncate(end)
+        self.data.seek(end)
+
+    def append(self, data, timestamp=None, hv=np.nan, trigger_index=-1, scales=None):
+        """
+        Appends one event and returns its event number (starting at 0).
+
+        Parameters:
+        - data: One array per column, all the same length (in the order of the run's columns).
+        - timestamp: Capture time in seconds since the epoch (default: now).
+        - hv: High-voltage setting of the capture (V).
+        - trigger_index: Sample that triggered the event.
+        - scales: Optional list with one {"YMUlt", "YOFf", "YZEro"} dictionary (or None) per column.
+        """
+        samples = np.ascontiguousarray(np.vstack(data), dtype=self.dtype)
+        if samples.shape[0] != len(self.columns):
+            raise ValueError(f"Expected {len(self.columns)} columns, got {samples.shape[0]}.")
+
+        record = np.zeros(1, dtype=INDEX_DTYPE)
+        record["offset"] = self.data.tell()
+        record["samples"] = samples.shape[1]
+        record["timestamp"] = time.time() if timestamp is None else timestamp
+        record["hv"] = np.nan if hv is None else hv
+        record["trigger_index"] = trigger_index
+        for field, name in [("ymult", "YMUlt"), ("yoff", "YOFf"), ("yzero", "YZEro")]:
+            record[field] = np.nan
+            for column, scale in enumerate(scales or []):
+                if scale:
+                    record[field][0, column] = scale[name]
+
+        self.data.write(samples.tobytes())
+        self.data.flush()
+        self.index.write(record.tobytes())  # Written last: the event exists from here
+        self.index.flush()
+        self.count += 1
+        return self.count - 1
+
+    def __len__(self):
+        return self.count
+
+    def close(self):
+        self.data.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RunReader:
+    """Reads events from a run container; event k is fetched with two seeks, whatever the run size."""
+
+    def __init__(self, path):
+        self.path = path
+        data_path, index_path, description_path = container_paths(path)
+        with open(description_path, "r", encoding="utf-8") as f:
+            description = json.load(f)
+        self.columns = description["columns"]
+        self.dtype = np.dtype(description["dtype"])
+        self.data_path = data_path
+        self.index_path = index_path
+
+    def __len__(self):
+        return os.path.getsize(self.index_path) // INDEX_DTYPE.itemsize  # Events still being written are left out
+
+    def record(self, k):
+        """Index record of event k."""
+        if not 0 <= k < len(self):
+            raise IndexError(f"Event {k} is not in {self.path} ({len(self)} events).")
+        return np.fromfile(self.index_path, dtype=INDEX_DTYPE, count=1, offset=k * INDEX_DTYPE.itemsize)[0]
+
+    def metadata(self, k):
+        """Metadata of event k as a dictionary."""
+        record = self.record(k)
+        scales = []
+        for column in range(len(self.columns)):
+            if np.isnan(record["ymult"][column]):
+                scales.append(None)
+            else:
+                scales.append({"YMUlt": float(record["ymult"][column]), "YOFf": float(record["yoff"][column]),
+                               "YZEro": float(record["yzero"][column])})
+        return {"event": k, "samples": int(record["samples"]), "timestamp": float(record["timestamp"]),
+                "hv": float(record["hv"]), "trigger_index": int(record["trigger_index"]), "scales": scales}
+
+    def event(self, k):
+        """Returns event k as a dictionary mapping each column name to its array."""
+        record = self.record(k)
+        count = int(record["samples"]) * len(self.columns)
+        samples = np.fromfile(self.data_path, dtype=self.dtype, count=count, offset=int(record["offset"]))
+        samples = samples.reshape(len(self.columns), -1)
+        return {name: samples[row] for row, name in enumerate(self.columns)}
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self.event(k)
+
+
+def export_csv(path, output_directory, pattern="Event_{number:03d}.csv", events=None):
+    """
+    Writes events of a run in the legacy one-CSV-per-event layout.
+
+    Parameters:
+    - path: The run's .run file.
+    - output_directory: Folder for the CSV files.
+    - pattern: File name pattern; number is the event number starting at 1 (as the old scripts counted).
+    - events: Event numbers (starting at 0) to export (default: all).
+
+    Returns the list of files written.
+    """
+    reader = RunReader(path)
+    os.makedirs(output_directory, exist_ok=True)  # Ensure the directory exists
+    written = []
+    for k in range(len(reader)) if events is None else events:
+        event = reader.event(k)
+        event_filename = os.path.join(output_directory, pattern.format(number=k + 1))
+        with open(event_filename, "w", newline="") as event_file:
+            writer = csv.writer(event_file)
+            writer.writerow(reader.columns)
+            writer.writerows(zip(*[event[name].tolist() for name in reader.columns]))
+        written.append(event_filename)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the events of a run container as legacy CSV files.")
+    parser.add_argument("run", help="The run's .run file")
+    parser.add_argument("output", help="Folder for the CSV files")
+    parser.add_argument("--pattern", default="Event_{number:03d}.csv", help="File name pattern (number starts at 1)")
+    args = parser.parse_args()
+
+    files = export_csv(args.run, args.output, args.pattern)
+    print(f"{len(files)} events exported to {args.output}")
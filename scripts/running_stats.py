@@ -0,0 +1,154 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Delta degrees of freedom used for every standard deviation and SEM (sample statistics, as pandas' sem)
+SEM_DDOF = 1
+
+# Columns of a saved StatsTable
+STATE_COLUMNS = ["Voltage (V)", "Metric", "Count", "Mean", "M2", "Min", "Max"]
+
+
+class RunningStats:
+    """
+    Mergeable count / mean / sum of squared deviations (M2) / min / max of a stream of values.
+
+    Values are folded in one at a time or in batches (Welford's update, with Chan's formula for
+    batches), and partial accumulators from parallel workers or separate runs combine with merge(),
+    so summaries never need the values themselves. An empty accumulator reports NaN for its mean,
+    min and max.
+    """
+
+    def __init__(self, count=0, mean=np.nan, m2=0.0, minimum=np.nan, maximum=np.nan):
+        self.count = int(count)
+        self.mean = float(mean)
+        self.m2 = float(m2)
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+
+    def update(self, value):
+        """Adds one value."""
+        value = float(value)
+        if self.count == 0:
+            self.count, self.mean, self.m2, self.minimum, self.maximum = 1, value, 0.0, value, value
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+    def update_many(self, values):
+        """Adds a batch of values (NaNs are ignored)."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if len(values):
+            batch_mean = values.mean()
+            self.merge(RunningStats(len(values), batch_mean, np.sum((values - batch_mean) ** 2),
+                                    values.min(), values.max()))
+        return self
+
+    def merge(self, other):
+        """Folds another accumulator into this one (exactly as if its values had been added here)."""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.minimum, self.maximum = other.minimum, other.maximum
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def variance(self, ddof=SEM_DDOF):
+        return self.m2 / (self.count - ddof) if self.count > ddof else np.nan
+
+    def std(self, ddof=SEM_DDOF):
+        return np.sqrt(self.variance(ddof))
+
+    def sem(self, ddof=SEM_DDOF):
+        """Standard error of the mean, std(ddof) / sqrt(count)."""
+        return self.std(ddof) / np.sqrt(self.count) if self.count else np.nan
+
+    def __repr__(self):
+        return f"RunningStats(count={self.count}, mean={self.mean:.6g}, sem={self.sem():.3g})"
+
+
+class StatsTable:
+    """
+    RunningStats keyed by (voltage, metric).
+
+    Tables from parallel workers or separate runs merge exactly, and can be saved to and loaded
+    from a small CSV holding the accumulator state (not the values).
+    """
+
+    def __init__(self):
+        self.stats = {}
+
+    def get(self, voltage, metric):
+        key = (voltage, metric)
+        if key not in self.stats:
+            self.stats[key] = RunningStats()
+        return self.stats[key]
+
+    def update(self, voltage, metric, values):
+        """Adds one value or a batch of values for a voltage and metric."""
+        self.get(voltage, metric).update_many(values)
+        return self
+
+    def update_groups(self, voltages, metric, values):
+        """Adds values whose voltages are given element by element (e.g. two columns of a table)."""
+        voltages = np.asarray(voltages)
+        values = np.asarray(values, dtype=np.float64)
+        for voltage in np.unique(voltages):
+            self.update(voltage.item(), metric, values[voltages == voltage])
+        return self
+
+    def merge(self, other):
+        for (voltage, metric), stats in other.stats.items():
+            self.get(voltage, metric).merge(stats)
+        return self
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def summary(self, metric=None, ddof=SEM_DDOF):
+        """
+        Per-voltage statistics as a DataFrame sorted by metric and voltage.
+
+        Columns: Voltage (V), Metric, Count, Mean, Std, SEM, Min, Max (Std and SEM use ddof).
+        Entries without any values (e.g. a voltage where no events were detected) are left out.
+        """
+        rows = []
+        for (voltage, name), stats in self.stats.items():
+            if stats.count and (metric is None or name == metric):
+                rows.append([voltage, name, stats.count, stats.mean, stats.std(ddof), stats.sem(ddof),
+                             stats.minimum, stats.maximum])
+        summary = pd.DataFrame(rows, columns=["Voltage (V)", "Metric", "Count", "Mean", "Std", "SEM", "Min", "Max"])
+        return summary.sort_values(["Metric", "Voltage (V)"]).reset_index(drop=True)
+
+    def save(self, file_path):
+        """Writes the accumulator state to a CSV file."""
+        rows = [[voltage, metric, stats.count, stats.mean, stats.m2, stats.minimum, stats.maximum]
+                for (voltage, metric), stats in self.stats.items()]
+        pd.DataFrame(rows, columns=STATE_COLUMNS).to_csv(file_path, index=False)
+
+    @classmethod
+    def load(cls, file_path):
+        """Reads a table written by save() (an empty table if the file does not exist)."""
+        table = cls()
+        if os.path.exists(file_path):
+            for row in pd.read_csv(file_path).itertuples(index=False):
+                voltage = None if pd.isna(row[0]) else row[0]  # Metrics not split by voltage
+                table.stats[(voltage, row[1])] = RunningStats(*row[2:])
+        return table
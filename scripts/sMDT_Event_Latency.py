@@ -2,95 +2,97 @@ print("Script is running...")
 
 import pandas as pd
 import os
-import numpy as np
 import matplotlib.pyplot as plt
+from functools import partial
+from event_segmenter import pair_triggers
+from file_executor import map_files
+from running_stats import RunningStats
+from instrumentation import Instrumentation, profile_option, report, timed_call, timed_load
+from figure_renderer import show, pause
 
 # Define the directory path
 directory = os.path.join(os.path.dirname(os.getcwd()), "raw_data", "Experiment_1_Raw_Data")
 print(f"Processing files in: {directory}")
 print("Files in directory:", os.listdir(directory))
 
-# Function to compute event latency
-def process_sMDT_latency(file_path, threshold=2.2):
-    df = pd.read_csv(file_path, skiprows=17)  # Load CSV and skip initial rows
-    print(f"Processing file: {file_path}, Columns found: {df.columns.tolist()}")  # Debugging output
-
-    # Dynamically detect and rename columns
-    expected_columns = ["D", "E", "K", "Q"]  # Time, CH1, CH2, sMDT
-    available_columns = df.columns.tolist()
-
-    # Check if expected columns exist
-    if len(available_columns) >= max([ord(c) - ord('A') for c in expected_columns]) + 1:
-        df = df.iloc[:, [ord(c) - ord('A') for c in expected_columns]]
-        df.columns = ["Time (s)", "CH1 (V)", "CH2 (V)", "sMDT (V)"]
-    else:
-        print(f"Skipping {file_path}: Required columns not found.")
+# Parallel execution settings (results are merged in sorted filename order, identical to a serial run)
+workers = 1  # Worker processes used to analyse files (set to os.cpu_count() to use every core)
+chunksize = 1  # Files handed to a worker at a time
+
+# Function to compute event latency (load and pair are timed separately)
+def process_sMDT_latency(file_path, threshold=2.2, instrumentation=None):
+    instrumentation = Instrumentation() if instrumentation is None else instrumentation
+    # Load the capture (Time, CH1, CH2, sMDT)
+    try:
+        columns, header = timed_load(instrumentation, file_path)
+    except ValueError as e:
+        print(f"Skipping {file_path}: {e}")
         return []
+    print(f"Processing file: {file_path}, Sources found: {[header[name]['Source'] for name in header]}")  # Debugging output
 
-    df.dropna(inplace=True)  # Remove any NaN values
-    df = df.apply(pd.to_numeric)  # Convert to numeric
+    # Find time difference between scintillator event and sMDT response:
+    # both scintillators above threshold arm the search, the first negative sMDT sample answers it
+    with instrumentation.stage("pair", samples=len(columns["Time (s)"])) as counters:
+        scintillator_triggered = (columns["CH1 (V)"] > threshold) & (columns["CH2 (V)"] > threshold)
+        scintillator_indices, sMDT_indices = pair_triggers(scintillator_triggered, columns["sMDT (V)"] < 0)
 
-    # Find time difference between scintillator event and sMDT response
-    event_latencies = []
-    scintillator_triggered = False
-    scintillator_time = None
-
-    for i in range(len(df)):
-        if df["CH1 (V)"].iloc[i] > threshold and df["CH2 (V)"].iloc[i] > threshold:
-            if not scintillator_triggered:
-                scintillator_triggered = True
-                scintillator_time = df["Time (s)"].iloc[i]
-
-        if scintillator_triggered and df["sMDT (V)"].iloc[i] < 0:  # First negative sMDT signal
-            sMDT_time = df["Time (s)"].iloc[i]
-            latency = sMDT_time - scintillator_time
-            event_latencies.append(latency)
-            scintillator_triggered = False  # Reset for next event
-
-    return event_latencies
+        event_latencies = columns["Time (s)"][sMDT_indices] - columns["Time (s)"][scintillator_indices]
+        counters["events"] += len(event_latencies)
+    return event_latencies.tolist()
 
 # Process all CSV files in a directory
-def process_all_files(directory):
+def process_all_files(directory, workers=1, chunksize=1, instrumentation=None):
+    instrumentation = Instrumentation("sMDT_Event_Latency") if instrumentation is None else instrumentation
     all_latencies = []
+    latency_stats = RunningStats()
 
-    for file in os.listdir(directory):
-        if file.endswith(".csv"):  # Only process CSV files
-            file_path = os.path.join(directory, file)
-            latencies = process_sMDT_latency(file_path)
-            all_latencies.extend(latencies)
+    # Worker timings are merged here
+    analyze = partial(timed_call, process_sMDT_latency, profile_directory=instrumentation.profile_directory)
+    for file, (latencies, stages) in map_files(analyze, directory, workers=workers, chunksize=chunksize):
+        instrumentation.merge(stages)
+        all_latencies.extend(latencies)
+        latency_stats.update_many(latencies)
 
     if not all_latencies:
         print("No valid event latency data found. Exiting...")
         return
 
     # Convert to DataFrame and save to CSV
-    df_latencies = pd.DataFrame({"Muon Event Latency (s)": all_latencies})
-    output_file = os.path.join(directory, "sMDT_Event_Latency_Summary.csv")
-    df_latencies.to_csv(output_file, index=False)
-    print(f"\nEvent latency summary saved to: {output_file}")
+    with instrumentation.stage("summarize", events=len(all_latencies)):
+        df_latencies = pd.DataFrame({"Muon Event Latency (s)": all_latencies})
+        output_file = os.path.join(directory, "sMDT_Event_Latency_Summary.csv")
+        df_latencies.to_csv(output_file, index=False)
+        print(f"\nEvent latency summary saved to: {output_file}")
 
     # Compute statistics
-    mean_latency = np.mean(all_latencies)
-    sem_latency = np.std(all_latencies) / np.sqrt(len(all_latencies))
+    mean_latency = latency_stats.mean
+    sem_latency = latency_stats.sem()
 
     # Plot histogram
-    plt.figure(figsize=(10, 5))
-    plt.hist(all_latencies, bins=30, color='blue', alpha=0.7, edgecolor='black', label='Muon Event Latencies')
+    with instrumentation.stage("plot", files=1):
+        plt.figure(figsize=(10, 5))
+        plt.hist(all_latencies, bins=30, color='blue', alpha=0.7, edgecolor='black', label='Muon Event Latencies')
+
+        # Add average line
+        plt.axvline(mean_latency, color='red', linestyle='dashed', label=f'Mean: {mean_latency:.2e} s')
 
-    # Add average line
-    plt.axvline(mean_latency, color='red', linestyle='dashed', label=f'Mean: {mean_latency:.2e} s')
+        # Add error bars
+        plt.fill_betweenx([0, plt.ylim()[1]], mean_latency - sem_latency, mean_latency + sem_latency, color='red', alpha=0.2, label=f'SEM: ±{sem_latency:.2e} s')
 
-    # Add error bars
-    plt.fill_betweenx([0, plt.ylim()[1]], mean_latency - sem_latency, mean_latency + sem_latency, color='red', alpha=0.2, label=f'SEM: ±{sem_latency:.2e} s')
+        plt.xlabel("Muon Event Latency (s)")
+        plt.ylabel("Frequency")
+        plt.title("Histogram of Muon Event Latencies")
+        plt.legend()
+        plt.grid(True)
 
-    plt.xlabel("Muon Event Latency (s)")
-    plt.ylabel("Frequency")
-    plt.title("Histogram of Muon Event Latencies")
-    plt.legend()
-    plt.grid(True)
-    plt.show()
+    # Timing of this run (before the window opens): one line here, one row per stage in the timing log
+    report(instrumentation)
+    show()
 
-# Run the function
-process_all_files(directory)
+# Run the function (guarded so worker processes can import this script)
+if __name__ == "__main__":
+    # --profile FOLDER runs every stage under cProfile
+    instrumentation = Instrumentation("sMDT_Event_Latency", profile_directory=profile_option())
+    process_all_files(directory, workers=workers, chunksize=chunksize, instrumentation=instrumentation)
 
-input("Press Enter to exit...")
+    pause()
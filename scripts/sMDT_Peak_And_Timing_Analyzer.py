@@ -4,134 +4,136 @@ import pandas as pd
 import os
 import numpy as np
 import matplotlib.pyplot as plt
-import re
+from capture_loader import extract_voltage
+from baseline import BASELINE_METHOD, detect_events
+from capture_batch import DEFAULT_THREADS, batch_time, estimate_batch_baseline
+from event_metrics import segment_peaks, segment_time_to_peak
+from file_executor import list_capture_files
+from running_stats import StatsTable
+from instrumentation import Instrumentation, profile_option, report, timed_load_batch
+from figure_renderer import show, pause
 
 directory = r"C:\Users\colin\OneDrive\Desktop\Voltage Optimization Data"
 print(f"Processing files in: {directory}")
 print("Files in directory:", os.listdir(directory))
 
-def extract_voltage(filename):
-    match = re.search(r"(\d+)\s*V", filename)
-    return int(match.group(1)) if match else None
-
-def analyze_peak_and_timing(file_path):
-    df = pd.read_csv(file_path, skiprows=17)
-    try:
-        df = df.iloc[:, [3, 4]]  # Columns D and E
-        df.columns = ["Time (s)", "sMDT (V)"]
-    except IndexError:
-        print(f"Skipping {file_path}: Columns D and E not found.")
-        return [], []
-
-    df.dropna(inplace=True)
-    df = df.apply(pd.to_numeric)
-
-    baseline = df["sMDT (V)"].iloc[:200].mean()
-
-    peak_voltages = []
-    times_to_peak = []
-
-    below_baseline = False
-    start_index = None
-
-    for i in range(len(df)):
-        voltage = df["sMDT (V)"].iloc[i]
-        if voltage < baseline:
-            if not below_baseline:
-                below_baseline = True
-                start_index = i
-        else:
-            if below_baseline:
-                below_baseline = False
-                if start_index is not None:
-                    event_df = df.iloc[start_index:i].copy()
-                    event_df["Relative V"] = event_df["sMDT (V)"] - baseline
-
-                    peak_idx = event_df["Relative V"].idxmin()
-                    peak_voltage = event_df["Relative V"].loc[peak_idx]
-                    time_to_peak = event_df["Time (s)"].loc[peak_idx] - event_df["Time (s)"].iloc[0]
-
-                    peak_voltages.append(abs(peak_voltage))
-                    times_to_peak.append(time_to_peak)
+# Threads reading captures at once (every capture is loaded into one array, so the baselines are estimated together)
+threads = DEFAULT_THREADS
 
-    return peak_voltages, times_to_peak
+def analyze_peak_and_timing(time, smdt, baseline, noise, instrumentation=None):
+    instrumentation = Instrumentation() if instrumentation is None else instrumentation
 
-def process_all_files(directory):
-    voltage_peaks = {}
-    voltage_times = {}
+    with instrumentation.stage("segment", samples=len(smdt)) as counters:
+        starts, stops = detect_events(smdt, baseline, noise, polarity="<")  # Dips well below the noise
+        counters["events"] += len(starts)
 
-    for file in os.listdir(directory):
-        if file.endswith(".csv"):
-            voltage = extract_voltage(file)
-            if voltage is None:
-                print(f"Skipping {file}: No voltage found in filename.")
-                continue
+    # Most negative sample of each dip relative to the baseline, and the time it takes to get there
+    with instrumentation.stage("measure", events=len(starts)):
+        peak_voltages = np.abs(segment_peaks(smdt, starts, stops, polarity="<", baseline=baseline)).tolist()
+        times_to_peak = segment_time_to_peak(time, smdt, starts, stops, polarity="<").tolist()
 
-            file_path = os.path.join(directory, file)
-            peaks, times = analyze_peak_and_timing(file_path)
-
-            if voltage not in voltage_peaks:
-                voltage_peaks[voltage] = []
-                voltage_times[voltage] = []
+    return peak_voltages, times_to_peak
 
-            voltage_peaks[voltage].extend(peaks)
-            voltage_times[voltage].extend(times)
+def process_all_files(directory, threads=DEFAULT_THREADS, instrumentation=None):
+    instrumentation = Instrumentation("sMDT_Peak_And_Timing_Analyzer") if instrumentation is None else instrumentation
+    voltage_peaks = {}
+    voltage_times = {}
+    stats = StatsTable()  # Per-voltage mean/SEM, updated file by file
+
+    files = []
+    for file in list_capture_files(directory):
+        if extract_voltage(file) is None:
+            print(f"Skipping {file}: No voltage found in filename.")
+            continue
+        files.append(file)
+
+    # Load every capture into one (files x samples) array; these captures carry the sMDT signal in the
+    # first channel block (CSV columns D and E)
+    samples, metadata = timed_load_batch(instrumentation, directory, files, channel_names=["sMDT (V)"], threads=threads)
+    time = batch_time(metadata, samples.shape[2])
+
+    # Local baseline and noise of every capture at once, from its pre-trigger samples (see baseline.py for the methods)
+    with instrumentation.stage("baseline", files=len(metadata), samples=int(metadata["Samples"].sum())):
+        baselines, noise = estimate_batch_baseline(samples, metadata, "sMDT (V)", ["sMDT (V)"], method=BASELINE_METHOD)
+
+    for row, file in enumerate(metadata["File"]):
+        count = metadata["Samples"].iat[row]  # Shorter records are NaN-padded in the batch
+        peaks, times = analyze_peak_and_timing(time[row, :count], samples[row, 0, :count], baselines[row], noise[row],
+                                               instrumentation)
+        voltage = extract_voltage(file)
+
+        if voltage not in voltage_peaks:
+            voltage_peaks[voltage] = []
+            voltage_times[voltage] = []
+
+        voltage_peaks[voltage].extend(peaks)
+        voltage_times[voltage].extend(times)
+        stats.update(voltage, "Peak Voltage (V)", peaks)
+        stats.update(voltage, "Time to Peak (s)", times)
 
     if not voltage_peaks:
         print("No valid data found.")
         return
 
-    rows = []
-    for voltage in voltage_peaks:
-        for peak, time in zip(voltage_peaks[voltage], voltage_times[voltage]):
-            rows.append({"Voltage (V)": voltage, "Peak Voltage (V)": peak, "Time to Peak (s)": time})
-
-    df = pd.DataFrame(rows)
-    df.to_csv(os.path.join(directory, "sMDT_Peak_And_Timing_By_Voltage.csv"), index=False)
-    print("Saved peak/timing data to CSV.")
-
-    summary = df.groupby("Voltage (V)").agg({
-        "Peak Voltage (V)": ["mean", "sem"],
-        "Time to Peak (s)": ["mean", "sem"]
+    with instrumentation.stage("summarize", events=sum(len(peaks) for peaks in voltage_peaks.values())):
+        rows = []
+        for voltage in voltage_peaks:
+            for peak, time in zip(voltage_peaks[voltage], voltage_times[voltage]):
+                rows.append({"Voltage (V)": voltage, "Peak Voltage (V)": peak, "Time to Peak (s)": time})
+
+        df = pd.DataFrame(rows)
+        df.to_csv(os.path.join(directory, "sMDT_Peak_And_Timing_By_Voltage.csv"), index=False)
+        print("Saved peak/timing data to CSV.")
+
+    peak_summary = stats.summary("Peak Voltage (V)")
+    time_summary = stats.summary("Time to Peak (s)")
+    summary = pd.DataFrame({
+        "Voltage (V)": peak_summary["Voltage (V)"],
+        "Peak Mean": peak_summary["Mean"], "Peak SEM": peak_summary["SEM"],
+        "Time Mean": time_summary["Mean"], "Time SEM": time_summary["SEM"]
     })
-    summary.columns = ["Peak Mean", "Peak SEM", "Time Mean", "Time SEM"]
-    summary.reset_index(inplace=True)
-
-    # Plot: Peak Voltage
-    average_peak_sem = summary["Peak SEM"].mean()
-
-    plt.figure(figsize=(10, 5))
-    plt.bar(summary["Voltage (V)"], summary["Peak Mean"], yerr=summary["Peak SEM"],
-            capsize=5, alpha=0.7, edgecolor='black', width=100,
-            label=f"Mean ± SEM (avg SEM: ±{average_peak_sem:.2e} V)")
-
-    plt.title("Mean Peak Voltage by Tube Voltage")
-    plt.xlabel("Voltage (V)")
-    plt.ylabel("Peak Voltage Magnitude (V)")
-    plt.legend()
-    plt.grid(True)
-    plt.tight_layout()
-    plt.savefig(os.path.join(directory, "sMDT_Peak_Voltage_vs_Voltage.png"), dpi=300)
-    plt.show()
-
-    # Plot: Time to Peak
-    average_time_sem = summary["Time SEM"].mean()
-
-    plt.figure(figsize=(10, 5))
-    plt.bar(summary["Voltage (V)"], summary["Time Mean"], yerr=summary["Time SEM"],
-            capsize=5, alpha=0.7, edgecolor='black', width=100,
-            label=f"Mean ± SEM (avg SEM: ±{average_time_sem:.2e} s)")
-
-    plt.title("Mean Time to Peak by Tube Voltage")
-    plt.xlabel("Voltage (V)")
-    plt.ylabel("Time to Peak (s)")
-    plt.legend()
-    plt.grid(True)
-    plt.tight_layout()
-    plt.savefig(os.path.join(directory, "sMDT_Time_to_Peak_vs_Voltage.png"), dpi=300)
-    plt.show()
-
-# Run the script
-process_all_files(directory)
-
-input("Press Enter to exit...")
+
+    with instrumentation.stage("plot", files=2):
+        # Plot: Peak Voltage
+        average_peak_sem = summary["Peak SEM"].mean()
+
+        plt.figure(figsize=(10, 5))
+        plt.bar(summary["Voltage (V)"], summary["Peak Mean"], yerr=summary["Peak SEM"],
+                capsize=5, alpha=0.7, edgecolor='black', width=100,
+                label=f"Mean ± SEM (avg SEM: ±{average_peak_sem:.2e} V)")
+
+        plt.title("Mean Peak Voltage by Tube Voltage")
+        plt.xlabel("Voltage (V)")
+        plt.ylabel("Peak Voltage Magnitude (V)")
+        plt.legend()
+        plt.grid(True)
+        plt.tight_layout()
+        plt.savefig(os.path.join(directory, "sMDT_Peak_Voltage_vs_Voltage.png"), dpi=300)
+
+        # Plot: Time to Peak
+        average_time_sem = summary["Time SEM"].mean()
+
+        plt.figure(figsize=(10, 5))
+        plt.bar(summary["Voltage (V)"], summary["Time Mean"], yerr=summary["Time SEM"],
+                capsize=5, alpha=0.7, edgecolor='black', width=100,
+                label=f"Mean ± SEM (avg SEM: ±{average_time_sem:.2e} s)")
+
+        plt.title("Mean Time to Peak by Tube Voltage")
+        plt.xlabel("Voltage (V)")
+        plt.ylabel("Time to Peak (s)")
+        plt.legend()
+        plt.grid(True)
+        plt.tight_layout()
+        plt.savefig(os.path.join(directory, "sMDT_Time_to_Peak_vs_Voltage.png"), dpi=300)
+
+    # Timing of this run (before the windows open): one line here, one row per stage in the timing log
+    report(instrumentation)
+    show()
+
+# Run the script (guarded so worker processes can import this script)
+if __name__ == "__main__":
+    # --profile FOLDER runs every stage under cProfile
+    instrumentation = Instrumentation("sMDT_Peak_And_Timing_Analyzer", profile_directory=profile_option())
+    process_all_files(directory, threads=threads, instrumentation=instrumentation)
+
+    pause()
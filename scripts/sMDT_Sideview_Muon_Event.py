@@ -1,105 +1,215 @@
+import argparse
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
+import matplotlib
 import matplotlib.image as mpimg
 
-# Set up figure
-fig, ax = plt.subplots(figsize=(6, 6))
-ax.set_facecolor('black')
-ax.set_xlim(-1.5, 1.5)
-ax.set_ylim(-1.5, 1.5)
-ax.set_aspect('equal')
-ax.axis('off')
-
-# Load overlay image
-overlay_img = mpimg.imread('C:/Users/colin/Downloads/Circle & Dot.png')
-overlay_artist = ax.imshow(overlay_img, extent=[-1.125, 1.125, -1.125, 1.125], zorder=5)
+# Overlay image (tube wall and wire); without it the tube and wire are drawn as circles
+overlay_path = 'C:/Users/colin/Downloads/Circle & Dot.png'
 
 # Tube parameters
 tube_radius = 1.0
 wire_radius = 0.03
+wall_margin = 0.05  # Molecules bounce this far inside the wall
 
 # ArCO2 molecules
 num_molecules = 150
-r = np.sqrt(np.random.uniform(0, (tube_radius - 0.15)**2, num_molecules))
-theta = np.random.uniform(0, 2*np.pi, num_molecules)
-molecule_positions = np.vstack((r * np.cos(theta), r * np.sin(theta))).T
-molecule_velocities = np.random.uniform(-0.02, 0.02, (num_molecules, 2))
+molecule_speed = 0.02  # Largest velocity component per frame
+molecule_size = 10  # Marker area (points²); shrink it for very large molecule counts
 
-# Muon parameters
+# Muon parameters: the track runs from muon_start to muon_end between frames muon_frames[0] and muon_frames[1]
 muon_start = np.array([-0.5, 1.5])
 muon_end = np.array([-1.0, -1.5])
-
-# Electrons
-electrons = []
-electron_sources = []
-
-# Artists
-molecule_scat = ax.scatter([], [], color='gray', s=10)
-muon_arrow = ax.annotate('', xy=(0,0), xytext=(0,0), arrowprops=dict(arrowstyle='->', color='lime', lw=2))
-electron_scat = ax.scatter([], [], color='deepskyblue', s=10)
-
-# Legend
-legend_elements = [
-    plt.Line2D([0], [0], marker='o', color='w', label='ArCO₂ Molecule', markersize=8, markerfacecolor='gray'),
-    plt.Line2D([0], [0], marker='o', color='none', label='Electron', markersize=8, markerfacecolor='deepskyblue', markeredgewidth=0, markeredgecolor='none'),
-    plt.Line2D([0], [0], color='lime', lw=2, label='Muon'),
-    plt.Line2D([0], [0], marker='o', color='white', label='Wire', markersize=8, markerfacecolor='white')
-]
-ax.legend(handles=legend_elements, loc='upper right', bbox_to_anchor=(1.35, 1.15), frameon=False, fontsize=10, labelcolor='white')
-
-def init():
-    molecule_scat.set_offsets(molecule_positions)
-    muon_arrow.set_position((0, 0))
-    muon_arrow.xy = (0, 0)
-    electron_scat.set_offsets(np.empty((0, 2)))
-    return molecule_scat, muon_arrow, electron_scat, overlay_artist
-
-def update(frame):
-    global molecule_positions, electrons, electron_sources
-
-    # Update molecule positions
-    molecule_positions += molecule_velocities
-    for i, pos in enumerate(molecule_positions):
-        if np.linalg.norm(pos) >= (tube_radius - 0.05):
-            molecule_velocities[i] = -molecule_velocities[i]
-    molecule_scat.set_offsets(molecule_positions)
+muon_frames = (20, 30)
+collision_radius = 0.1  # Molecules this close to the muon are ionized
+
+# Electrons drift towards the wire at this speed per frame
+electron_speed = 0.02
+
+# Animation settings
+frames = 70
+fps = 20
+output_path = 'muon_event.gif'  # .gif (Pillow) or .mp4 (ffmpeg)
+workers = 1  # Processes rendering frames (each renders a contiguous block)
+chunk_frames = 10  # Frames per block
+
+
+def initial_state(num_molecules=num_molecules, seed=None):
+    """Gas molecules spread uniformly over the tube's cross-section, with random velocities and no electrons."""
+    rng = np.random.default_rng(seed)
+    r = np.sqrt(rng.uniform(0, (tube_radius - 0.15)**2, num_molecules))
+    theta = rng.uniform(0, 2*np.pi, num_molecules)
+    return {
+        "positions": np.column_stack((r * np.cos(theta), r * np.sin(theta))),
+        "velocities": rng.uniform(-molecule_speed, molecule_speed, (num_molecules, 2)),
+        "ionized": np.zeros(num_molecules, dtype=bool),  # Molecules that already gave up an electron
+        "electrons": np.empty((0, 2)),
+        "muon": None,  # Current muon position (None before the muon arrives)
+    }
+
+
+def step(state, frame, track=(muon_start, muon_end)):
+    """Advances the state by one frame (all molecules and electrons at once)."""
+    positions, velocities = state["positions"], state["velocities"]
+
+    # Update molecule positions; molecules at the wall reverse their velocity
+    positions += velocities
+    at_wall = np.einsum('ij,ij->i', positions, positions) >= (tube_radius - wall_margin)**2
+    velocities[at_wall] *= -1
 
     # Muon appears
-    if 20 <= frame <= 30:
-        t = (frame - 20) / 10
-        current_pos = (1 - t) * muon_start + t * muon_end
-        muon_arrow.set_position((muon_start[0], muon_start[1]))
-        muon_arrow.xy = (current_pos[0], current_pos[1])
-
-        # Check for molecule collisions
-        new_electrons = []
-        for i, pos in enumerate(molecule_positions):
-            if i not in electron_sources:
-                dist = np.linalg.norm(pos - current_pos)
-                if dist < 0.1:
-                    new_electrons.append(pos.copy())
-                    electron_sources.append(i)
-        if new_electrons:
-            if len(electrons) == 0:
-                electrons = np.array(new_electrons)
-            else:
-                electrons = np.vstack((electrons, new_electrons))
+    if muon_frames[0] <= frame <= muon_frames[1]:
+        t = (frame - muon_frames[0]) / (muon_frames[1] - muon_frames[0])
+        state["muon"] = (1 - t) * np.asarray(track[0]) + t * np.asarray(track[1])
+
+        # Molecules near the muon that are not yet ionized release an electron
+        offsets = positions - state["muon"]
+        hit = (np.einsum('ij,ij->i', offsets, offsets) < collision_radius**2) & ~state["ionized"]
+        if hit.any():
+            state["ionized"] |= hit
+            state["electrons"] = np.vstack((state["electrons"], positions[hit]))
 
     # Move electrons toward center
+    electrons = state["electrons"]
     if len(electrons) > 0:
-        electrons = np.array(electrons)
-        directions = -electrons
-        directions /= np.linalg.norm(directions, axis=1)[:, np.newaxis]
-        electrons += directions * 0.02
-        electron_scat.set_offsets(electrons)
-
-    return molecule_scat, muon_arrow, electron_scat, overlay_artist
-
-# Animate
-ani = animation.FuncAnimation(fig, update, frames=70, init_func=init, blit=True, interval=50)
-
-# Save
-ani.save('muon_event.gif', writer='pillow', fps=20)
-
-plt.show()
+        distance = np.sqrt(np.einsum('ij,ij->i', electrons, electrons))
+        electrons -= electrons / np.maximum(distance, 1e-12)[:, np.newaxis] * electron_speed
+
+
+def make_figure():
+    """Figure and the artists that change between frames."""
+    matplotlib.use('Agg')  # Frames are rendered off-screen, possibly in worker processes
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(6, 6))
+    ax.set_facecolor('black')
+    ax.set_xlim(-1.5, 1.5)
+    ax.set_ylim(-1.5, 1.5)
+    ax.set_aspect('equal')
+    ax.axis('off')
+
+    # Load overlay image
+    if os.path.exists(overlay_path):
+        ax.imshow(mpimg.imread(overlay_path), extent=[-1.125, 1.125, -1.125, 1.125], zorder=5)
+    else:
+        ax.add_patch(plt.Circle((0, 0), tube_radius, facecolor='black', edgecolor='white', lw=2, zorder=0))
+        ax.add_patch(plt.Circle((0, 0), wire_radius, color='white', zorder=5))
+
+    # Artists (plain markers draw much faster than a scatter for 10⁴–10⁵ points)
+    marker_size = np.sqrt(molecule_size)
+    molecules, = ax.plot([], [], 'o', color='gray', markersize=marker_size, markeredgewidth=0, linestyle='none')
+    electrons, = ax.plot([], [], 'o', color='deepskyblue', markersize=marker_size, markeredgewidth=0, linestyle='none')
+    muon_arrow = ax.annotate('', xy=(0, 0), xytext=(0, 0), arrowprops=dict(arrowstyle='->', color='lime', lw=2))
+    muon_arrow.set_visible(False)
+
+    # Legend
+    legend_elements = [
+        plt.Line2D([0], [0], marker='o', color='w', label='ArCO₂ Molecule', markersize=8, markerfacecolor='gray'),
+        plt.Line2D([0], [0], marker='o', color='none', label='Electron', markersize=8, markerfacecolor='deepskyblue', markeredgewidth=0, markeredgecolor='none'),
+        plt.Line2D([0], [0], color='lime', lw=2, label='Muon'),
+        plt.Line2D([0], [0], marker='o', color='white', label='Wire', markersize=8, markerfacecolor='white')
+    ]
+    ax.legend(handles=legend_elements, loc='upper right', bbox_to_anchor=(1.35, 1.15), frameon=False, fontsize=10, labelcolor='white')
+    return fig, {"molecules": molecules, "electrons": electrons, "muon": muon_arrow}
+
+
+def draw_frame(fig, artists, state, track):
+    """Renders the state and returns the frame as an RGB array."""
+    artists["molecules"].set_data(state["positions"][:, 0], state["positions"][:, 1])
+    artists["electrons"].set_data(state["electrons"][:, 0], state["electrons"][:, 1])
+    if state["muon"] is not None:
+        artists["muon"].set_position((track[0][0], track[0][1]))
+        artists["muon"].xy = (state["muon"][0], state["muon"][1])
+        artists["muon"].set_visible(True)
+    fig.canvas.draw()
+    return np.asarray(fig.canvas.buffer_rgba())[:, :, :3].copy()
+
+
+def frame_images(first, last, num_molecules, seed, track):
+    """
+    Yields frames first..last-1. The simulation is re-run from frame 0 with the same seed, which
+    costs far less than drawing, so every worker can start at any frame without shared state.
+    """
+    import matplotlib.pyplot as plt
+
+    state = initial_state(num_molecules, seed)
+    for frame in range(first):
+        step(state, frame, track)
+    fig, artists = make_figure()
+    try:
+        for frame in range(first, last):
+            step(state, frame, track)
+            yield draw_frame(fig, artists, state, track)
+    finally:
+        plt.close(fig)
+
+
+def render_frames(first, last, num_molecules, seed, track):
+    """Block of frames rendered in a worker process."""
+    return list(frame_images(first, last, num_molecules, seed, track))
+
+
+def animation_frames(num_molecules=num_molecules, frames=frames, seed=None, track=(muon_start, muon_end),
+                     workers=workers, chunk_frames=chunk_frames):
+    """
+    Yields the rendered frames in order; with workers > 1 blocks of chunk_frames are rendered in parallel.
+    Without a seed, a fresh one is drawn here and shared by every block, so they all run the same simulation.
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    blocks = [(first, min(first + chunk_frames, frames)) for first in range(0, frames, chunk_frames)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(render_frames, *zip(*[(first, last, num_molecules, seed, track) for first, last in blocks]))
+            for images in results:
+                yield from images
+    else:
+        yield from frame_images(0, frames, num_molecules, seed, track)
+
+
+def save_animation(images, path, fps=fps):
+    """
+    Writes frames to a GIF (Pillow) or, for any other extension, a video encoded by ffmpeg. Frames
+    are consumed as they arrive: ffmpeg reads them from a pipe, Pillow quantizes each one on arrival.
+    """
+    images = iter(images)
+    first = next(images)
+    height, width, _ = first.shape
+    if path.lower().endswith('.gif'):
+        from PIL import Image
+        frames = (Image.fromarray(image).quantize(colors=64) for image in images)
+        Image.fromarray(first).quantize(colors=64).save(path, save_all=True, append_images=frames,
+                                                        duration=round(1000 / fps), loop=0)
+        return
+    ffmpeg = shutil.which(matplotlib.rcParams['animation.ffmpeg_path']) or shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError(f"ffmpeg is needed to write {path}; install it or save a .gif")
+    command = [ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}',
+               '-r', str(fps), '-i', '-', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p', path]
+    with subprocess.Popen(command, stdin=subprocess.PIPE) as encoder:
+        encoder.stdin.write(first.tobytes())
+        for image in images:
+            encoder.stdin.write(image.tobytes())
+        encoder.stdin.close()
+    if encoder.returncode:
+        raise RuntimeError(f"ffmpeg failed with exit code {encoder.returncode}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the sMDT side view of a muon crossing the tube.")
+    parser.add_argument("--molecules", type=int, default=num_molecules, help="Number of gas molecules")
+    parser.add_argument("--frames", type=int, default=frames, help="Number of frames")
+    parser.add_argument("--track", type=float, nargs=4, metavar=("X0", "Y0", "X1", "Y1"),
+                        help="Muon track start and end (tube radius = 1)")
+    parser.add_argument("--workers", type=int, default=workers, help="Processes rendering frames")
+    parser.add_argument("--seed", type=int, help="Random seed (the same seed gives the same animation)")
+    parser.add_argument("--output", default=output_path, help="Output .gif or .mp4")
+    args = parser.parse_args()
+
+    track = (np.array(args.track[:2]), np.array(args.track[2:])) if args.track else (muon_start, muon_end)
+    save_animation(animation_frames(args.molecules, args.frames, args.seed, track, args.workers), args.output, fps)
+    print(f"Animation saved to: {args.output}")
@@ -4,96 +4,100 @@ import pandas as pd
 import os
 import numpy as np
 import matplotlib.pyplot as plt
+from baseline import BASELINE_METHOD, detect_events
+from capture_batch import DEFAULT_THREADS, batch_time, estimate_batch_baseline
+from capture_loader import CHANNEL_NAMES
+from event_metrics import segment_areas
+from running_stats import RunningStats
+from instrumentation import Instrumentation, profile_option, report, timed_load_batch
+from figure_renderer import show, pause
 
 # Define the directory path
 directory = os.path.join(os.path.dirname(os.getcwd()), "raw_data", "Experiment_1_Raw_Data")
 print(f"Processing files in: {directory}")
 print("Files in directory:", os.listdir(directory))
 
-# Function to compute signal area for sMDT events
-def process_sMDT_signal_area(file_path):
-    df = pd.read_csv(file_path, skiprows=17)  # Load CSV and skip initial rows
-    print(f"Processing file: {file_path}, Columns found: {df.columns.tolist()}")  # Debugging output
+# Threads reading captures at once (every capture is loaded into one array, so the baselines are estimated together)
+threads = DEFAULT_THREADS
 
-    # Dynamically detect and rename columns
-    expected_columns = ["D", "Q"]  # Time (s) and sMDT (V)
-    available_columns = df.columns.tolist()
+# Function to compute signal area for the sMDT events of one capture (segment and integrate are timed separately)
+def process_sMDT_signal_area(time, smdt, baseline, noise, instrumentation=None):
+    instrumentation = Instrumentation() if instrumentation is None else instrumentation
 
-    # Check if expected columns exist
-    if len(available_columns) >= max([ord(c) - ord('A') for c in expected_columns]) + 1:
-        df = df.iloc[:, [ord(c) - ord('A') for c in expected_columns]]
-        df.columns = ["Time (s)", "sMDT (V)"]
-    else:
-        print(f"Skipping {file_path}: Columns D and Q not found.")
-        return []
-
-    df.dropna(inplace=True)  # Remove any NaN values
-    df = df.apply(pd.to_numeric)  # Convert to numeric
+    with instrumentation.stage("segment", samples=len(smdt)) as counters:
+        # Dips more than NOISE_THRESHOLD noise RMS below the baseline, so noise dips around zero are not counted as events
+        starts, stops = detect_events(smdt, baseline, noise, polarity="<")  # Negative voltage events
+        counters["events"] += len(starts)
 
     # Compute signal area per event using Riemann sums
-    event_areas = []
-    above_threshold = False
-    start_index = None
-
-    for i in range(len(df)):
-        if df["sMDT (V)"].iloc[i] < 0:  # Detect negative voltage event
-            if not above_threshold:
-                above_threshold = True
-                start_index = i
-        else:
-            if above_threshold:  # End of an event
-                above_threshold = False
-                if start_index is not None:
-                    time_values = df["Time (s)"].iloc[start_index:i].values
-                    voltage_values = df["sMDT (V)"].iloc[start_index:i].values
-                    delta_t = np.diff(time_values)  # Time step differences
-                    area = np.sum(voltage_values[:-1] * delta_t)  # Riemann sum integration
-                    event_areas.append(abs(area))  # Use absolute value to standardize
+    with instrumentation.stage("integrate", events=len(starts)):
+        areas = segment_areas(time, smdt, starts, stops, rule="riemann", baseline=baseline)
+    event_areas = np.abs(areas).tolist()  # Use absolute value to standardize
 
     return event_areas
 
 # Process all CSV files in a directory
-def process_all_files(directory):
+def process_all_files(directory, threads=DEFAULT_THREADS, instrumentation=None):
+    instrumentation = Instrumentation("sMDT_Signal_Area") if instrumentation is None else instrumentation
     all_areas = []
+    area_stats = RunningStats()
+
+    # Load every capture into one (files x channels x samples) array; the sMDT channel is the third block (CSV column Q)
+    samples, metadata = timed_load_batch(instrumentation, directory, threads=threads)
+    time = batch_time(metadata, samples.shape[2])
+    smdt = samples[:, CHANNEL_NAMES.index("sMDT (V)")]
 
-    for file in os.listdir(directory):
-        if file.endswith(".csv"):  # Only process CSV files
-            file_path = os.path.join(directory, file)
-            areas = process_sMDT_signal_area(file_path)
-            all_areas.extend(areas)
+    # Baseline and noise of every capture at once, from its pre-trigger samples (see baseline.py for the methods)
+    with instrumentation.stage("baseline", files=len(metadata), samples=int(metadata["Samples"].sum())):
+        baselines, noise = estimate_batch_baseline(samples, metadata, "sMDT (V)", method=BASELINE_METHOD)
+
+    for row, file_path in enumerate(metadata["Path"]):
+        print(f"Processing file: {file_path}, sMDT source: {metadata['sMDT (V) Source'].iat[row]}")  # Debugging output
+        count = metadata["Samples"].iat[row]  # Shorter records are NaN-padded in the batch
+        areas = process_sMDT_signal_area(time[row, :count], smdt[row, :count], baselines[row], noise[row], instrumentation)
+        all_areas.extend(areas)
+        area_stats.update_many(areas)
 
     if not all_areas:
         print("No valid signal area data found. Exiting...")
         return
 
     # Convert to DataFrame and save to CSV
-    df_areas = pd.DataFrame({"sMDT Signal Area (V·s)": all_areas})
-    output_file = os.path.join(directory, "sMDT_Signal_Area_Summary.csv")
-    df_areas.to_csv(output_file, index=False)
-    print(f"\nSignal area summary saved to: {output_file}")
+    with instrumentation.stage("summarize", events=len(all_areas)):
+        df_areas = pd.DataFrame({"sMDT Signal Area (V·s)": all_areas})
+        output_file = os.path.join(directory, "sMDT_Signal_Area_Summary.csv")
+        df_areas.to_csv(output_file, index=False)
+        print(f"\nSignal area summary saved to: {output_file}")
 
     # Compute statistics
-    mean_area = np.mean(all_areas)
-    sem_area = np.std(all_areas) / np.sqrt(len(all_areas))
+    mean_area = area_stats.mean
+    sem_area = area_stats.sem()
 
     # Plot histogram
-    plt.figure(figsize=(10, 5))
-    plt.hist(all_areas, bins=30, color='blue', alpha=0.7, edgecolor='black', label='sMDT Signal Areas')
+    with instrumentation.stage("plot", files=1):
+        plt.figure(figsize=(10, 5))
+        plt.hist(all_areas, bins=30, color='blue', alpha=0.7, edgecolor='black', label='sMDT Signal Areas')
+
+        # Add average line
+        plt.axvline(mean_area, color='red', linestyle='dashed', label=f'Mean: {mean_area:.2e} V·s')
 
-    # Add average line
-    plt.axvline(mean_area, color='red', linestyle='dashed', label=f'Mean: {mean_area:.2e} V·s')
+        # Add error bars
+        plt.fill_betweenx([0, plt.ylim()[1]], mean_area - sem_area, mean_area + sem_area, color='red', alpha=0.2, label=f'SEM: ±{sem_area:.2e} V·s')
 
-    # Add error bars
-    plt.fill_betweenx([0, plt.ylim()[1]], mean_area - sem_area, mean_area + sem_area, color='red', alpha=0.2, label=f'SEM: ±{sem_area:.2e} V·s')
+        plt.xlabel("sMDT Signal Area (V·s)")
+        plt.ylabel("Frequency")
+        plt.title("Histogram of sMDT Signal Areas")
+        plt.legend()
+        plt.grid(True)
 
-    plt.xlabel("sMDT Signal Area (V·s)")
-    plt.ylabel("Frequency")
-    plt.title("Histogram of sMDT Signal Areas")
-    plt.legend()
-    plt.grid(True)
-    plt.show()
+    # Timing of this run (before the window opens): one line here, one row per stage in the timing log
+    report(instrumentation)
+    show()
 
-# Run the function
-process_all_files(directory)
+# Run the function (guarded so worker processes can import this script)
+if __name__ == "__main__":
+    # --profile FOLDER runs every stage under cProfile
+    instrumentation = Instrumentation("sMDT_Signal_Area", profile_directory=profile_option())
+    process_all_files(directory, threads=threads, instrumentation=instrumentation)
 
-input("Press Enter to exit...")
+    pause()
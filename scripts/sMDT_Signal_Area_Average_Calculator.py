@@ -4,130 +4,159 @@ import pandas as pd
 import os
 import numpy as np
 import matplotlib.pyplot as plt
-import re
+from capture_loader import extract_voltage
+from baseline import BASELINE_METHOD, batch_baseline, detect_events
+from capture_batch import DEFAULT_THREADS, batch_time, estimate_batch_baseline
+from event_metrics import segment_areas
+from file_executor import list_capture_files
+from event_archive import EventArchive
+from running_stats import StatsTable
+from instrumentation import Instrumentation, profile_option, report, timed_load_batch
+from figure_renderer import show, pause
 
 # Define your data directory
 directory = r"C:\Users\colin\OneDrive\Desktop\Voltage Optimization Data"
 print(f"Processing files in: {directory}")
 print("Files in directory:", os.listdir(directory))
 
-# Function to extract voltage from filename (e.g., "3200 V - Capture 1.csv")
-def extract_voltage(filename):
-    match = re.search(r"(\d+)\s*V", filename)
-    return int(match.group(1)) if match else None
-
-# Function to compute signal area for sMDT events in a single file
-def process_sMDT_signal_area(file_path):
-    df = pd.read_csv(file_path, skiprows=17)
-    available_columns = df.columns.tolist()
-
-    try:
-        df = df.iloc[:, [3, 4]]  # Columns D and E
-        df.columns = ["Time (s)", "sMDT (V)"]
-    except IndexError:
-        print(f"Skipping {file_path}: Columns D and E not found.")
-        return []
-
-    df.dropna(inplace=True)
-    df = df.apply(pd.to_numeric)
-
-    # Calculate local baseline using first 200 points
-    baseline = df["sMDT (V)"].iloc[:200].mean()
-
-    event_areas = []
-    below_baseline = False
-    start_index = None
-
-    for i in range(len(df)):
-        if df["sMDT (V)"].iloc[i] < baseline:
-            if not below_baseline:
-                below_baseline = True
-                start_index = i
-        else:
-            if below_baseline:
-                below_baseline = False
-                if start_index is not None:
-                    time_values = df["Time (s)"].iloc[start_index:i].values
-                    voltage_values = df["sMDT (V)"].iloc[start_index:i].values - baseline
-                    delta_t = np.diff(time_values)
-                    area = np.sum(voltage_values[:-1] * delta_t)
-                    event_areas.append(abs(area))
+# Threads reading captures at once (every capture is loaded into one array, so the baselines are estimated together)
+threads = DEFAULT_THREADS
+
+# Event archive of the same captures (built with: python event_archive.py <directory> <archive> --channels "sMDT (V)");
+# when set, events are read from its memory map by voltage instead of parsing every CSV
+archive_path = None
+
+# Function to compute signal area for the sMDT events of one capture (segment and integrate are timed separately)
+def signal_areas(time, smdt, baseline, noise, instrumentation=None):
+    instrumentation = Instrumentation() if instrumentation is None else instrumentation
+
+    with instrumentation.stage("segment", samples=len(smdt)) as counters:
+        starts, stops = detect_events(smdt, baseline, noise, polarity="<")  # Dips well below the noise
+        counters["events"] += len(starts)
+    with instrumentation.stage("integrate", events=len(starts)):
+        areas = segment_areas(time, smdt, starts, stops, rule="riemann", baseline=baseline)
+    event_areas = np.abs(areas).tolist()
 
     return event_areas
 
+# Signal areas of every capture of a NaN-padded batch, as (files x samples) time and sMDT arrays
+def batch_signal_areas(time, smdt, lengths, baselines, noise, instrumentation=None):
+    batch_areas = []
+    for row, count in enumerate(lengths):
+        batch_areas.append(signal_areas(time[row, :count], smdt[row, :count], baselines[row], noise[row], instrumentation))
+    return batch_areas
+
 # Process all files and group by voltage
-def process_all_files(directory):
+def process_all_files(directory, threads=DEFAULT_THREADS, archive_path=None, instrumentation=None):
+    instrumentation = Instrumentation("sMDT_Signal_Area_Average_Calculator") if instrumentation is None else instrumentation
     voltage_data = {}
-
-    for file in os.listdir(directory):
-        if file.endswith(".csv"):
-            voltage = extract_voltage(file)
-            if voltage is None:
+    stats = StatsTable()  # Per-voltage mean/SEM, updated event batch by event batch
+
+    if archive_path is not None:
+        # Voltages come from the archive index: no file names to parse, no CSVs to read. Each voltage's
+        # events are stacked from the memory map, with the trigger points and ADC steps the archive recorded
+        archive = EventArchive(archive_path)
+        for voltage in archive.voltages():
+            event_ids = archive.select(hv=voltage)
+            time, lengths = archive.stack(event_ids, "Time (s)")
+            smdt, _ = archive.stack(event_ids, "sMDT (V)")
+            with instrumentation.stage("baseline", files=len(event_ids), samples=int(lengths.sum())):
+                baselines, noise = batch_baseline(smdt, lengths, archive.trigger_points(event_ids), BASELINE_METHOD,
+                                                  resolution=archive.adc_steps(event_ids, "sMDT (V)"))
+
+            voltage_data[int(voltage)] = []
+            for areas in batch_signal_areas(time, smdt, lengths, baselines, noise, instrumentation):
+                voltage_data[int(voltage)].extend(areas)
+                stats.update(int(voltage), "Signal Area (V·s)", areas)
+    else:
+        files = []
+        for file in list_capture_files(directory):
+            if extract_voltage(file) is None:
                 print(f"Skipping {file}: No voltage found in filename.")
                 continue
+            files.append(file)
+
+        # Load every capture into one (files x samples) array; these captures carry the sMDT signal in the
+        # first channel block (CSV columns D and E)
+        samples, metadata = timed_load_batch(instrumentation, directory, files, channel_names=["sMDT (V)"], threads=threads)
+        time = batch_time(metadata, samples.shape[2])
 
-            file_path = os.path.join(directory, file)
-            areas = process_sMDT_signal_area(file_path)
+        # Local baseline and noise of every capture at once, from its pre-trigger samples (see baseline.py for the methods)
+        with instrumentation.stage("baseline", files=len(metadata), samples=int(metadata["Samples"].sum())):
+            baselines, noise = estimate_batch_baseline(samples, metadata, "sMDT (V)", ["sMDT (V)"], method=BASELINE_METHOD)
+
+        batch_areas = batch_signal_areas(time, samples[:, 0], metadata["Samples"], baselines, noise, instrumentation)
+        for file, areas in zip(metadata["File"], batch_areas):
+            voltage = extract_voltage(file)
 
             if voltage not in voltage_data:
                 voltage_data[voltage] = []
 
             voltage_data[voltage].extend(areas)
+            stats.update(voltage, "Signal Area (V·s)", areas)
 
     if not voltage_data:
         print("No valid signal area data found.")
         return
 
     # Build DataFrame for analysis
-    voltage_list = []
-    area_list = []
+    with instrumentation.stage("summarize", events=sum(len(areas) for areas in voltage_data.values())):
+        voltage_list = []
+        area_list = []
 
-    for voltage, areas in voltage_data.items():
-        for area in areas:
-            voltage_list.append(voltage)
-            area_list.append(area)
+        for voltage, areas in voltage_data.items():
+            for area in areas:
+                voltage_list.append(voltage)
+                area_list.append(area)
 
-    df = pd.DataFrame({
-        "Voltage (V)": voltage_list,
-        "Signal Area (V·s)": area_list
-    })
+        df = pd.DataFrame({
+            "Voltage (V)": voltage_list,
+            "Signal Area (V·s)": area_list
+        })
 
-    df.to_csv(os.path.join(directory, "sMDT_Signal_Area_By_Voltage.csv"), index=False)
-    print(f"Saved grouped signal area data to CSV.")
+        df.to_csv(os.path.join(directory, "sMDT_Signal_Area_By_Voltage.csv"), index=False)
+        print(f"Saved grouped signal area data to CSV.")
 
     # Compute stats per voltage
-    summary = df.groupby("Voltage (V)")["Signal Area (V·s)"].agg(["mean", "sem"]).reset_index()
+    summary = stats.summary("Signal Area (V·s)").rename(columns={"Mean": "mean", "SEM": "sem"})
 
     # Get average SEM
     average_sem = summary["sem"].mean()
 
     # Plot
-    plt.figure(figsize=(10, 6))
-    plt.bar(
-        summary["Voltage (V)"],
-        summary["mean"],
-        yerr=summary["sem"],
-        width=100,
-        capsize=5,
-        alpha=0.7,
-        edgecolor='black',
-        label=f"Mean ± SEM (avg SEM: ±{average_sem:.2e} V·s)"
-    )
-
-    plt.title("Average sMDT Signal Area by Voltage")
-    plt.xlabel("Voltage (V)")
-    plt.ylabel("Average Signal Area (V·s)")
-    plt.legend()
-    plt.grid(True)
-    plt.tight_layout()
-
-    # Save and show
-    plot_path = os.path.join(directory, "sMDT_Signal_Area_By_Voltage.png")
-    plt.savefig(plot_path, dpi=300)
-    print(f"Saved plot to: {plot_path}")
-    plt.show()
-
-# Run the script
-process_all_files(directory)
-
-input("Press Enter to exit...")
+    with instrumentation.stage("plot", files=1):
+        plt.figure(figsize=(10, 6))
+        plt.bar(
+            summary["Voltage (V)"],
+            summary["mean"],
+            yerr=summary["sem"],
+            width=100,
+            capsize=5,
+            alpha=0.7,
+            edgecolor='black',
+            label=f"Mean ± SEM (avg SEM: ±{average_sem:.2e} V·s)"
+        )
+
+        plt.title("Average sMDT Signal Area by Voltage")
+        plt.xlabel("Voltage (V)")
+        plt.ylabel("Average Signal Area (V·s)")
+        plt.legend()
+        plt.grid(True)
+        plt.tight_layout()
+
+        # Save (shown below, after the timing is reported)
+        plot_path = os.path.join(directory, "sMDT_Signal_Area_By_Voltage.png")
+        plt.savefig(plot_path, dpi=300)
+        print(f"Saved plot to: {plot_path}")
+
+    # Timing of this run (before the window opens): one line here, one row per stage in the timing log
+    report(instrumentation)
+    show()
+
+# Run the script (guarded so worker processes can import this script)
+if __name__ == "__main__":
+    # --profile FOLDER runs every stage under cProfile
+    instrumentation = Instrumentation("sMDT_Signal_Area_Average_Calculator", profile_directory=profile_option())
+    process_all_files(directory, threads=threads, archive_path=archive_path, instrumentation=instrumentation)
+
+    pause()
@@ -0,0 +1,88 @@
+import numpy as np
+
+# Waveform preamble fields needed to turn raw CURVe codes into volts and seconds
+PREAMBLE_FIELDS = ["YMUlt", "YOFf", "YZEro", "XINcr"]
+
+
+class ScopeSession:
+    """
+    Acquisition session with a Tektronix oscilloscope opened through pyvisa.
+
+    The data encoding (signed binary, 1 byte per point) is configured once when the session
+    starts, and the waveform preamble of each channel is queried once and cached until a setting
+    is changed through write(). Waveforms are read with one binary CURVe? transfer per channel.
+    """
+
+    def __init__(self, oscope, acquire_mode="SAMPLE"):
+        self.oscope = oscope
+        self.acquire_mode = acquire_mode
+        self.source = None  # Channel currently selected with DATa:SOUrce
+        self.preambles = {}  # Channel -> {"YMUlt", "YOFf", "YZEro", "XINcr"}
+        self.configure()
+
+    def configure(self):
+        """Sets the transfer encoding and acquisition mode (once per session)."""
+        self.oscope.write("DATa:ENCdg RIBinary")  # Signed integers, most significant byte first
+        self.oscope.write("DATa:WIDth 1")
+        self.oscope.write(f"ACQuire:MODe {self.acquire_mode}")
+        self.source = None
+        self.invalidate()
+
+    def write(self, command):
+        """Sends a setting command; cached preambles are dropped since scales or offsets may change."""
+        self.oscope.write(command)
+        self.invalidate()
+
+    def invalidate(self):
+        """Forgets the cached preambles (call after changing settings on the front panel)."""
+        self.preambles.clear()
+
+    def select(self, channel):
+        """Selects the channel sent by CURVe?, skipping the command if it is already selected."""
+        if self.source != channel:
+            self.oscope.write(f"DATa:SOUrce CH{channel}")
+            self.source = channel
+
+    def preamble(self, channel):
+        """
+        Returns the scaling preamble of a channel, queried in a single round trip on first use.
+
+        Parameters:
+        - channel: Oscilloscope channel number (1-4).
+        """
+        if channel not in self.preambles:
+            self.select(channel)
+            query = "WFMPRe:" + ";".join(field + "?" for field in PREAMBLE_FIELDS)
+            values = [float(value) for value in self.oscope.query(query).split(";")]
+            self.preambles[channel] = dict(zip(PREAMBLE_FIELDS, values))
+        return self.preambles[channel]
+
+    def read_raw(self, channel):
+        """Transfers one channel's waveform as an int8 array of digitizer codes."""
+        self.select(channel)
+        return self.oscope.query_binary_values("CURVe?", datatype="b", is_big_endian=True,
+                                               container=np.array)
+
+    def read_channels(self, channels):
+        """
+        Reads several channels and scales them to volts in one vectorized step.
+
+        Parameters:
+        - channels: Channel numbers to read, e.g. [1, 2, 3].
+
+        Returns a dictionary mapping each channel to a float64 array of voltages.
+        """
+        preambles = [self.preamble(channel) for channel in channels]
+        raw = np.vstack([self.read_raw(channel) for channel in channels]).astype(np.float64)
+
+        # voltage = (code - YOFf) * YMUlt + YZEro, broadcast over channels
+        ymult = np.array([p["YMUlt"] for p in preambles])[:, None]
+        yoff = np.array([p["YOFf"] for p in preambles])[:, None]
+        yzero = np.array([p["YZEro"] for p in preambles])[:, None]
+        volts = (raw - yoff) * ymult + yzero
+
+        return {channel: volts[row] for row, channel in enumerate(channels)}
+
+    def sample_interval(self, channel=1):
+        """Time between samples (s) from the cached preamble."""
+        return self.preamble(channel)["XINcr"]
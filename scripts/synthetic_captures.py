@@ -0,0 +1,203 @@
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from baseline import LEVELS_PER_DIVISION
+from capture_loader import BLOCK_WIDTH, CHANNEL_NAMES, HEADER_ROWS
+
+# Acquisition settings of the Experiment_1_Raw_Data captures
+RECORD_LENGTH = 1000  # 98 of the 99 captures (one has 800)
+SAMPLE_INTERVAL = 499.999983811e-12  # s
+SOURCES = ["CH2", "CH3", "CH4"]  # Scope inputs of the CH1, CH2 and sMDT blocks
+VERTICAL_SCALES = [5.00000007, 5.00000007, 19.9999995e-3]  # V/div
+YZEROS = [3.04, 2.28, 0.9]
+
+# Header row of every field in a channel block (rows not listed only carry samples)
+HEADER_LAYOUT = {
+    0: ("Record Length", "Points"),
+    1: ("Sample Interval", "s"),
+    2: ("Trigger Point", "Samples"),
+    6: ("Source", ""),
+    7: ("Vertical Units", ""),
+    8: ("Vertical Scale", ""),
+    9: ("Vertical Offset", ""),
+    10: ("Horizontal Units", ""),
+    11: ("Horizontal Scale", ""),
+    12: ("Pt Fmt", ""),
+    13: ("Yzero", ""),
+    14: ("Probe Atten", ""),
+    16: ("Note", ""),
+}
+
+# Pulse shapes (from the recorded events)
+SCINTILLATOR_AMPLITUDE = 4.4  # V, flat top of the saturated scintillator pulses
+SCINTILLATOR_WIDTH = 11e-9  # s above half height
+SCINTILLATOR_EDGE = 1.5e-9  # s rise / fall
+SMDT_AMPLITUDE = 0.04  # V, negative sMDT pulse depth at 3400 V
+SMDT_RISE = 5e-9  # s
+SMDT_DECAY = 60e-9  # s
+SMDT_DELAY = (20e-9, 150e-9)  # Drift delay range after the scintillator coincidence (s)
+GAIN_SLOPE = 1e-3  # Relative sMDT gain change per volt (signal ~ exp(GAIN_SLOPE * HV))
+NOISE = (0.1, 0.1, 1.5e-3)  # RMS noise of CH1, CH2 and sMDT (V)
+
+
+def engineering(values, digits=11):
+    """
+    Formats numbers the way the scope writes them: the float32 value with a mantissa of up to digits
+    significant digits and an exponent that is a multiple of 3 (e.g. -200.00000298E-3).
+    """
+    values = np.asarray(values, dtype=np.float32).astype(np.float64) + 0.0  # + 0.0 turns -0.0 into 0.0
+    magnitude = np.abs(values)
+    exponent = np.where(magnitude > 0, np.floor(np.log10(np.where(magnitude > 0, magnitude, 1.0)) / 3) * 3, 0).astype(int)
+    text = np.char.mod(f"%.{digits}g", values / 10.0 ** exponent)
+    text = np.where(np.char.find(text, ".") < 0, np.char.add(text, ".0"), text)
+    suffix = np.where(exponent != 0, np.char.add("E", exponent.astype(str)), "")
+    return np.char.add(text, suffix)
+
+
+def generate_waveforms(record_length=RECORD_LENGTH, sample_interval=SAMPLE_INTERVAL, hv=3400.0, rate=0.0,
+                       amplitude=SCINTILLATOR_AMPLITUDE, smdt_amplitude=SMDT_AMPLITUDE, noise=NOISE, rng=None):
+    """
+    Simulates one triggered capture: coincident scintillator pulses on CH1 and CH2 at the trigger
+    point, an sMDT pulse after a random drift delay, extra uncorrelated coincidences at rate, noise
+    and the scope's vertical quantization.
+
+    Parameters:
+    - record_length, sample_interval: Samples per channel and their spacing (s).
+    - hv: HV setting (V); the sMDT pulse depth scales with exp(GAIN_SLOPE * (hv - 3400)).
+    - rate: Additional muon rate (Hz) over the record on top of the triggering one.
+    - amplitude: Scintillator pulse height (V).
+    - smdt_amplitude: sMDT pulse depth at 3400 V (V).
+    - noise: RMS noise of CH1, CH2 and sMDT (V).
+    - rng: numpy Generator.
+
+    Returns a (3, record_length) array of voltages (CH1, CH2, sMDT).
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    trigger_point = record_length / 2
+    time = (np.arange(record_length) - trigger_point) * sample_interval
+    duration = record_length * sample_interval
+
+    arrivals = np.concatenate(([0.0], rng.uniform(time[0], time[-1], rng.poisson(rate * duration))))
+    samples = np.zeros((3, record_length))
+    depth = smdt_amplitude * np.exp(GAIN_SLOPE * (hv - 3400.0))
+    for arrival in arrivals:
+        for channel in (0, 1):
+            start = arrival + rng.normal(0, 0.3e-9)  # Scintillator timing jitter
+            rise = np.clip((time - start) / SCINTILLATOR_EDGE, 0, 1)
+            fall = np.clip((start + SCINTILLATOR_WIDTH - time) / SCINTILLATOR_EDGE, 0, 1)
+            samples[channel] += amplitude * rng.uniform(0.95, 1.05) * rise * fall
+        since = time - (arrival + rng.uniform(*SMDT_DELAY))
+        shape = np.where(since > 0, (1 - np.exp(-np.maximum(since, 0) / SMDT_RISE)) * np.exp(-np.maximum(since, 0) / SMDT_DECAY), 0)
+        samples[2] -= depth * rng.gamma(4.0, 0.25) * shape
+
+    samples += rng.normal(0, 1, samples.shape) * np.asarray(noise)[:, None]
+
+    # Vertical quantization of the 8-bit ADC
+    step = np.asarray(VERTICAL_SCALES)[:, None] / LEVELS_PER_DIVISION
+    return np.round(samples / step) * step
+
+
+def format_capture(samples, sample_interval=SAMPLE_INTERVAL, captured_at=None):
+    """
+    Lays samples out as the text of a DPO2024B CSV: one 6-column block per channel (label, value,
+    unit, time, voltage, blank) and 18 header rows, with CRLF line ends.
+
+    Parameters:
+    - samples: (3, record_length) voltages of CH1, CH2 and sMDT.
+    - sample_interval: Sample spacing (s).
+    - captured_at: datetime written to the Note header (default: now).
+    """
+    channel_count, record_length = samples.shape
+    trigger_point = record_length / 2
+    captured_at = datetime.now() if captured_at is None else captured_at
+    note = f"DPO2024B - {captured_at.strftime('%I:%M:%S %p').lstrip('0')}   {captured_at.month}/{captured_at.day}/{captured_at.year}"
+
+    time_text = engineering((np.arange(record_length) - trigger_point) * sample_interval)
+    columns = []
+    for block in range(channel_count):
+        values = {
+            "Record Length": str(record_length),
+            "Sample Interval": str(engineering(sample_interval)),
+            "Trigger Point": f"{trigger_point:.8f}",
+            "Source": f"Sample {SOURCES[block]}",
+            "Vertical Units": "V",
+            "Vertical Scale": str(engineering(VERTICAL_SCALES[block])),
+            "Vertical Offset": "0",
+            "Horizontal Units": "s",
+            "Horizontal Scale": str(engineering(sample_interval * record_length / 10)),
+            "Pt Fmt": "Y",
+            "Yzero": f"{YZEROS[block]:.7f}",
+            "Probe Atten": "1.000000",
+            "Note": note,
+        }
+        labels = np.full(record_length, "", dtype=object)
+        fields = np.full(record_length, "", dtype=object)
+        units = np.full(record_length, "", dtype=object)
+        for row, (label, unit) in HEADER_LAYOUT.items():
+            if row < record_length:
+                labels[row], fields[row], units[row] = label, values[label], unit
+        columns += [labels, fields, units, time_text, engineering(samples[block]), np.full(record_length, "", dtype=object)]
+
+    rows = np.stack(columns, axis=1).astype(str)
+    return "".join(",".join(row) + "\r\n" for row in rows)
+
+
+def write_dataset(directory, files, record_length=RECORD_LENGTH, voltages=(3400,), rate=0.0, amplitude=SCINTILLATOR_AMPLITUDE,
+                  smdt_amplitude=SMDT_AMPLITUDE, noise=NOISE, seed=0):
+    """
+    Writes a folder of synthetic captures named like the recorded ones (sMDT_3400V_Event_001.csv).
+
+    Parameters:
+    - directory: Output folder (created if missing).
+    - files: Number of captures, spread round-robin over voltages.
+    - record_length, rate, amplitude, smdt_amplitude, noise: See generate_waveforms.
+    - voltages: HV settings written into the file names.
+    - seed: Random seed; the same settings always give the same files.
+
+    A dataset.json manifest records the settings; a folder whose manifest matches is left as it is.
+    Returns the list of file paths.
+    """
+    settings = {"files": files, "record_length": record_length, "voltages": list(voltages), "rate": rate,
+                "amplitude": amplitude, "smdt_amplitude": smdt_amplitude, "noise": list(noise), "seed": seed}
+    manifest = os.path.join(directory, "dataset.json")
+    paths = [os.path.join(directory, f"sMDT_{int(voltages[k % len(voltages)])}V_Event_{k // len(voltages) + 1:03d}.csv")
+             for k in range(files)]
+    if os.path.exists(manifest):
+        with open(manifest, "r", encoding="utf-8") as f:
+            if json.load(f) == settings and all(os.path.exists(path) for path in paths):
+                return paths
+
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    start = datetime(2024, 12, 19, 14, 0, 0)
+    for k, path in enumerate(paths):
+        samples = generate_waveforms(record_length, SAMPLE_INTERVAL, voltages[k % len(voltages)], rate, amplitude,
+                                     smdt_amplitude, noise, rng)
+        with open(path, "w", newline="") as f:
+            f.write(format_capture(samples, SAMPLE_INTERVAL, start + timedelta(seconds=7 * k)))
+    with open(manifest, "w", encoding="utf-8") as f:
+        json.dump(settings, f)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic DPO2024B captures in the Experiment_1_Raw_Data layout.")
+    parser.add_argument("directory", help="Output folder")
+    parser.add_argument("--files", type=int, default=100, help="Number of captures")
+    parser.add_argument("--record-length", type=int, default=RECORD_LENGTH, help="Samples per channel")
+    parser.add_argument("--voltages", type=float, nargs="+", default=[3400], help="HV settings (V), spread over the files")
+    parser.add_argument("--rate", type=float, default=0.0, help="Extra muon rate on top of the trigger (Hz)")
+    parser.add_argument("--amplitude", type=float, default=SCINTILLATOR_AMPLITUDE, help="Scintillator pulse height (V)")
+    parser.add_argument("--smdt-amplitude", type=float, default=SMDT_AMPLITUDE, help="sMDT pulse depth at 3400 V (V)")
+    parser.add_argument("--noise", type=float, nargs=3, default=NOISE, help="RMS noise of CH1, CH2 and sMDT (V)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    paths = write_dataset(args.directory, args.files, args.record_length, args.voltages, args.rate, args.amplitude,
+                          args.smdt_amplitude, args.noise, args.seed)
+    print(f"{len(paths)} captures in {args.directory} ({len(CHANNEL_NAMES)} channel blocks of {BLOCK_WIDTH} columns, "
+          f"{HEADER_ROWS} header rows)")
@@ -0,0 +1,152 @@
+import numpy as np
+import matplotlib.pyplot as plt
+
+from figure_renderer import FIGURE_DPI, headless
+
+# Buckets used when the axes width in pixels is not known yet
+DEFAULT_BUCKETS = 1000
+
+# Headroom added when a panel's voltage range has to grow
+Y_MARGIN = 0.05
+
+CHANNEL_LABELS = ["CH1 (Scintillator 1)", "CH2 (Scintillator 2)", "CH3 (sMDT)"]
+
+
+def decimate(x, y, buckets):
+    """
+    Peak-preserving decimation: splits a record into buckets equal slices and keeps the minimum
+    and the maximum of each (in time order), so a pulse one sample wide still reaches its full
+    height on screen.
+
+    Parameters:
+    - x: Sample times.
+    - y: Voltages.
+    - buckets: Number of slices, normally the width of the axes in pixels.
+
+    Returns (x, y) with at most 2 * buckets points (the record itself if it is already that short).
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+    n = len(y)
+    if n <= 2 * buckets:
+        return x, y
+    size = -(-n // buckets)  # Samples per slice
+    count = -(-n // size)
+    slices = np.pad(y, (0, count * size - n), mode="edge").reshape(count, size)  # Edge padding adds no new extremes
+    offsets = np.arange(count) * size
+    indices = np.sort(np.stack([offsets + slices.argmin(axis=1), offsets + slices.argmax(axis=1)], axis=1), axis=1).ravel()
+    indices = np.minimum(indices, n - 1)
+    return x[indices], y[indices]
+
+
+class WaveformViewer:
+    """
+    One reusable figure showing each event's waveforms, one panel per channel.
+
+    Records are decimated to the axes width in pixels before they are drawn, so the drawing cost
+    does not depend on the record length. The lines and the title are blitted over a saved
+    background (axes, grid, thresholds, legends), so an update only redraws them. A full redraw
+    happens only when the time axis changes or a voltage falls outside a panel's range (ranges only
+    grow, so this settles after the first few events).
+    """
+
+    def __init__(self, labels=CHANNEL_LABELS, thresholds=None, figsize=(10, 8)):
+        """
+        Parameters:
+        - labels: Legend label of each channel panel.
+        - thresholds: Optional list (one entry per panel) of (voltage, color, label) lines or None.
+        - figsize: Figure size in inches.
+        """
+        self.fig, axes = plt.subplots(len(labels), 1, figsize=figsize, sharex=True, squeeze=False)
+        self.axes = list(axes[:, 0])
+        self.lines = [ax.plot([], [], label=label, animated=True, antialiased=False)[0] for ax, label in zip(self.axes, labels)]
+        for ax, threshold in zip(self.axes, thresholds or []):
+            if threshold is not None:
+                voltage, color, label = threshold
+                ax.axhline(y=voltage, color=color, linestyle='--', label=label)
+        self.axes[-1].set_xlabel("Time (s)")
+        self.axes[len(self.axes) // 2].set_ylabel("Voltage (V)")
+        for ax in self.axes:
+            ax.legend(loc='upper right')
+            ax.grid()
+        self.title = self.fig.suptitle("", animated=True)
+        self.fig.tight_layout()
+
+        self.time_range = None
+        self.voltage_ranges = [None] * len(self.axes)
+        self.background = None
+        self.fig.canvas.mpl_connect("draw_event", self.on_draw)
+        if not headless():
+            plt.show(block=False)
+        self.fig.canvas.draw()
+
+    def on_draw(self, event):
+        """After every full redraw (including window resizes): saves the new background and draws the lines on it."""
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self.draw_animated()
+
+    def draw_animated(self):
+        for line in self.lines:
+            line.axes.draw_artist(line)
+        self.fig.draw_artist(self.title)
+
+    def update(self, timestamps, channels, title=""):
+        """
+        Shows one event.
+
+        Parameters:
+        - timestamps: Sample times of the record.
+        - channels: One voltage array per panel.
+        - title: Figure title (e.g. "Waveform for Event 12").
+        """
+        buckets = int(self.axes[0].bbox.width) or DEFAULT_BUCKETS
+        redraw = self.background is None
+
+        time_range = (float(timestamps[0]), float(timestamps[-1]))
+        if time_range != self.time_range:
+            self.time_range = time_range
+            self.axes[0].set_xlim(*time_range)  # Shared by every panel
+            redraw = True
+
+        for k, (ax, line, voltages) in enumerate(zip(self.axes, self.lines, channels)):
+            x, y = decimate(timestamps, voltages, buckets)
+            line.set_data(x, y)
+            low, high = float(np.nanmin(y)), float(np.nanmax(y))
+            current = self.voltage_ranges[k]
+            if current is None or low < current[0] or high > current[1]:
+                if current is not None:
+                    low, high = min(low, current[0]), max(high, current[1])
+                margin = Y_MARGIN * ((high - low) or abs(high) or 1.0)
+                self.voltage_ranges[k] = (low - margin, high + margin)
+                ax.set_ylim(*self.voltage_ranges[k])
+                redraw = True
+        self.title.set_text(title)
+
+        canvas = self.fig.canvas
+        if redraw:
+            canvas.draw()  # on_draw saves the background and draws the lines
+        else:
+            canvas.restore_region(self.background)
+            self.draw_animated()
+            canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+
+    def save(self, file_path, dpi=FIGURE_DPI):
+        """Saves the current event as an image (blitted artists are not part of a normal savefig)."""
+        artists = self.lines + [self.title]
+        for artist in artists:
+            artist.set_animated(False)
+        try:
+            self.fig.savefig(file_path, dpi=dpi, bbox_inches='tight')
+        finally:
+            for artist in artists:
+                artist.set_animated(True)
+            self.fig.canvas.draw()
+
+    def show(self):
+        """Keeps the window open until it is closed (returns at once in headless runs)."""
+        if not headless():
+            plt.show()
+
+    def close(self):
+        plt.close(self.fig)